@@ -1,49 +1,518 @@
-from flask import Flask, request, jsonify
-import joblib
-import pandas as pd
+from flask import Flask, Response, request, jsonify
+import atexit
+import numpy as np
 import os
+import time
+import uuid
 
 import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from monitoring.log_predictions import log_prediction
+from monitoring.log_predictions import AsyncPredictionLogger
+from src.inference import InferenceEngine
+from src.batching import MicroBatcher
+from src.prediction_cache import PredictionCache
+from src.explain import TOP_N, ContributionCache, Explainer
+from src.shadow import Challenger, ShadowScorer
+from src.wallet_snapshot import SNAPSHOT_DIR, WalletSnapshot, current_snapshot
+from src.metrics import BATCH_BUCKETS, MetricsRegistry
+from src.wire_formats import (ARROW_MIME, ARROW_MIMES, JSON_MIME, NDJSON_MIME, WALLET_COLUMN, arrow_bytes,
+                              columnar_json, is_columnar, matrix_from_arrow, matrix_from_columns,
+                              matrix_from_ndjson, ndjson_chunks, wallets_of)
+from src.model_registry import RegistryWatcher, load_version
+from monitoring.drift_sketch import DriftSketch, DriftSketchRecorder, load_sketch_reference
 
 app = Flask(__name__)
 
-# Загрузка модели
-MODEL_PATH = "models/lightgbm_model.pkl"
-THRESHOLD_PATH = "models/lightgbm_best_threshold.pkl"
+INFERENCE_MODE = os.environ.get("INFERENCE_ENGINE", "numpy")
+INFERENCE_NUM_THREADS = int(os.environ.get("INFERENCE_NUM_THREADS", 0)) or None
+DRIFT_SKETCHES = os.environ.get("DRIFT_SKETCHES", "1") == "1"
+COLUMNS_FORMAT = "columns"  # колоночный JSON-ответ
+DRIFT_SKETCH_FLUSH_INTERVAL = float(os.environ.get("DRIFT_SKETCH_FLUSH_INTERVAL", 60.0))
+EXPLAIN_TOP_N = int(os.environ.get("EXPLAIN_TOP_N", TOP_N))
+EXPLAIN_MAX_TOP_N = 50
+
+# Кэш объяснений (вкладов фичей) по версии модели; EXPLAIN_CACHE_SIZE=0 отключает
+EXPLAIN_CACHE_SIZE = int(os.environ.get("EXPLAIN_CACHE_SIZE", 10_000))
+explanation_cache = None
+if EXPLAIN_CACHE_SIZE > 0:
+    explanation_cache = ContributionCache(
+        max_entries=EXPLAIN_CACHE_SIZE,
+        ttl_seconds=float(os.environ.get("EXPLAIN_CACHE_TTL", 3600.0)),
+    )
+
+
+class ServingState:
+    """
+    Версия модели, которой сейчас отвечает API: модель, порог, фичи, движок и
+    скетчи дрейфа. Подменяется целиком одной ссылкой — запрос берёт её один раз
+    и до конца работает с согласованной парой модель/порог.
+    """
+
+    def __init__(self, bundle):
+        self.version = bundle.version
+        self.threshold = bundle.threshold
+        self.feature_names = bundle.feature_names
+        forest_path = bundle.artifact("reference/lightgbm_forest.npz") or "models/lightgbm_forest.npz"
+        self.engine = InferenceEngine(bundle.model, mode=INFERENCE_MODE, num_threads=INFERENCE_NUM_THREADS,
+                                      forest_path=forest_path)
+        # Объяснения всегда считает booster (pred_contrib), в каком бы режиме ни был движок
+        self.explainer = Explainer(bundle.model.booster_, self.feature_names, version=self.version,
+                                   cache=explanation_cache, num_threads=INFERENCE_NUM_THREADS)
+
+        self.drift_recorder = None
+        if DRIFT_SKETCHES:
+            sketch_path = bundle.artifact("reference/sketch_reference.npz")
+            reference = DriftSketch.load(sketch_path) if sketch_path else load_sketch_reference()
+            if reference is not None:
+                self.drift_recorder = DriftSketchRecorder(reference, self.feature_names,
+                                                          flush_interval=DRIFT_SKETCH_FLUSH_INTERVAL)
+
+    def warm_up(self):
+        """Прогрев: первый вызов booster-а и буферы движка до того, как пойдёт трафик."""
+        X = np.zeros((64, len(self.feature_names)))
+        self.engine.predict_matrix(X[:1])
+        self.engine.predict_matrix(X)
+        return self
+
+    def close(self):
+        if self.drift_recorder is not None:
+            self.drift_recorder.close()
+
+
+# Загрузка модели: текущая версия из models/registry или старые файлы models/*.pkl
+serving = ServingState(load_version()).warm_up()
+
+
+def swap_model(version):
+    """Грузит и прогревает версию (в потоке watcher-а), затем атомарно подменяет serving."""
+    global serving
+    new_state = ServingState(load_version(version)).warm_up()
+    if new_state.drift_recorder is not None:
+        new_state.drift_recorder.start()
+    old_state, serving = serving, new_state
+    if prediction_cache is not None:
+        prediction_cache.invalidate()
+    if explanation_cache is not None:
+        explanation_cache.invalidate()
+    old_state.close()
+    print(f"🔄 API переключено на модель {version}")
+
+
+# Кэш скоров для повторяющихся векторов фичей (не для pandas-движка), включается PREDICTION_CACHE=1
+prediction_cache = None
+if os.environ.get("PREDICTION_CACHE", "0") == "1" and INFERENCE_MODE != "pandas":
+    prediction_cache = PredictionCache(
+        max_entries=int(os.environ.get("PREDICTION_CACHE_SIZE", 100_000)),
+        ttl_seconds=float(os.environ.get("PREDICTION_CACHE_TTL", 300.0)),
+    )
+
+# Горячая подмена модели при публикации новой версии (MODEL_RELOAD=0 отключает)
+model_watcher = None
+if os.environ.get("MODEL_RELOAD", "1") == "1":
+    model_watcher = RegistryWatcher(
+        swap_model, known_version=serving.version,
+        poll_interval=float(os.environ.get("MODEL_RELOAD_INTERVAL", 5.0)),
+    )
+
+# Микро-батчинг одиночных запросов (не для pandas-движка), включается MICRO_BATCHING=1
+micro_batcher = None
+if os.environ.get("MICRO_BATCHING", "0") == "1" and INFERENCE_MODE != "pandas":
+    micro_batcher = MicroBatcher(
+        serving.engine.predict_matrix,
+        max_batch_rows=int(os.environ.get("MICRO_BATCH_MAX_ROWS", 64)),
+        max_wait_ms=float(os.environ.get("MICRO_BATCH_WINDOW_MS", 2.0)),
+    )
+
+# Фоновый логгер предиктов (настройки через переменные окружения)
+prediction_logger = AsyncPredictionLogger(
+    max_queue_rows=int(os.environ.get("PRED_LOG_QUEUE_ROWS", 100_000)),
+    batch_size=int(os.environ.get("PRED_LOG_BATCH_SIZE", 1000)),
+    flush_interval=float(os.environ.get("PRED_LOG_FLUSH_INTERVAL", 1.0)),
+    policy=os.environ.get("PRED_LOG_POLICY", "block"),
+    sample_rate=float(os.environ.get("PRED_LOG_SAMPLE_RATE", 0.1)),
+)
+
+
+# Снапшот фичей и скоров по кошелькам для /score (WALLET_SNAPSHOT=0 отключает). Открывается
+# до fork через mmap — страницы подгружаются по обращению и общие для всех воркеров
+WALLET_SNAPSHOT = os.environ.get("WALLET_SNAPSHOT", "1") == "1"
+WALLET_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get("WALLET_SNAPSHOT_CHECK_INTERVAL", 5.0))
+SCORE_MAX_WALLETS = int(os.environ.get("SCORE_MAX_WALLETS", 10_000))
+wallet_snapshot = None
+if WALLET_SNAPSHOT:
+    try:
+        wallet_snapshot = WalletSnapshot.open_current()
+    except Exception as e:
+        # Битый или удалённый снапшот не должен мешать старту /predict; /score ответит 503
+        print(f"❌ Не удалось открыть снапшот кошельков: {e}")
+_snapshot_checked_at = time.monotonic()
+
+
+def _current_wallet_snapshot():
+    """Текущий снапшот; CURRENT перечитывается не чаще раза в WALLET_SNAPSHOT_CHECK_INTERVAL секунд."""
+    global wallet_snapshot, _snapshot_checked_at
+    if not WALLET_SNAPSHOT:
+        return None
+    now = time.monotonic()
+    if now - _snapshot_checked_at >= WALLET_SNAPSHOT_CHECK_INTERVAL:
+        _snapshot_checked_at = now
+        name = current_snapshot()
+        if name is not None and (wallet_snapshot is None or wallet_snapshot.name != name):
+            try:
+                wallet_snapshot = WalletSnapshot(os.path.join(SNAPSHOT_DIR, name))
+                print(f"🔄 Снапшот кошельков {name}: {len(wallet_snapshot)} адресов")
+            except Exception as e:
+                print(f"❌ Не удалось открыть снапшот кошельков {name}: {e}")
+    return wallet_snapshot
+
+
+# Теневой скоринг challenger-моделей: SHADOW_VERSIONS=v0007,v0008 — версии из реестра
+SHADOW_VERSIONS = [v.strip() for v in os.environ.get("SHADOW_VERSIONS", "").split(",") if v.strip()]
+shadow_scorer = None
+if SHADOW_VERSIONS:
+    shadow_scorer = ShadowScorer(
+        [Challenger(load_version(v), num_threads=int(os.environ.get("SHADOW_NUM_THREADS", 1)))
+         for v in SHADOW_VERSIONS],
+        sample_rate=float(os.environ.get("SHADOW_SAMPLE_RATE", 0.1)),
+        max_pending=int(os.environ.get("SHADOW_MAX_PENDING", 8)),
+        workers=int(os.environ.get("SHADOW_WORKERS", 1)),
+    )
+
+
+def start_background():
+    """
+    Фоновые потоки процесса (логгер, скетчи, микро-батчер, watcher реестра).
+    Потоки не переживают fork, поэтому под gunicorn с preload_app (API_PRELOAD=1)
+    они стартуют в каждом воркере из хука post_fork, а не в мастере.
+    """
+    prediction_logger.start()
+    if serving.drift_recorder is not None:
+        serving.drift_recorder.start()
+    if micro_batcher is not None:
+        micro_batcher.start()
+    if model_watcher is not None:
+        model_watcher.start()
+
+
+def shutdown():
+    """Остановка с финальным сбросом логов и скетчей на диск."""
+    if model_watcher is not None:
+        model_watcher.stop()
+    prediction_logger.close()
+    if shadow_scorer is not None:
+        shadow_scorer.close()
+    serving.close()
+
+
+atexit.register(shutdown)
+if os.environ.get("API_PRELOAD", "0") != "1":
+    start_background()
+
+# Метрики /predict для Prometheus (GET /metrics)
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram("scoring_stage_seconds", "Время стадий /predict, с", labelnames=("stage",))
+REQUEST_SECONDS = metrics.histogram("scoring_request_seconds", "Полное время /predict, с")
+BATCH_ROWS = metrics.histogram("scoring_batch_rows", "Строк в запросе /predict", buckets=BATCH_BUCKETS)
+REQUESTS = metrics.counter("scoring_requests_total", "Запросы /predict по HTTP-статусу", labelnames=("status",))
+ERRORS = metrics.counter("scoring_errors_total", "Ошибки /predict по типу исключения", labelnames=("type",))
+ROWS = metrics.counter("scoring_rows_total", "Проскоренные строки")
+IN_FLIGHT = metrics.gauge("scoring_in_flight_requests", "Запросы /predict в работе")
+SCORE_SECONDS = metrics.histogram("wallet_score_request_seconds", "Полное время /score, с")
+SCORE_WALLETS = metrics.counter("wallet_score_wallets_total", "Кошельки /score по источнику скора",
+                                labelnames=("source",))
+EXPLAIN_SECONDS = metrics.histogram("explain_request_seconds", "Полное время /explain, с")
+EXPLAIN_ROWS = metrics.counter("explain_rows_total", "Объяснённые строки")
+EXPLAIN_REQUESTS = metrics.counter("explain_requests_total", "Запросы /explain по HTTP-статусу",
+                                   labelnames=("status",))
+metrics.callback_gauge("scoring_model_info", "Текущая версия модели", lambda: {(serving.version,): 1},
+                       labelnames=("version",))
+metrics.callback_gauge("scoring_prediction_log_queue_rows", "Строк в очереди логгера предиктов",
+                       lambda: prediction_logger.stats()["queue_depth"])
+metrics.callback_gauge("scoring_prediction_log_dropped_rows", "Потерянные строки лога предиктов",
+                       lambda: prediction_logger.stats()["dropped"])
+if micro_batcher is not None:
+    metrics.callback_gauge("scoring_micro_batch_queue_depth", "Запросов в очереди микро-батчера",
+                           lambda: micro_batcher.stats()["queue_depth"])
+if prediction_cache is not None:
+    metrics.callback_gauge("scoring_prediction_cache_events", "Счётчики кэша предиктов",
+                           lambda: {(k,): prediction_cache.stats()[k] for k in ("hits", "misses", "evictions")},
+                           labelnames=("event",))
+if shadow_scorer is not None:
+    shadow_scorer.latency_metric = metrics.histogram(
+        "shadow_inference_seconds", "Время инференса challenger-а на батч, с", labelnames=("version",))
+    metrics.callback_gauge("shadow_batches", "Батчи теневого скоринга по исходу",
+                           lambda: {(k,): shadow_scorer.stats()[k]
+                                    for k in ("submitted", "sampled_out", "dropped_busy", "errors")},
+                           labelnames=("outcome",))
+    metrics.callback_gauge("shadow_disagreement_rate", "Доля расхождений решений с основной моделью",
+                           lambda: {(v,): s["disagreement_rate"] or 0.0
+                                    for v, s in shadow_scorer.stats()["challengers"].items()},
+                           labelnames=("version",))
+if explanation_cache is not None:
+    metrics.callback_gauge("explain_cache_events", "Счётчики кэша объяснений",
+                           lambda: {(k,): explanation_cache.stats()[k] for k in ("hits", "misses", "evictions")},
+                           labelnames=("event",))
+
+def _predict_matrix(engine, X):
+    if micro_batcher is not None and len(X) < micro_batcher.max_batch_rows:
+        return micro_batcher.score(X, engine.predict_matrix)
+    return engine.predict_matrix(X)
+
+
+def _score(state, X):
+    """Скоринг матрицы фичей. Возвращает (вероятности, маска попаданий в кэш или None)."""
+    engine = state.engine
+    t1 = time.perf_counter()
+    if prediction_cache is None:
+        proba = _predict_matrix(engine, X)
+        STAGE_SECONDS.observe(time.perf_counter() - t1, "inference")
+        return proba, None
+
+    proba, hit, keys = prediction_cache.lookup(X, state.version)
+    t2 = time.perf_counter()
+    STAGE_SECONDS.observe(t2 - t1, "cache")
+    if not hit.all():
+        miss = np.flatnonzero(~hit)
+        proba[miss] = _predict_matrix(engine, X[miss])
+        t3 = time.perf_counter()
+        STAGE_SECONDS.observe(t3 - t2, "inference")
+        prediction_cache.store([keys[i] for i in miss], proba[miss])
+        STAGE_SECONDS.observe(time.perf_counter() - t3, "cache")
+    return proba, hit
+
+
+def _read_request(state):
+    """
+    Тело запроса → (записи или None, матрица фичей или None, кошельки или None,
+    формат ответа по умолчанию). Arrow, колоночный JSON и NDJSON пишутся сразу
+    в матрицу, без dict на строку.
+    """
+    mimetype = request.mimetype
+    if mimetype in ARROW_MIMES:
+        X, wallets = matrix_from_arrow(request.get_data(), state.feature_names)
+        return None, X, wallets, ARROW_MIME
+    if mimetype == NDJSON_MIME:
+        X, wallets = matrix_from_ndjson(request.stream, state.engine.pack)
+        return None, X, wallets, NDJSON_MIME
+    data = request.json
+    if is_columnar(data):
+        return None, matrix_from_columns(data, state.feature_names), data.get(WALLET_COLUMN), COLUMNS_FORMAT
+    if not isinstance(data, list):
+        data = [data]
+    wallets = wallets_of(data)
+    return data, None, wallets if any(w is not None for w in wallets) else None, JSON_MIME
+
+
+def _prediction_ids(n):
+    """id строк запроса: общий случайный префикс + номер строки — для связки с лейблами."""
+    prefix = uuid.uuid4().hex[:20]
+    return [f"{prefix}-{i}" for i in range(n)]
+
+
+def _response_format(default):
+    """Явно запрошенный в Accept формат, иначе — формат запроса."""
+    for mimetype, _ in request.accept_mimetypes:
+        if mimetype in (ARROW_MIME, NDJSON_MIME):
+            return mimetype
+        if mimetype == JSON_MIME:
+            return default if default in (JSON_MIME, COLUMNS_FORMAT) else COLUMNS_FORMAT
+    return default
+
+
+def _response(fmt, pred, proba, prediction_ids):
+    if fmt == ARROW_MIME:
+        return Response(arrow_bytes(pred, proba, prediction_ids), mimetype=ARROW_MIME)
+    if fmt == NDJSON_MIME:
+        return Response(ndjson_chunks(pred, proba, prediction_ids), mimetype=NDJSON_MIME)
+    if fmt == COLUMNS_FORMAT:
+        return jsonify(columnar_json(pred, proba, prediction_ids))
+    return jsonify([
+        {"prediction_id": i, "prediction": int(p), "risk_probability": float(pr)}
+        for i, p, pr in zip(prediction_ids, pred, proba)
+    ])
 
-model = joblib.load(MODEL_PATH)
-best_threshold = joblib.load(THRESHOLD_PATH)
-feature_names = model.feature_name_
 
 @app.route("/predict", methods=["POST"])
 def predict():
+    started = time.perf_counter()
+    IN_FLIGHT.inc()
+    status = 200
     try:
-        data = request.json
-        if not isinstance(data, list):
-            data = [data]
-
-        X = pd.DataFrame(data)[feature_names]
-        proba = model.predict_proba(X)[:, 1]
-        pred = (proba >= best_threshold).astype(int)
-
-        # ЛОГИРУЕМ КАЖДЫЙ СКОР
-        for i in range(len(X)):
-            log_prediction(
-                features=X.iloc[i].to_dict(),
-                score=float(proba[i])
-            )
-
-        result = [
-            {"prediction": int(p), "risk_probability": float(pr)}
-            for p, pr in zip(pred, proba)
-        ]
+        state = serving
+        engine = state.engine
+        records, X, wallets, default_format = _read_request(state)
+        t0 = time.perf_counter()
+        STAGE_SECONDS.observe(t0 - started, "parse")
+
+        if records is not None and INFERENCE_MODE == "pandas":
+            # DataFrame и predict_proba не разделить — всё считается инференсом
+            X, proba = engine.predict_records(records)
+            STAGE_SECONDS.observe(time.perf_counter() - t0, "inference")
+            X_log, cached = X, None
+        else:
+            X_log = X
+            if records is not None:
+                X = engine.pack(records)
+                STAGE_SECONDS.observe(time.perf_counter() - t0, "frame_build")
+                # X — буфер движка, для фонового логгера копируем
+                X_log = X.copy()
+            proba, cached = _score(state, X)
+        BATCH_ROWS.observe(len(X))
+        pred = (proba >= state.threshold).astype(int)
+        prediction_ids = _prediction_ids(len(pred))
+
+        # ЛОГИРУЕМ КАЖДЫЙ СКОР (в фоне, одним батчем)
+        t = time.perf_counter()
+        prediction_logger.submit(X_log, proba, state.feature_names, model_version=state.version,
+                                 cached=cached, prediction_ids=prediction_ids, wallets=wallets)
+        if state.drift_recorder is not None:
+            state.drift_recorder.update(X, proba)
+        if shadow_scorer is not None:
+            # Только постановка в фоновый пул (или пропуск, если он занят) — ответ не ждёт
+            shadow_scorer.submit(X_log, proba, state.threshold, state.version, prediction_ids, state.feature_names)
+        t2 = time.perf_counter()
+        STAGE_SECONDS.observe(t2 - t, "logging")
+
+        response = _response(_response_format(default_format), pred, proba, prediction_ids)
+        STAGE_SECONDS.observe(time.perf_counter() - t2, "serialization")
+        ROWS.inc(len(pred))
+        return response
+
+    except Exception as e:
+        status = 400
+        ERRORS.inc(1, type(e).__name__)
+        return jsonify({"error": str(e)}), 400
+    finally:
+        IN_FLIGHT.dec()
+        REQUESTS.inc(1, str(status))
+        REQUEST_SECONDS.observe(time.perf_counter() - started)
+
+def _score_wallets(wallets, fresh=False):
+    """
+    Скоры кошельков из снапшота. Скор берётся готовым, если снапшот посчитан текущей
+    версией модели, иначе (или при fresh) — моделью по сохранённым фичам.
+    Возвращает список результатов в порядке wallets.
+    """
+    snapshot = _current_wallet_snapshot()
+    if snapshot is None:
+        raise LookupError("Снапшот кошельков не загружен")
+    state = serving
+    rows = snapshot.lookup(wallets)
+    found = np.flatnonzero(rows >= 0)
+    results = [{"wallet_address": w, "found": False} for w in wallets]
+    SCORE_WALLETS.inc(len(wallets) - len(found), "unknown")
+    if not len(found):
+        return results
+
+    X = snapshot.matrix(rows[found], state.feature_names)
+    computed = fresh or snapshot.model_version != state.version
+    if computed:
+        proba, _ = _score(state, X)
+    else:
+        proba = np.asarray(snapshot.scores[rows[found]], dtype=np.float64)
+    source = "model" if computed else "snapshot"
+    SCORE_WALLETS.inc(len(found), source)
+    pred = (proba >= state.threshold).astype(int)
+    prediction_ids = _prediction_ids(len(found))
+    found_wallets = [wallets[i] for i in found]
+    prediction_logger.submit(X, proba, state.feature_names, model_version=state.version,
+                             cached=None if computed else np.ones(len(found), dtype=bool),
+                             prediction_ids=prediction_ids, wallets=found_wallets)
+
+    for i, pid, p, pr in zip(found.tolist(), prediction_ids, pred.tolist(), proba.tolist()):
+        results[i] = {"wallet_address": wallets[i], "found": True, "prediction_id": pid, "prediction": p,
+                      "risk_probability": pr, "model_version": state.version, "source": source}
+    return results
+
+
+@app.route("/score/<wallet>", methods=["GET"])
+def score_wallet(wallet):
+    """Скор известного кошелька без передачи фичей; ?fresh=1 — пересчитать моделью."""
+    started = time.perf_counter()
+    try:
+        result = _score_wallets([wallet], fresh=request.args.get("fresh") == "1")[0]
+        if not result["found"]:
+            return jsonify({"error": f"Кошелёк {wallet} не найден в снапшоте"}), 404
         return jsonify(result)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        SCORE_SECONDS.observe(time.perf_counter() - started)
 
+
+@app.route("/score", methods=["POST"])
+def score_wallets():
+    """Пакетный поиск: {"wallets": [...]} или список адресов → результат на каждый адрес."""
+    started = time.perf_counter()
+    try:
+        data = request.json
+        wallets = data.get("wallets") if isinstance(data, dict) else data
+        if not isinstance(wallets, list) or not all(isinstance(w, str) for w in wallets):
+            return jsonify({"error": 'Ожидается {"wallets": [адреса]} или список адресов'}), 400
+        if len(wallets) > SCORE_MAX_WALLETS:
+            return jsonify({"error": f"Не больше {SCORE_MAX_WALLETS} адресов за запрос"}), 400
+        return jsonify(_score_wallets(wallets, fresh=request.args.get("fresh") == "1"))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        SCORE_SECONDS.observe(time.perf_counter() - started)
+
+
+@app.route("/explain", methods=["POST"])
+def explain():
+    """
+    Топ-N вкладов фичей (pred_contrib, в log-odds) для каждой строки тела —
+    форматы тела те же, что у /predict; ?top=N меняет число фичей (EXPLAIN_TOP_N).
+    """
+    started = time.perf_counter()
+    status = 200
+    try:
+        state = serving
+        top_n = min(int(request.args.get("top", EXPLAIN_TOP_N)), EXPLAIN_MAX_TOP_N)
+        records, X, _, _ = _read_request(state)
+        if X is None:
+            X = state.engine.pack(records)
+        proba, explanations = state.explainer.explain(X, top_n=top_n)
+        pred = (proba >= state.threshold).astype(int)
+        EXPLAIN_ROWS.inc(len(explanations))
+        return jsonify([
+            {"prediction": int(p), "risk_probability": float(pr), **e}
+            for p, pr, e in zip(pred, proba, explanations)
+        ])
     except Exception as e:
+        status = 400
         return jsonify({"error": str(e)}), 400
+    finally:
+        EXPLAIN_REQUESTS.inc(1, str(status))
+        EXPLAIN_SECONDS.observe(time.perf_counter() - started)
+
+@app.route("/health", methods=["GET"])
+def health():
+    state = serving
+    stats = {"status": "ok", "model_version": state.version, "prediction_logger": prediction_logger.stats()}
+    if micro_batcher is not None:
+        stats["micro_batcher"] = micro_batcher.stats()
+    if prediction_cache is not None:
+        stats["prediction_cache"] = prediction_cache.stats()
+    if explanation_cache is not None:
+        stats["explanation_cache"] = explanation_cache.stats()
+    if shadow_scorer is not None:
+        stats["shadow"] = shadow_scorer.stats()
+    if wallet_snapshot is not None:
+        stats["wallet_snapshot"] = {"name": wallet_snapshot.name, "wallets": len(wallet_snapshot),
+                                    "model_version": wallet_snapshot.model_version}
+    if state.drift_recorder is not None:
+        stats["drift_sketches"] = state.drift_recorder.stats()
+    return jsonify(stats)
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1 @@
+"""Бенчмарки скоринга, логирования, мониторинга и обучения на синтетических данных."""
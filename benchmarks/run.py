@@ -0,0 +1,304 @@
+"""
+Бенчмарки на синтетических данных (benchmarks/synthetic.py).
+
+Всё выполняется во временной рабочей папке: там генерируется датасет,
+обучается модель, строятся референсы и пишутся логи — репозиторий не трогается.
+Результат — JSON в benchmarks/results/ с коммитом, параметрами и временами,
+чтобы сравнивать запуски между коммитами:
+
+    python -m benchmarks.run --rows 20000 --drift-rows 50000
+    python -m benchmarks.run --only predict drift
+    python -m benchmarks.run --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+BENCHMARKS = ("train", "fill_missing", "predict", "log_prediction", "drift")
+BATCH_SIZES = (1, 10, 100, 1000, 10_000)
+
+sys.path.insert(0, REPO_ROOT)
+from benchmarks.synthetic import feature_schema, make_records, make_wallets
+
+
+def _timings(fn, repeat, warmup=1, setup=None):
+    """Время вызовов fn (мс): setup() выполняется перед каждым вызовом и не замеряется."""
+    for _ in range(warmup):
+        fn(setup() if setup else None)
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        started = time.perf_counter()
+        fn(arg)
+        times.append((time.perf_counter() - started) * 1000.0)
+    times = np.asarray(times)
+    return {
+        "repeat": repeat,
+        "mean_ms": float(times.mean()),
+        "p50_ms": float(np.percentile(times, 50)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "min_ms": float(times.min()),
+    }
+
+
+def _quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "-C", REPO_ROOT, "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "-C", REPO_ROOT, "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------------------------------------
+# Подготовка: датасет, модель и референсы в рабочей папке
+# ----------------------------------------------------------------------
+def prepare(rows, feature_names, seed):
+    """Пайплайн обучения на синтетике; время каждого шага — в результат бенчмарка train."""
+    from monitoring.drift_engine import PROFILE_PATH, SCORE_PROFILE_PATH, build_reference_profile
+    from monitoring.drift_sketch import build_sketch_reference
+    from src.data_preparation import (fill_missing_with_median, load_and_clean_data, prepare_features,
+                                      remove_high_corr_features, split_data)
+    from src.train import train_lightgbm
+    from src.tree_export import export_forest
+
+    os.makedirs("data", exist_ok=True)
+    make_wallets(rows, feature_names, seed=seed).to_parquet("data/dataset.parquet", index=False)
+
+    steps = {}
+    started = time.perf_counter()
+    df = remove_high_corr_features(load_and_clean_data("data/dataset.parquet"))
+    train, val, test = split_data(df, random_state=seed)
+    cols = prepare_features(df)
+    X_train, _, _ = fill_missing_with_median(train[cols].copy(), val[cols].copy(), test[cols].copy())
+    steps["prepare_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    model, _, _ = train_lightgbm(X_train, train["target"])
+    steps["fit_s"] = time.perf_counter() - started
+
+    joblib.dump(0.5, "models/lightgbm_best_threshold.pkl")
+    export_forest(model, "models/lightgbm_forest.npz")
+    train_scores = model.predict_proba(X_train)[:, 1]
+    build_reference_profile(X_train, PROFILE_PATH)
+    build_reference_profile(pd.DataFrame({"score": train_scores}), SCORE_PROFILE_PATH)
+    build_sketch_reference(X_train, train_scores)
+    return {"rows": rows, "train_rows": len(X_train), "trees": model.booster_.num_trees(), **steps}
+
+
+# ----------------------------------------------------------------------
+# Бенчмарки
+# ----------------------------------------------------------------------
+def bench_fill_missing(rows, feature_names, seed):
+    from src.data_preparation import fill_missing_with_median
+
+    df = make_wallets(rows, feature_names, seed=seed + 1)[feature_names]
+    third = len(df) // 3
+    parts = (df.iloc[:third], df.iloc[third:2 * third], df.iloc[2 * third:])
+
+    def setup():
+        return [p.copy() for p in parts]
+
+    return {"rows": rows, **_timings(lambda p: fill_missing_with_median(*p), repeat=5, setup=setup)}
+
+
+def bench_predict(feature_names, seed, batch_sizes=BATCH_SIZES):
+    os.environ.setdefault("MODEL_RELOAD", "0")
+    from app.api import app, prediction_logger
+
+    records = make_records(make_wallets(max(batch_sizes), feature_names, seed=seed + 2), feature_names)
+    client = app.test_client()
+    results = {}
+    for batch_size in batch_sizes:
+        payload = records[:batch_size]
+
+        def call(_):
+            response = client.post("/predict", json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(response.get_json())
+
+        stats = _timings(call, repeat=max(3, min(200, 20_000 // batch_size)), warmup=2)
+        stats["rows_per_s"] = batch_size / (stats["mean_ms"] / 1000.0)
+        results[str(batch_size)] = stats
+    prediction_logger.flush(30)
+    return results
+
+
+def bench_log_prediction(feature_names, seed, rows=5000):
+    from monitoring.log_predictions import AsyncPredictionLogger, log_prediction
+
+    X = make_wallets(rows, feature_names, seed=seed + 3, inf=False)[feature_names].to_numpy()
+    scores = np.random.default_rng(seed).random(rows)
+
+    started = time.perf_counter()
+    for i in range(rows):
+        log_prediction(dict(zip(feature_names, X[i].tolist())), scores[i])
+    legacy = time.perf_counter() - started
+
+    logger = AsyncPredictionLogger(log_dir="monitoring/bench_logs").start()
+    started = time.perf_counter()
+    for start in range(0, rows, 100):
+        logger.submit(X[start:start + 100], scores[start:start + 100], feature_names)
+    submitted = time.perf_counter() - started
+    logger.flush(60)
+    written = time.perf_counter() - started
+    logger.close()
+    shutil.rmtree("monitoring/bench_logs", ignore_errors=True)
+    return {
+        "rows": rows,
+        "legacy_rows_per_s": rows / legacy,
+        "async_submit_rows_per_s": rows / submitted,
+        "async_written_rows_per_s": rows / written,
+    }
+
+
+def bench_drift(feature_names, seed, rows):
+    from monitoring.check_data_drift import check_data_drift
+    from monitoring.check_score_drift import check_score_drift
+    from monitoring.drift_sketch import DriftSketchRecorder, load_sketch_reference
+    from monitoring.log_predictions import AsyncPredictionLogger
+    from monitoring.log_store import compact_logs
+
+    # N залогированных строк и те же строки в скетчах
+    shutil.rmtree("monitoring/logs", ignore_errors=True)
+    shutil.rmtree("monitoring/sketches", ignore_errors=True)
+    model = joblib.load("models/lightgbm_model.pkl")
+    X = make_wallets(rows, feature_names, seed=seed + 4)[feature_names].to_numpy(dtype=np.float64, copy=True)
+    X[~np.isfinite(X)] = np.nan
+    scores = model.booster_.predict(X)
+    logger = AsyncPredictionLogger(max_queue_rows=rows, batch_size=10_000).start()
+    recorder = DriftSketchRecorder(load_sketch_reference(), feature_names)
+    for start in range(0, rows, 1000):
+        logger.submit(X[start:start + 1000], scores[start:start + 1000], feature_names)
+        recorder.update(X[start:start + 1000], scores[start:start + 1000])
+    logger.close(120)
+    recorder.flush()
+
+    results = {"rows": rows}
+    with _quiet():
+        results["data_drift_raw_jsonl"] = _timings(lambda _: check_data_drift("raw"), repeat=3)
+        results["score_drift_raw_jsonl"] = _timings(lambda _: check_score_drift("raw"), repeat=3)
+        results["data_drift_sketch"] = _timings(lambda _: check_data_drift("sketch"), repeat=5)
+        results["score_drift_sketch"] = _timings(lambda _: check_score_drift("sketch"), repeat=5)
+        started = time.perf_counter()
+        compact_logs(include_today=True)
+        results["compact_logs_s"] = time.perf_counter() - started
+        results["data_drift_raw_parquet"] = _timings(lambda _: check_data_drift("raw"), repeat=3)
+        results["score_drift_raw_parquet"] = _timings(lambda _: check_score_drift("raw"), repeat=3)
+    return results
+
+
+def run(rows=20_000, drift_rows=50_000, only=None, seed=42, output=None, keep_workdir=False):
+    selected = list(only or BENCHMARKS)
+    feature_names = feature_schema(os.path.join(REPO_ROOT, "models", "lightgbm_model.pkl"),
+                                   os.path.join(REPO_ROOT, "monitoring", "reference", "reference_features.parquet"))
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {"rows": rows, "drift_rows": drift_rows, "seed": seed, "n_features": len(feature_names)},
+        "results": {},
+    }
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        print(f"🏗️ Готовим данные и модель ({rows} строк) в {workdir}")
+        with _quiet():
+            train = prepare(rows, feature_names, seed)
+        if "train" in selected:
+            report["results"]["train"] = train
+        for name in selected:
+            if name == "train":
+                continue
+            print(f"⏱️ {name}...")
+            if name == "fill_missing":
+                result = bench_fill_missing(rows, feature_names, seed)
+            elif name == "predict":
+                with _quiet():
+                    result = bench_predict(feature_names, seed)
+            elif name == "log_prediction":
+                result = bench_log_prediction(feature_names, seed)
+            else:
+                result = bench_drift(feature_names, seed, drift_rows)
+            report["results"][name] = result
+    finally:
+        os.chdir(cwd)
+        if not keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{report['commit'] or 'nocommit'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Результаты сохранены в {output}")
+    return report
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and "mean_ms" in value:
+            flat[name + " (ms)"] = value["mean_ms"]
+        elif isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not name.endswith("rows"):
+            flat[name] = value
+    return flat
+
+
+def compare(old_path, new_path):
+    """Таблица метрик двух запусков: старое, новое, отношение новое/старое."""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    a, b = _flatten(old["results"]), _flatten(new["results"])
+    print(f"{'метрика':<50} {old.get('commit') or '-':>14} {new.get('commit') or '-':>14} {'x':>7}")
+    for name in sorted(set(a) & set(b)):
+        ratio = b[name] / a[name] if a[name] else float("nan")
+        print(f"{name:<50} {a[name]:>14.3f} {b[name]:>14.3f} {ratio:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарки скоринга, логирования, дрейфа и обучения")
+    parser.add_argument("--rows", type=int, default=20_000, help="размер синтетического датасета")
+    parser.add_argument("--drift-rows", type=int, default=50_000, help="сколько строк логировать для проверок дрейфа")
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--keep-workdir", action="store_true")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args.rows, args.drift_rows, args.only, args.seed, args.output, args.keep_workdir)
@@ -0,0 +1,98 @@
+"""
+Генератор синтетических кошельков по схеме фичей модели.
+
+Схема берётся из обученной модели (feature_name_), если она есть, иначе из
+референса мониторинга, иначе — feat_0..feat_{n-1}. К фичам добавляются
+wallet_address, target и выкидываемые при обучении HIGH_CORR_FEATURES, так что
+набор проходит тот же путь, что и data/dataset.parquet. Пропуски и ±inf
+вставляются с разной долей по колонкам, как в реальных данных.
+"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.data_preparation import HIGH_CORR_FEATURES
+
+MODEL_PATH = "models/lightgbm_model.pkl"
+REFERENCE_PATH = "monitoring/reference/reference_features.parquet"
+N_FEATURES = 30
+
+# Доля колонок с пропусками / с бесконечностями и потолки долей в них
+NAN_COLUMNS = 0.4
+MAX_NAN_RATE = 0.3
+INF_COLUMNS = 0.1
+MAX_INF_RATE = 0.01
+
+
+def feature_schema(model_path=MODEL_PATH, reference_path=REFERENCE_PATH, n_features=N_FEATURES):
+    if os.path.exists(model_path):
+        return list(joblib.load(model_path).feature_name_)
+    if os.path.exists(reference_path):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(reference_path).names)
+    return [f"feat_{i}" for i in range(n_features)]
+
+
+def make_wallets(n_rows, feature_names=None, seed=42, nan=True, inf=True, high_corr=True):
+    """DataFrame кошельков: wallet_address, фичи схемы, [HIGH_CORR_FEATURES], target."""
+    rng = np.random.default_rng(seed)
+    feature_names = list(feature_names or feature_schema())
+    n_features = len(feature_names)
+
+    # Смесь нормальных и тяжёлохвостых (логнормальных) фичей в разных масштабах
+    X = rng.standard_normal((n_rows, n_features))
+    heavy = rng.random(n_features) < 0.5
+    X[:, heavy] = np.exp(X[:, heavy])
+    X *= 10.0 ** rng.integers(-2, 4, n_features)
+
+    # Таргет — логистическая модель от части фичей (около 20% «скамеров»)
+    weights = rng.standard_normal(n_features) * (rng.random(n_features) < 0.3)
+    z = (X - X.mean(axis=0)) / (X.std(axis=0) + 1e-12) @ weights
+    target = rng.random(n_rows) < 1.0 / (1.0 + np.exp(-(z - 1.5)))
+
+    df = pd.DataFrame(X, columns=feature_names)
+    if nan:
+        for col in rng.choice(n_features, int(n_features * NAN_COLUMNS), replace=False):
+            mask = rng.random(n_rows) < rng.uniform(0.01, MAX_NAN_RATE)
+            df.iloc[mask, col] = np.nan
+    if inf:
+        for col in rng.choice(n_features, max(1, int(n_features * INF_COLUMNS)), replace=False):
+            mask = rng.random(n_rows) < rng.uniform(0.001, MAX_INF_RATE)
+            df.iloc[mask, col] = np.where(rng.random(int(mask.sum())) < 0.5, np.inf, -np.inf)
+    if high_corr:
+        for name in HIGH_CORR_FEATURES:
+            if name not in df.columns:
+                df[name] = df.iloc[:, 0] * rng.uniform(0.9, 1.1) + rng.standard_normal(n_rows) * 1e-3
+
+    df.insert(0, "wallet_address", [f"0x{i:040x}" for i in range(n_rows)])
+    df["target"] = target.astype(int)
+    return df
+
+
+def make_records(df, feature_names):
+    """Тела запросов /predict: список dict, NaN и ±inf → None (как в JSON от клиентов)."""
+    X = df[feature_names].astype("float64")
+    X = X.where(np.isfinite(X), None).astype(object)
+    return X.to_dict("records")
+
+
+def write_dataset(path, n_rows, feature_names=None, seed=42):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df = make_wallets(n_rows, feature_names, seed=seed)
+    df.to_parquet(path, index=False)
+    return df
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Синтетический датасет кошельков")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--output", default="data/synthetic_dataset.parquet")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    write_dataset(args.output, args.rows, seed=args.seed)
+    print(f"✅ {args.rows} синтетических кошельков сохранено в {args.output}")
@@ -0,0 +1,56 @@
+# gunicorn.conf.py
+"""
+Продовый запуск API: gunicorn -c gunicorn.conf.py app.api:app
+
+Модель грузится и прогревается в мастере до fork (preload_app), воркеры делят
+её страницы copy-on-write. Фоновые потоки API стартуют в каждом воркере после
+fork. Бюджет потоков: workers × INFERENCE_NUM_THREADS не больше числа ядер.
+
+Настройки через переменные окружения:
+    WEB_CONCURRENCY          — число воркеров (по умолчанию — число ядер)
+    GUNICORN_THREADS         — потоков-обработчиков на воркер (4)
+    INFERENCE_NUM_THREADS    — потоков LightGBM на вызов (ядра / воркеры)
+    PORT, GUNICORN_TIMEOUT, GUNICORN_MAX_REQUESTS
+
+Плавная перезагрузка: kill -HUP <pid мастера> — воркеры пересоздаются по одному
+от уже загруженного приложения; новая версия модели приходит через реестр
+(models/registry/CURRENT) без перезапуска. Для нового кода — USR2 + QUIT старого мастера.
+"""
+import os
+
+cpu_count = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", cpu_count))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+preload_app = True
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+# Периодический перезапуск воркеров (0 — выключено)
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+# Бюджет потоков: LightGBM и OpenMP в каждом воркере получают свою долю ядер.
+# Выставляется до импорта приложения, т.е. до загрузки lightgbm в мастере.
+# В мастере инференс идёт только однопоточный прогрев — пул OpenMP не создаётся
+# до fork (иначе libgomp в воркерах может зависнуть).
+threads_per_worker = str(max(1, cpu_count // max(workers, 1)))
+os.environ.setdefault("INFERENCE_NUM_THREADS", threads_per_worker)
+os.environ.setdefault("OMP_NUM_THREADS", threads_per_worker)
+os.environ["API_PRELOAD"] = "1"
+
+
+def post_fork(server, worker):
+    import app.api
+    app.api.start_background()
+    server.log.info(f"Воркер {worker.pid}: модель {app.api.serving.version}, "
+                    f"INFERENCE_NUM_THREADS={os.environ['INFERENCE_NUM_THREADS']}")
+
+
+def worker_exit(server, worker):
+    # Финальный сброс логов предиктов и скетчей дрейфа
+    import app.api
+    app.api.shutdown()
@@ -1,101 +1,84 @@
 # monitoring/check_data_drift.py
 import pandas as pd
-import numpy as np
-from scipy import stats
 import os
 import json
 from datetime import datetime
 
+from monitoring.log_store import read_predictions
+from monitoring.drift_sketch import SKETCH_DIR, STREAM_SKETCH_DIR, load_sketch_reference, load_sketches, sketch_drift
+from monitoring.drift_engine import PROFILE_PATH, build_reference_profile, compute_drift, load_reference_profile
+
 PSI_THRESHOLD = 0.2
 KS_PVALUE_THRESHOLD = 0.05
+REFERENCE_PATH = "monitoring/reference/reference_features.parquet"
 
-def calculate_psi(expected, actual, bins=10):
-    expected = np.array(expected)
-    actual = np.array(actual)
-    expected = (expected - expected.min()) / (expected.max() - expected.min() + 1e-8)
-    actual = (actual - actual.min()) / (actual.max() - actual.min() + 1e-8)
-    
-    bins_edges = np.percentile(expected, np.linspace(0, 100, bins + 1))
-    expected_bins = np.histogram(expected, bins=bins_edges)[0] + 1
-    actual_bins = np.histogram(actual, bins=bins_edges)[0] + 1
-
-    expected_dist = expected_bins / expected_bins.sum()
-    actual_dist = actual_bins / actual_bins.sum()
-    psi = np.sum((expected_dist - actual_dist) * np.log(expected_dist / actual_dist))
-    return psi
-
-def check_data_drift():
-    # Загружаем референс
-    ref_path = "monitoring/reference/reference_features.parquet"
-    if not os.path.exists(ref_path):
-        print("⚠️ Нет референсных фичей — пропускаем проверку дрейфа")
-        return False
-
-    ref_df = pd.read_parquet(ref_path)
+def _sketch_feature_results(sketch_dir=SKETCH_DIR):
+    """PSI/KS по скетчам API (monitoring/sketches) или демона мониторинга (без чтения сырых логов)."""
+    reference = load_sketch_reference()
+    if reference is None:
+        print("⚠️ Нет референса скетчей — пропускаем проверку дрейфа")
+        return None
 
-    # Загружаем свежие логи (за вчера или сегодня)
-    today = datetime.utcnow().strftime("%Y-%m-%d")
     yesterday = (datetime.utcnow() - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    current = load_sketches(yesterday, sketch_dir=sketch_dir, reference=reference)
+    if current is None or current.n_rows == 0:
+        print("ℹ️ Нет новых скетчей для анализа дрейфа фичей")
+        return None
+
+    return {
+        col: {"psi": r["psi"], "ks_pvalue": r["ks_pvalue"]}
+        for col, r in sketch_drift(reference, current).items() if col != "score"
+    }
+
+def _load_profile():
+    profile = load_reference_profile(PROFILE_PATH)
+    if profile is None and os.path.exists(REFERENCE_PATH):
+        # Старый референс без профиля — строим профиль в памяти
+        print("ℹ️ Нет профиля референса — строим его из reference_features.parquet")
+        profile = build_reference_profile(pd.read_parquet(REFERENCE_PATH), path=None)
+    return profile
+
+def _raw_feature_results(n_jobs=1):
+    profile = _load_profile()
+    if profile is None:
+        print("⚠️ Нет референсных фичей — пропускаем проверку дрейфа")
+        return None
 
-    current_df = pd.DataFrame()
-    for date in [today, yesterday]:
-        log_file = f"monitoring/logs/predictions_{date}.jsonl"
-        if not os.path.exists(log_file):
-            continue
-            
-        features_list = []
-        with open(log_file, "r", encoding="utf-8") as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:  # пропускаем пустые строки
-                    continue
-                try:
-                    entry = json.loads(line)
-                    if isinstance(entry, dict) and entry["features"] is not None and isinstance(entry["features"], dict):
-                        features_list.append(entry["features"])
-                    else:
-                        print(f"⚠️ Неверный формат в строке {line_num} файла {log_file}")
-                except Exception as e:
-                    print(f"❌ Ошибка в строке {line_num} файла {log_file}: {e}")
-                    continue
-
-        if features_list:
-            df_features = pd.DataFrame(features_list)
-            current_df = pd.concat([current_df, df_features], ignore_index=True)
+    # Загружаем свежие логи (за вчера и сегодня) — только колонки референса
+    yesterday = (datetime.utcnow() - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    current_df = read_predictions(start=yesterday, columns=[str(c) for c in profile["columns"]])
+    current_df = current_df.dropna(axis=1, how="all")
 
     if current_df.empty:
         print("ℹ️ Нет новых данных для анализа дрейфа фичей")
-        return False
-
-    # Приводим к одному набору колонок
-    common_features = ref_df.columns.intersection(current_df.columns)
-    if len(common_features) == 0:
+        return None
+    if len(current_df.columns) == 0:
         print("⚠️ Нет общих фичей между референсом и текущими данными")
-        return False
+        return None
 
-    ref_df = ref_df[common_features]
-    current_df = current_df[common_features]
+    # PSI и KS по всем фичам сразу
+    return {
+        col: {"psi": r["psi"], "ks_pvalue": r["ks_pvalue"]}
+        for col, r in compute_drift(profile, current_df, n_jobs=n_jobs).items()
+    }
+
+def check_data_drift(mode="raw", n_jobs=1):
+    """
+    mode="raw" — по сырым логам предиктов, mode="sketch" — по потоковым скетчам API,
+    mode="stream" — по скетчам демона мониторинга. n_jobs > 1 — считать блоки фичей в пуле процессов.
+    """
+    if mode == "raw":
+        results = _raw_feature_results(n_jobs)
+    else:
+        results = _sketch_feature_results(STREAM_SKETCH_DIR if mode == "stream" else SKETCH_DIR)
+    if results is None:
+        return False
 
     # Проверяем каждую фичу
     drift_detected = False
-    results = {}
-
-    for col in common_features:
-        ref_vals = ref_df[col].dropna()
-        curr_vals = current_df[col].dropna()
-        if len(ref_vals) < 10 or len(curr_vals) < 10:
-            continue
-
-        # KS-тест
-        _, pval = stats.ks_2samp(ref_vals, curr_vals)
-        
-        # PSI
-        psi = calculate_psi(ref_vals, curr_vals)
-
-        results[col] = {"psi": float(psi), "ks_pvalue": float(pval)}
-        
-        if psi > PSI_THRESHOLD or pval < KS_PVALUE_THRESHOLD:
-            print(f"🚨 Дрейф в фиче '{col}': PSI={psi:.4f}, KS p-value={pval:.4f}")
+    for col, r in results.items():
+        if r["psi"] > PSI_THRESHOLD or r["ks_pvalue"] < KS_PVALUE_THRESHOLD:
+            print(f"🚨 Дрейф в фиче '{col}': PSI={r['psi']:.4f}, KS p-value={r['ks_pvalue']:.4f}")
             drift_detected = True
 
     # Создаём папку для логов, если её нет
@@ -105,6 +88,7 @@ def check_data_drift():
     log_entry = {
         "timestamp": datetime.utcnow().isoformat(),
         "component": "feature_drift",
+        "mode": mode,
         "drift_detected": bool(drift_detected),
         "details": results
     }
@@ -116,4 +100,10 @@ def check_data_drift():
     return drift_detected
 
 if __name__ == "__main__":
-    check_data_drift()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["raw", "sketch", "stream"], default="raw")
+    parser.add_argument("--n-jobs", type=int, default=1)
+    args = parser.parse_args()
+    check_data_drift(args.mode, args.n_jobs)
\ No newline at end of file
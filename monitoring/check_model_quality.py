@@ -1,56 +1,68 @@
 # monitoring/check_model_quality.py
-import pandas as pd
-import os
-from sklearn.metrics import roc_auc_score, f1_score
-import json
-from datetime import datetime, timedelta
 import json
+import os
+from datetime import datetime
 
-# Загружаем лучший порог
-import joblib
-best_threshold = joblib.load("models/lightgbm_best_threshold.pkl")
+from monitoring.label_store import LabelStore
 
-def check_model_quality():
-    # Ищем файл с предсказаниями и лейблами
-    label_file = "monitoring/logs/predictions_with_labels.csv"
-    if not os.path.exists(label_file):
-        print("ℹ️ Нет файла с лейблами — пропускаем оценку качества")
-        return None
+# Загружаем лучший порог текущей версии модели
+from src.model_registry import current_threshold, version_threshold
 
-    df = pd.read_csv(label_file)
-    required_cols = {"score", "true_label"}
-    if not required_cols.issubset(df.columns):
-        print(f"⚠️ Нет колонок {required_cols} в {label_file}")
-        return None
+MIN_LABELLED = 10  # можно поставить меньше для испытаний и проверок
+SHOW_WINDOWS = 7
 
-    df = df.dropna(subset=["score", "true_label"])
-    if len(df) < 10:  #  можно поставить меньше для испытаний и проверок 
+
+def check_model_quality(granularity="day", ingest=True):
+    """
+    Докачивает предикты в хранилище лейблов (ingest=False — их уже добавил демон
+    мониторинга), пересчитывает метрики окон с новыми лейблами и возвращает
+    (roc_auc, f1) последнего окна с обоими классами.
+    """
+    best_threshold = current_threshold()
+    store = LabelStore()
+    try:
+        added = store.ingest_predictions() if ingest else 0
+        refreshed = store.refresh_quality(best_threshold, version_threshold=version_threshold)
+        print(f"📥 Новых предиктов: {added}, пересчитано окон: {refreshed}")
+        windows = store.quality_windows(granularity, last=SHOW_WINDOWS)
+    finally:
+        store.close()
+
+    windows = windows[windows["n"] >= MIN_LABELLED]
+    if windows.empty:
         print("ℹ️ Недостаточно данных с лейблами")
         return None
 
-    y_true = df["true_label"].astype(int)
-    y_pred_proba = df["score"]
-    #y_pred = (y_pred_proba >= 0.5).astype(int)  # или используйте ваш порог
-    y_pred = (y_pred_proba >= best_threshold).astype(int)
-
-    auc = roc_auc_score(y_true, y_pred_proba)
-    f1 = f1_score(y_true, y_pred)
+    cols = ["window", "n", "positives", "roc_auc", "f1", "brier", "ece"]
+    print(windows[cols].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
 
+    scored = windows.dropna(subset=["roc_auc"])
+    if scored.empty:
+        print("ℹ️ В окнах с лейблами только один класс — AUC не считается")
+        return None
+    latest = scored.iloc[-1]
+    auc, f1 = float(latest["roc_auc"]), float(latest["f1"])
     print(f"🎯 ROC-AUC: {auc:.4f}")
     print(f"🎯 F1-score: {f1:.4f}")
 
     log_entry = {
         "timestamp": datetime.utcnow().isoformat(),
         "component": "model_quality",
-        "roc_auc": float(auc),
-        "f1_score": float(f1),
-        "n_samples": len(df)
+        "window": latest["window"].isoformat(),
+        "granularity": granularity,
+        "roc_auc": auc,
+        "f1_score": f1,
+        "brier": float(latest["brier"]),
+        "ece": float(latest["ece"]),
+        "n_samples": int(latest["n"])
     }
 
+    os.makedirs("monitoring/drift_logs", exist_ok=True)
     with open("monitoring/drift_logs/drift_log.jsonl", "a") as f:
         f.write(json.dumps(log_entry) + "\n")
 
     return auc, f1
 
+
 if __name__ == "__main__":
-    check_model_quality()
\ No newline at end of file
+    check_model_quality()
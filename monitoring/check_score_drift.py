@@ -1,62 +1,54 @@
 # monitoring/check_score_drift.py
 import pandas as pd
-import numpy as np
-from scipy import stats
 import os
 import json
 from datetime import datetime
 
+from monitoring.log_store import read_predictions
+from monitoring.drift_sketch import SKETCH_DIR, STREAM_SKETCH_DIR, load_sketch_reference, load_sketches, sketch_drift
+from monitoring.drift_engine import SCORE_PROFILE_PATH, build_reference_profile, compute_drift, load_reference_profile
 
+REFERENCE_PATH = "monitoring/reference/reference_scores.parquet"
 
 PSI_THRESHOLD = 0.1
 KS_PVALUE_THRESHOLD = 0.05
 
-def calculate_psi(expected, actual, bins=10):
-    expected = np.array(expected)
-    actual = np.array(actual)
-    expected = (expected - expected.min()) / (expected.max() - expected.min() + 1e-8)
-    actual = (actual - actual.min()) / (actual.max() - actual.min() + 1e-8)
-    
-    bins_edges = np.percentile(expected, np.linspace(0, 100, bins + 1))
-    expected_bins = np.histogram(expected, bins=bins_edges)[0] + 1
-    actual_bins = np.histogram(actual, bins=bins_edges)[0] + 1
-
-    expected_dist = expected_bins / expected_bins.sum()
-    actual_dist = actual_bins / actual_bins.sum()
-    psi = np.sum((expected_dist - actual_dist) * np.log(expected_dist / actual_dist))
-    return psi
-
-def check_score_drift():
-    # Референсные скоры
-    ref_path = "monitoring/reference/reference_scores.parquet"
-    if not os.path.exists(ref_path):
-        print(" Нет референсных скоров — пропускаем проверку")
-        return False
-
-    ref_scores = pd.read_parquet(ref_path)["score"].dropna().values
-
-    # Свежие скоры
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    yesterday = (datetime.utcnow() - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    scores = []
-    for date in [today, yesterday]:
-        log_file = f"monitoring/logs/predictions_{date}.jsonl"
-        if os.path.exists(log_file):
-            with open(log_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    entry = json.loads(line)
-                    scores.append(entry["score"])
-    
-    if len(scores) < 10:
-        print("  Недостаточно новых скоров для анализа")
-        return False
-
-    current_scores = np.array(scores)
-
-    # PSI и KS
-    psi = calculate_psi(ref_scores, current_scores)
-    ks_stat, pval = stats.ks_2samp(ref_scores, current_scores)
+def check_score_drift(mode="raw"):
+    """
+    mode="raw" — по сырым логам предиктов, mode="sketch" — по потоковым скетчам API,
+    mode="stream" — по скетчам демона мониторинга.
+    """
+    if mode in ("sketch", "stream"):
+        sketch_dir = STREAM_SKETCH_DIR if mode == "stream" else SKETCH_DIR
+        reference = load_sketch_reference()
+        yesterday = (datetime.utcnow() - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+        current = load_sketches(yesterday, sketch_dir=sketch_dir, reference=reference) if reference is not None else None
+        result = sketch_drift(reference, current).get("score") if current is not None else None
+        if result is None:
+            print("  Недостаточно скетчей скоров для анализа")
+            return False
+        psi, pval = result["psi"], result["ks_pvalue"]
+        n_ref, n_current = int(reference.counts[reference.columns.index("score")].sum()), result["n"]
+    else:
+        # Профиль референсных скоров
+        profile = load_reference_profile(SCORE_PROFILE_PATH)
+        if profile is None and os.path.exists(REFERENCE_PATH):
+            profile = build_reference_profile(pd.read_parquet(REFERENCE_PATH, columns=["score"]), path=None)
+        if profile is None:
+            print(" Нет референсных скоров — пропускаем проверку")
+            return False
+
+        # Свежие скоры (вчера + сегодня) — читаем только колонку score
+        yesterday = (datetime.utcnow() - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+        current = read_predictions(start=yesterday, columns=["score"])
+
+        # PSI и KS
+        result = compute_drift(profile, current).get("score")
+        if result is None:
+            print("  Недостаточно новых скоров для анализа")
+            return False
+        psi, pval = result["psi"], result["ks_pvalue"]
+        n_ref, n_current = int(profile["n_ref"][0]), result["n"]
 
     drift_detected = (psi > PSI_THRESHOLD) or (pval < KS_PVALUE_THRESHOLD)
 
@@ -69,10 +61,12 @@ def check_score_drift():
         "psi": float(psi),
         "ks_pvalue": float(pval),
         "drift_detected": bool(drift_detected),
-        "n_ref": len(ref_scores),
-        "n_current": len(current_scores)
+        "mode": mode,
+        "n_ref": n_ref,
+        "n_current": n_current
     }
 
+    os.makedirs("monitoring/drift_logs", exist_ok=True)
     with open("monitoring/drift_logs/drift_log.jsonl", "a") as f:
         f.write(json.dumps(log_entry) + "\n")
 
@@ -84,4 +78,8 @@ def check_score_drift():
     return drift_detected
 
 if __name__ == "__main__":
-    check_score_drift()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["raw", "sketch", "stream"], default="raw")
+    check_score_drift(parser.parse_args().mode)
\ No newline at end of file
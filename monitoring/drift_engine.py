@@ -0,0 +1,157 @@
+# monitoring/drift_engine.py
+"""
+Общий движок дрейфа: компактный референс-профиль и PSI/KS сразу по всем фичам.
+
+Профиль (monitoring/reference/reference_profile.npz) строится один раз при
+обучении и хранит на каждую фичу: внутренние границы PSI-бинов по квантилям
+референса, счётчики референса в этих бинах, отсортированную квантильную
+подвыборку для KS, долю NaN и число непустых значений. Проверки дрейфа больше
+не читают копию X_train и не пересчитывают квантили на каждом запуске.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+PROFILE_PATH = "monitoring/reference/reference_profile.npz"
+SCORE_PROFILE_PATH = "monitoring/reference/reference_score_profile.npz"
+PSI_BINS = 10
+KS_POINTS = 1000            # размер квантильной подвыборки референса для KS
+MIN_ROWS = 10
+BLOCK_ELEMENTS = 4_000_000  # ограничение на размер (строки × фичи) одного блока KS
+BIN_CHUNK_ROWS = 256
+
+
+def bin_counts(X, edges):
+    """
+    Счётчики по бинам для всех колонок сразу. X — (n, f), edges — (f, b-1)
+    отсортированные внутренние границы. NaN не считаются. Возвращает (f, b).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    n_cols, n_bins = edges.shape[0], edges.shape[1] + 1
+    offsets = np.arange(n_cols) * n_bins
+    counts = np.zeros(n_cols * n_bins, dtype=np.int64)
+    for start in range(0, len(X), BIN_CHUNK_ROWS):
+        chunk = X[start:start + BIN_CHUNK_ROWS]
+        # номер бина = число границ, которые значение превышает или равно
+        bins = (chunk[:, :, None] >= edges[None, :, :]).sum(axis=2)
+        counts += np.bincount((bins + offsets[None, :])[~np.isnan(chunk)], minlength=n_cols * n_bins)
+    return counts.reshape(n_cols, n_bins)
+
+
+def _as_matrix(df: pd.DataFrame):
+    values = df.to_numpy(dtype=np.float64, copy=True)
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def build_reference_profile(df: pd.DataFrame, path=PROFILE_PATH, bins=PSI_BINS, ks_points=KS_POINTS):
+    """Строит и сохраняет профиль референса по всем колонкам df."""
+    values = _as_matrix(df)
+    with np.errstate(all="ignore"):
+        edges = np.nanpercentile(values, np.linspace(0, 100, bins + 1)[1:-1], axis=0).T
+        ks_sample = np.nanquantile(values, np.linspace(0, 1, ks_points), axis=0)
+    profile = {
+        "columns": np.asarray([str(c) for c in df.columns]),
+        "edges": edges,
+        "ref_counts": bin_counts(values, edges),
+        "ks_sample": ks_sample,                      # (ks_points, f), отсортировано по столбцам
+        "n_ref": (~np.isnan(values)).sum(axis=0),
+        "nan_rate": np.isnan(values).mean(axis=0) if len(values) else np.zeros(values.shape[1]),
+    }
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, **profile)
+    return profile
+
+
+def load_reference_profile(path=PROFILE_PATH):
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def psi_all(ref_counts, cur_counts):
+    """PSI по строкам матриц счётчиков (f, b); +1 в каждый бин против нулей."""
+    ref = ref_counts + 1.0
+    cur = cur_counts + 1.0
+    ref = ref / ref.sum(axis=1, keepdims=True)
+    cur = cur / cur.sum(axis=1, keepdims=True)
+    return np.sum((ref - cur) * np.log(ref / cur), axis=1)
+
+
+def ks_all(ks_sample, current):
+    """
+    Статистика KS по всем колонкам сразу: ks_sample (k, f) — отсортированные
+    квантили референса, current (m, f) — текущие значения (NaN допустимы).
+    """
+    k = ks_sample.shape[0]
+    values = np.concatenate([ks_sample, current], axis=0)
+    order = np.argsort(values, axis=0, kind="stable")
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    from_ref = order < k
+    is_nan = np.isnan(sorted_values)
+
+    n_cur = np.maximum((~np.isnan(current)).sum(axis=0), 1)
+    cdf_ref = np.cumsum(from_ref & ~is_nan, axis=0) / max(k, 1)
+    cdf_cur = np.cumsum(~from_ref & ~is_nan, axis=0) / n_cur
+    # При равных значениях CDF сравниваем только на последнем из них
+    last = np.ones_like(is_nan)
+    last[:-1] = sorted_values[:-1] != sorted_values[1:]
+    diff = np.where(last & ~is_nan, np.abs(cdf_ref - cdf_cur), 0.0)
+    return diff.max(axis=0)
+
+
+def _drift_block(ks_sample, edges, ref_counts, current):
+    return psi_all(ref_counts, bin_counts(current, edges)), ks_all(ks_sample, current)
+
+
+def compute_drift(profile, current: pd.DataFrame, n_jobs=1):
+    """
+    PSI и KS (статистика + p-value) по всем общим колонкам профиля и current.
+    n_jobs > 1 — блоки колонок считаются в пуле процессов (для очень широких входов).
+    Возвращает {колонка: {"psi", "ks_stat", "ks_pvalue", "n"}}.
+    """
+    index = {c: i for i, c in enumerate(profile["columns"])}
+    columns = [c for c in current.columns if c in index]
+    if not columns:
+        return {}
+    idx = np.array([index[c] for c in columns])
+    values = _as_matrix(current[columns])
+    n_cur = (~np.isnan(values)).sum(axis=0)
+    n_ref = profile["n_ref"][idx]
+
+    ks_sample = profile["ks_sample"][:, idx]
+    edges = profile["edges"][idx]
+    ref_counts = profile["ref_counts"][idx]
+
+    # Блоки колонок ограничивают память argsort-а для KS
+    rows = ks_sample.shape[0] + len(values)
+    block = max(1, BLOCK_ELEMENTS // max(rows, 1))
+    slices = [slice(s, s + block) for s in range(0, len(columns), block)]
+    args = [(ks_sample[:, sl], edges[sl], ref_counts[sl], values[:, sl]) for sl in slices]
+    if n_jobs > 1 and len(slices) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            parts = list(pool.map(_drift_block, *zip(*args)))
+    else:
+        parts = [_drift_block(*a) for a in args]
+    psi = np.concatenate([p[0] for p in parts])
+    ks_stat = np.concatenate([p[1] for p in parts])
+
+    en = np.round(n_ref * n_cur / np.maximum(n_ref + n_cur, 1))
+    pvalue = stats.distributions.kstwo.sf(ks_stat, np.maximum(en, 1))
+
+    results = {}
+    for j, col in enumerate(columns):
+        if n_ref[j] < MIN_ROWS or n_cur[j] < MIN_ROWS:
+            continue
+        results[col] = {
+            "psi": float(psi[j]),
+            "ks_stat": float(ks_stat[j]),
+            "ks_pvalue": float(pvalue[j]),
+            "n": int(n_cur[j]),
+        }
+    return results
@@ -0,0 +1,306 @@
+# monitoring/drift_sketch.py
+"""
+Потоковые скетчи дрейфа, которые API ведёт прямо во время скоринга.
+
+На каждую колонку (фичи модели + score) держим гистограмму по SKETCH_BINS
+бинам, границы которых — перцентили референса (1%, 2%, ..., 99%), плюс счётчик
+NaN. Такая гистограмма сливается простым сложением: для PSI её бины
+склеиваются в децили, а для KS она служит квантильным скетчем — статистика
+считается как максимум разницы CDF на границах бинов (погрешность не больше
+массы одного бина). Снапшоты периодически сбрасываются в
+monitoring/sketches/ и читаются проверками дрейфа в режиме mode="sketch".
+"""
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from monitoring.drift_engine import bin_counts, psi_all
+
+SKETCH_DIR = "monitoring/sketches"
+# Скетчи, которые демон мониторинга (monitoring/scheduler.py) строит по дочитанным логам
+STREAM_SKETCH_DIR = "monitoring/stream_sketches"
+SKETCH_REFERENCE_PATH = "monitoring/reference/sketch_reference.npz"
+SKETCH_BINS = 100          # тонкие бины для KS
+PSI_BINS = 10              # децили для PSI (склейка тонких бинов)
+MIN_ROWS = 10
+
+
+def build_sketch_reference(X_ref: pd.DataFrame, scores=None, path=SKETCH_REFERENCE_PATH):
+    """Границы бинов по перцентилям референса и счётчики референса в этих бинах."""
+    ref = X_ref.copy()
+    if scores is not None:
+        ref["score"] = np.asarray(scores, dtype=np.float64)
+    columns = list(ref.columns)
+    values = ref.to_numpy(dtype=np.float64, copy=True)
+    values[~np.isfinite(values)] = np.nan
+
+    levels = np.linspace(0, 100, SKETCH_BINS + 1)[1:-1]
+    edges = np.nanpercentile(values, levels, axis=0).T          # (n_cols, SKETCH_BINS - 1)
+    sketch = DriftSketch(columns, edges)
+    sketch.update(values)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, columns=np.asarray(columns), edges=edges, counts=sketch.counts,
+             nan_counts=sketch.nan_counts, n_rows=sketch.n_rows)
+    return sketch
+
+
+def load_sketch_reference(path=SKETCH_REFERENCE_PATH):
+    if not os.path.exists(path):
+        return None
+    return DriftSketch.load(path)
+
+
+class DriftSketch:
+    """
+    Сливаемые гистограммы по колонкам на общих границах бинов.
+    consumed — {файл лога: [отпечаток, смещение]}: до какого байта логи уже учтены
+    в скетче (ведёт демон мониторинга, чтобы повторная обработка не считала строки дважды).
+    """
+
+    def __init__(self, columns, edges, counts=None, nan_counts=None, n_rows=0, consumed=None):
+        self.columns = [str(c) for c in columns]
+        self.edges = np.asarray(edges, dtype=np.float64)
+        n_cols, n_bins = len(self.columns), self.edges.shape[1] + 1
+        self.counts = np.zeros((n_cols, n_bins), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        self.nan_counts = np.zeros(n_cols, dtype=np.int64) if nan_counts is None else np.asarray(nan_counts, dtype=np.int64)
+        self.n_rows = int(n_rows)
+        self.consumed = dict(consumed or {})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            consumed = json.loads(str(data["consumed"])) if "consumed" in data.files else None
+            return cls(data["columns"], data["edges"], data["counts"], data["nan_counts"], int(data["n_rows"]),
+                       consumed)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Временный файл с точкой в начале не попадает под маску sketch_*.npz
+        tmp = os.path.join(os.path.dirname(path), "." + os.path.basename(path))
+        np.savez(tmp, columns=np.asarray(self.columns), edges=self.edges, counts=self.counts,
+                 nan_counts=self.nan_counts, n_rows=self.n_rows, consumed=json.dumps(self.consumed))
+        os.replace(tmp, path)
+
+    def empty_like(self):
+        return DriftSketch(self.columns, self.edges)
+
+    def update(self, X):
+        """Добавляет батч (n, n_cols) в порядке self.columns; всё векторно."""
+        X = np.asarray(X, dtype=np.float64)
+        self.counts += bin_counts(X, self.edges)
+        self.nan_counts += np.isnan(X).sum(axis=0)
+        self.n_rows += len(X)
+
+    def merge(self, other):
+        if other.columns != self.columns or not np.array_equal(other.edges, self.edges, equal_nan=True):
+            raise ValueError("Скетчи построены на разных колонках или границах — слить нельзя")
+        self.counts += other.counts
+        self.nan_counts += other.nan_counts
+        self.n_rows += other.n_rows
+        return self
+
+
+def align_to_reference(sketch: DriftSketch, reference: DriftSketch):
+    """
+    Переносит счётчики скетча в колонки референса. None — если у общей колонки
+    другие границы бинов (снапшот модели с прошлым референсом) или общих колонок нет.
+    """
+    index = {c: i for i, c in enumerate(sketch.columns)}
+    common = [(j, index[col]) for j, col in enumerate(reference.columns) if col in index]
+    if not common:
+        return None
+    aligned = reference.empty_like()
+    for j, i in common:
+        if not np.array_equal(sketch.edges[i], reference.edges[j], equal_nan=True):
+            return None
+        aligned.counts[j] = sketch.counts[i]
+        aligned.nan_counts[j] = sketch.nan_counts[i]
+    aligned.n_rows = sketch.n_rows
+    return aligned
+
+
+def sketch_drift(reference: DriftSketch, current: DriftSketch):
+    """
+    PSI (по децилям) и приближённый KS по каждой колонке.
+    Возвращает {колонка: {"psi", "ks_stat", "ks_pvalue", "n"}}.
+    Скетч на других границах бинов сравнивать побиново нельзя — ValueError.
+    """
+    group = SKETCH_BINS // PSI_BINS
+    ref_index = {c: i for i, c in enumerate(reference.columns)}
+    for j, col in enumerate(current.columns):
+        if col in ref_index and not np.array_equal(current.edges[j], reference.edges[ref_index[col]], equal_nan=True):
+            raise ValueError(f"Скетч колонки {col} построен на других границах бинов, чем референс")
+    results = {}
+    for j, col in enumerate(current.columns):
+        if col not in ref_index:
+            continue
+        ref_counts = reference.counts[ref_index[col]].astype(np.float64)
+        cur_counts = current.counts[j].astype(np.float64)
+        n_ref, n_cur = ref_counts.sum(), cur_counts.sum()
+        if n_ref < MIN_ROWS or n_cur < MIN_ROWS:
+            continue
+
+        # PSI: склеиваем тонкие бины в децили
+        psi = float(psi_all(ref_counts.reshape(1, PSI_BINS, group).sum(axis=2),
+                            cur_counts.reshape(1, PSI_BINS, group).sum(axis=2))[0])
+
+        # KS: максимум разницы эмпирических CDF на границах бинов
+        ks_stat = float(np.max(np.abs(np.cumsum(ref_counts) / n_ref - np.cumsum(cur_counts) / n_cur)))
+        en = n_ref * n_cur / (n_ref + n_cur)
+        pvalue = float(stats.distributions.kstwo.sf(ks_stat, np.round(en)))
+
+        results[col] = {"psi": psi, "ks_stat": ks_stat, "ks_pvalue": pvalue, "n": int(n_cur)}
+    return results
+
+
+def _sketch_files(date_str, sketch_dir=SKETCH_DIR):
+    return sorted(glob.glob(os.path.join(sketch_dir, f"sketch_{date_str}_*.npz")))
+
+
+def _merge_files(paths, reference):
+    """Сливает совместимые с референсом снапшоты. Возвращает (скетч или None, слитые пути)."""
+    merged, used = reference.empty_like(), []
+    for path in paths:
+        part = align_to_reference(DriftSketch.load(path), reference)
+        if part is None:
+            # Снапшот от модели с другим референсом (до переобучения) — пропускаем
+            print(f"⚠️ Скетч {path} построен не на текущем референсе — пропущен")
+            continue
+        merged.merge(part)
+        used.append(path)
+    return (merged if used else None), used
+
+
+def load_sketches(start_date, end_date=None, sketch_dir=SKETCH_DIR, reference=None):
+    """
+    Сливает снапшоты за даты [start_date, end_date] (YYYY-MM-DD) в колонках референса
+    (по умолчанию — текущего из SKETCH_REFERENCE_PATH). None — нет совместимых снапшотов.
+    """
+    reference = reference if reference is not None else load_sketch_reference()
+    if reference is None:
+        return None
+    end_date = end_date or datetime.utcnow().strftime("%Y-%m-%d")
+    paths = []
+    day = datetime.strptime(start_date, "%Y-%m-%d")
+    while day.strftime("%Y-%m-%d") <= end_date:
+        paths.extend(_sketch_files(day.strftime("%Y-%m-%d"), sketch_dir))
+        day += timedelta(days=1)
+    return _merge_files(paths, reference)[0]
+
+
+def compact_sketches(sketch_dir=SKETCH_DIR, reference=None):
+    """
+    Склеивает снапшоты закрытых дней в один файл на день. Удаляются только слитые
+    снапшоты — несовместимые с текущим референсом остаются как есть.
+    """
+    reference = reference if reference is not None else load_sketch_reference()
+    if reference is None:
+        print("⚠️ Нет референса скетчей — склейка пропущена")
+        return
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    dates = {os.path.basename(p).split("_")[1] for p in glob.glob(os.path.join(sketch_dir, "sketch_*.npz"))}
+    for date_str in sorted(dates):
+        files = _sketch_files(date_str, sketch_dir)
+        if date_str >= today or len(files) < 2:
+            continue
+        daily_path = os.path.join(sketch_dir, f"sketch_{date_str}_daily.npz")
+        merged, used = _merge_files(files, reference)
+        if merged is None or len(used) < 2:
+            continue
+        if os.path.exists(daily_path) and daily_path not in used:
+            print(f"⚠️ {daily_path} построен не на текущем референсе — день {date_str} не склеиваем")
+            continue
+        merged.save(daily_path)
+        for path in used:
+            if path != daily_path:
+                os.remove(path)
+
+
+class DriftSketchRecorder:
+    """
+    Держит скетч текущего процесса и раз в flush_interval секунд сбрасывает
+    дельту в monitoring/sketches/sketch_<дата>_<pid>_<ms>.npz, после чего обнуляет её —
+    память не растёт с числом запросов.
+    """
+
+    def __init__(self, reference: DriftSketch, feature_names, sketch_dir=SKETCH_DIR, flush_interval=60.0):
+        self.sketch_dir = sketch_dir
+        self.flush_interval = flush_interval
+        # Колонки в порядке API (фичи + score); отсутствующие в референсе получают NaN-границы
+        columns = list(feature_names) + ["score"]
+        index = {c: i for i, c in enumerate(reference.columns)}
+        edges = np.full((len(columns), reference.edges.shape[1]), np.nan)
+        for j, col in enumerate(columns):
+            if col in index:
+                edges[j] = reference.edges[index[col]]
+        self._template = DriftSketch(columns, edges)
+        self._sketch = self._template.empty_like()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.snapshots_written = 0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="drift-sketch", daemon=True)
+            self._thread.start()
+        return self
+
+    def update(self, X, scores):
+        """X — (n, n_features) в порядке feature_names, scores — (n,)."""
+        batch = np.column_stack([X, scores])
+        with self._lock:
+            self._sketch.update(batch)
+
+    def flush(self):
+        with self._lock:
+            sketch, self._sketch = self._sketch, self._template.empty_like()
+        if sketch.n_rows == 0:
+            return None
+        now = datetime.utcnow()
+        path = os.path.join(self.sketch_dir, f"sketch_{now:%Y-%m-%d}_{os.getpid()}_{int(time.time() * 1000)}.npz")
+        sketch.save(path)
+        self.snapshots_written += 1
+        return path
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        self.flush()
+
+    def stats(self):
+        return {"rows_pending": self._sketch.n_rows, "snapshots_written": self.snapshots_written}
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"❌ Ошибка записи скетча дрейфа: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Референс для потоковых скетчей дрейфа")
+    parser.add_argument("--build-reference", action="store_true",
+                        help="построить границы бинов из monitoring/reference/*.parquet")
+    parser.add_argument("--compact", action="store_true", help="склеить снапшоты закрытых дней")
+    args = parser.parse_args()
+
+    if args.build_reference:
+        ref_features = pd.read_parquet("monitoring/reference/reference_features.parquet")
+        ref_scores = pd.read_parquet("monitoring/reference/reference_scores.parquet")["score"]
+        build_sketch_reference(ref_features, ref_scores)
+        print(f"✅ Референс скетчей сохранён в {SKETCH_REFERENCE_PATH}")
+    if args.compact:
+        compact_sketches()
@@ -0,0 +1,297 @@
+# monitoring/label_store.py
+"""
+Хранилище лейблов и оконные метрики качества (SQLite).
+
+predictions — предикты из логов (prediction_id, кошелёк, время, версия, скор) с
+индексами по id и по кошельку; лейблы приходят батчами позже и проставляются
+по prediction_id или по кошельку (тогда и всем будущим предиктам кошелька).
+Лейбл по prediction_id точнее: лейбл кошелька его не перезаписывает, а только
+заполняет неразмеченные предикты и предикты, размеченные прежним лейблом кошелька.
+Логи докачиваются инкрементально от последней загруженной метки времени.
+
+quality_windows — метрики по часовым и дневным окнам: ROC AUC, F1 при пороге
+модели (каждый предикт — при пороге своей версии), Brier, ECE (калибровка). При каждом запуске пересчитываются только
+окна, в которые с прошлого запуска пришли лейблы, — время проверки не растёт
+вместе с историей.
+
+    python -m monitoring.label_store --labels labels.csv     # prediction_id и/или wallet_address, label
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score, roc_auc_score
+
+from monitoring.log_store import read_predictions
+
+LABEL_DB = "monitoring/labels.sqlite"
+GRANULARITIES = {"hour": 3600, "day": 86400}
+CALIBRATION_BINS = 10
+# Насколько назад от последней загруженной метки перечитываем логи: воркеры пишут
+# батчи с задержкой, а повторы отсекает PRIMARY KEY
+INGEST_OVERLAP_SECONDS = 300
+PREDICTION_COLUMNS = ["prediction_id", "wallet_address", "timestamp", "model_version", "score"]
+EPOCH = datetime(1970, 1, 1)   # ts в базе — секунды UTC, метки логов — наивный UTC
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    prediction_id TEXT PRIMARY KEY,
+    wallet_address TEXT,
+    ts REAL NOT NULL,
+    model_version TEXT,
+    score REAL NOT NULL,
+    label INTEGER,
+    labelled_at REAL,
+    label_source TEXT          -- 'id' или 'wallet'
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_wallet ON predictions(wallet_address);
+CREATE INDEX IF NOT EXISTS idx_predictions_ts ON predictions(ts);
+CREATE INDEX IF NOT EXISTS idx_predictions_labelled_at ON predictions(labelled_at);
+CREATE TABLE IF NOT EXISTS wallet_labels (
+    wallet_address TEXT PRIMARY KEY,
+    label INTEGER NOT NULL,
+    labelled_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quality_windows (
+    granularity TEXT NOT NULL,
+    window_start REAL NOT NULL,
+    n INTEGER,
+    positives INTEGER,
+    roc_auc REAL,
+    f1 REAL,
+    brier REAL,
+    ece REAL,
+    mean_score REAL,
+    threshold REAL,            -- порог F1; NULL — в окне версии с разными порогами
+    computed_at REAL,
+    PRIMARY KEY (granularity, window_start)
+);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL);
+"""
+
+
+def window_metrics(scores, labels, threshold, bins=CALIBRATION_BINS):
+    """Метрики одного окна. threshold — число или порог каждой строки. AUC — None, если в окне один класс."""
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.int64)
+    both_classes = 0 < labels.sum() < len(labels)
+    # ECE: средний по бинам скора |доля единиц − средний скор|, взвешенный числом строк
+    bin_idx = np.minimum((scores * bins).astype(np.int64), bins - 1)
+    score_sum = np.bincount(bin_idx, weights=scores, minlength=bins)
+    label_sum = np.bincount(bin_idx, weights=labels, minlength=bins)
+    ece = float(np.abs(label_sum - score_sum).sum() / len(scores))
+    return {
+        "n": int(len(scores)),
+        "positives": int(labels.sum()),
+        "roc_auc": float(roc_auc_score(labels, scores)) if both_classes else None,
+        "f1": float(f1_score(labels, (scores >= threshold).astype(int), zero_division=0)),
+        "brier": float(np.mean((scores - labels) ** 2)),
+        "ece": ece,
+        "mean_score": float(scores.mean()),
+    }
+
+
+class LabelStore:
+    def __init__(self, path=LABEL_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(predictions)")}
+        if "label_source" not in columns:
+            # База до появления label_source: источник старых лейблов неизвестен — считаем их точными
+            with self.conn:
+                self.conn.execute("ALTER TABLE predictions ADD COLUMN label_source TEXT")
+
+    def close(self):
+        self.conn.close()
+
+    def _get_state(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    # ------------------------------------------------------------------
+    # Загрузка
+    # ------------------------------------------------------------------
+    def ingest_predictions(self, start=None):
+        """
+        Докачивает предикты с prediction_id из логов (log_store) начиная с последней
+        загруженной метки. Лейблы уже известных кошельков проставляются сразу.
+        Возвращает число новых строк.
+        """
+        last_ts = self._get_state("predictions_ts")
+        if start is None and last_ts is not None:
+            start = EPOCH + timedelta(seconds=last_ts - INGEST_OVERLAP_SECONDS)
+        # В старых логах (до prediction_id) колонок может не быть
+        return self.add_predictions(read_predictions(start=start, columns=PREDICTION_COLUMNS))
+
+    def add_predictions(self, df):
+        """
+        Добавляет уже разобранные строки логов (read_predictions / LogReader); повторы
+        по prediction_id игнорируются. Возвращает число новых строк.
+        """
+        last_ts = self._get_state("predictions_ts")
+        df = df.reindex(columns=PREDICTION_COLUMNS).dropna(subset=["prediction_id", "timestamp", "score"])
+        if df.empty:
+            return 0
+        ts = (pd.to_datetime(df["timestamp"]) - pd.Timestamp(0)).dt.total_seconds().to_numpy()
+        wallets = df["wallet_address"].astype(object).where(df["wallet_address"].notna(), None)
+        rows = zip(df["prediction_id"].astype(str), wallets, ts.tolist(),
+                   df["model_version"].astype(object).where(df["model_version"].notna(), None),
+                   df["score"].astype(float).tolist())
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO predictions (prediction_id, wallet_address, ts, model_version, score) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+            added = self.conn.total_changes - before
+            # Кошельки, лейбл которых пришёл раньше предикта (коррелированный подзапрос —
+            # UPDATE ... FROM есть только с SQLite 3.33)
+            self.conn.execute(
+                "UPDATE predictions SET label = (SELECT w.label FROM wallet_labels AS w "
+                "WHERE w.wallet_address = predictions.wallet_address), labelled_at = ?, label_source = 'wallet' "
+                "WHERE label IS NULL AND ts >= ? "
+                "AND wallet_address IN (SELECT wallet_address FROM wallet_labels)", (time.time(), float(ts.min())))
+            self._set_state("predictions_ts", max(float(ts.max()), last_ts or 0.0))
+        return added
+
+    def ingest_labels(self, labels):
+        """
+        Батч лейблов: DataFrame с колонкой label и prediction_id и/или wallet_address.
+        Лейбл кошелька не перезаписывает предикты, размеченные по prediction_id.
+        Возвращает {"by_id": строк обновлено, "by_wallet": строк обновлено}.
+        """
+        if "label" not in labels.columns:
+            raise ValueError("В батче лейблов нет колонки label")
+        labels = labels.reindex(columns=["prediction_id", "wallet_address", "label"]).dropna(subset=["label"])
+        now = time.time()
+        # Строка с prediction_id размечает один предикт, без него — кошелёк целиком
+        by_id = labels[labels["prediction_id"].notna()]
+        by_wallet = labels[labels["prediction_id"].isna() & labels["wallet_address"].notna()]
+
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "UPDATE predictions SET label = ?, labelled_at = ?, label_source = 'id' WHERE prediction_id = ?",
+                zip(by_id["label"].astype(int).tolist(), [now] * len(by_id), by_id["prediction_id"].astype(str)))
+            updated_by_id = self.conn.total_changes - before
+
+            wallet_rows = list(zip(by_wallet["wallet_address"].astype(str), by_wallet["label"].astype(int).tolist()))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO wallet_labels (wallet_address, label, labelled_at) VALUES (?, ?, ?)",
+                [(w, label, now) for w, label in wallet_rows])
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "UPDATE predictions SET label = ?, labelled_at = ?, label_source = 'wallet' "
+                "WHERE wallet_address = ? AND (label IS NULL OR label_source = 'wallet')",
+                [(label, now, w) for w, label in wallet_rows])
+            updated_by_wallet = self.conn.total_changes - before
+        return {"by_id": updated_by_id, "by_wallet": updated_by_wallet}
+
+    def unlabelled(self, start_ts=None):
+        """Предикты без лейбла (prediction_id, wallet_address, score) — для симуляции лейблов."""
+        return pd.read_sql_query(
+            "SELECT prediction_id, wallet_address, score FROM predictions WHERE label IS NULL AND ts >= ?",
+            self.conn, params=(start_ts or 0.0,))
+
+    def labels_for(self, prediction_ids):
+        """Лейблы по списку prediction_id: DataFrame (prediction_id, label)."""
+        frames = []
+        ids = list(prediction_ids)
+        for start in range(0, len(ids), 900):   # лимит параметров SQLite
+            chunk = ids[start:start + 900]
+            frames.append(pd.read_sql_query(
+                f"SELECT prediction_id, label FROM predictions WHERE label IS NOT NULL "
+                f"AND prediction_id IN ({','.join('?' * len(chunk))})", self.conn, params=chunk))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["prediction_id", "label"])
+
+    # ------------------------------------------------------------------
+    # Оконные метрики
+    # ------------------------------------------------------------------
+    def refresh_quality(self, threshold, granularities=tuple(GRANULARITIES), rebuild=False, version_threshold=None):
+        """
+        Пересчитывает метрики окон, в которые с прошлого запуска пришли лейблы
+        (rebuild=True — все окна). version_threshold(model_version) — порог версии,
+        которой сделан предикт (например, model_registry.version_threshold); для
+        неизвестных версий и по умолчанию — threshold. Возвращает число пересчитанных окон.
+        """
+        known = {}
+
+        def thresholds_for(versions):
+            names, inverse = np.unique(versions.astype(str), return_inverse=True)
+            for name in names:
+                if name not in known:
+                    found = version_threshold(name) if version_threshold is not None else None
+                    known[name] = float(threshold if found is None else found)
+            return np.array([known[name] for name in names])[inverse]
+
+        run_started = time.time()
+        since = -1.0 if rebuild else self._get_state("quality_run", -1.0)
+        refreshed = 0
+        with self.conn:
+            for granularity in granularities:
+                size = GRANULARITIES[granularity]
+                windows = [row[0] for row in self.conn.execute(
+                    "SELECT DISTINCT CAST(ts / ? AS INTEGER) * ? FROM predictions "
+                    "WHERE labelled_at > ? AND label IS NOT NULL", (size, size, since))]
+                for window_start in windows:
+                    scores, labels, versions = self._window_rows(window_start, window_start + size)
+                    if not len(scores):
+                        continue
+                    row_thresholds = thresholds_for(versions)
+                    m = window_metrics(scores, labels, row_thresholds)
+                    # Порог окна сохраняем, только если он у всех строк один
+                    window_threshold = float(row_thresholds[0]) if np.all(row_thresholds == row_thresholds[0]) else None
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO quality_windows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (granularity, float(window_start), m["n"], m["positives"], m["roc_auc"], m["f1"],
+                         m["brier"], m["ece"], m["mean_score"], window_threshold, run_started))
+                    refreshed += 1
+            self._set_state("quality_run", run_started)
+        return refreshed
+
+    def _window_rows(self, start, end):
+        rows = self.conn.execute(
+            "SELECT score, label, model_version FROM predictions WHERE ts >= ? AND ts < ? AND label IS NOT NULL",
+            (start, end)).fetchall()
+        if not rows:
+            return np.empty(0), np.empty(0), np.empty(0, dtype=object)
+        scores, labels, versions = zip(*rows)
+        return (np.asarray(scores, dtype=np.float64), np.asarray(labels, dtype=np.float64),
+                np.asarray(versions, dtype=object))
+
+    def quality_windows(self, granularity="day", last=None):
+        """Метрики окон по возрастанию времени (last — только последние N окон)."""
+        query = "SELECT * FROM quality_windows WHERE granularity = ? ORDER BY window_start DESC"
+        params = [granularity]
+        if last:
+            query += " LIMIT ?"
+            params.append(int(last))
+        df = pd.read_sql_query(query, self.conn, params=params).iloc[::-1].reset_index(drop=True)
+        df.insert(1, "window", pd.to_datetime(df["window_start"], unit="s"))
+        return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Загрузка батча лейблов и пересчёт оконных метрик")
+    parser.add_argument("--labels", default=None, help="CSV/Parquet: label + prediction_id и/или wallet_address")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать все окна")
+    args = parser.parse_args()
+
+    from src.model_registry import current_threshold, version_threshold
+
+    store = LabelStore()
+    print(f"📥 Новых предиктов из логов: {store.ingest_predictions()}")
+    if args.labels:
+        batch = pd.read_parquet(args.labels) if args.labels.endswith(".parquet") else pd.read_csv(args.labels)
+        print(f"🏷️ Лейблы: {store.ingest_labels(batch)}")
+    refreshed = store.refresh_quality(current_threshold(), rebuild=args.rebuild, version_threshold=version_threshold)
+    print(f"🔁 Пересчитано окон: {refreshed}")
+    store.close()
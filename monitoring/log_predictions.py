@@ -1,8 +1,18 @@
 # monitoring/log_predictions.py
 import json
 import os
+import random
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
+LOG_DIR = "monitoring/logs"
+
+# Политики поведения при переполнении очереди
+BACKPRESSURE_POLICIES = ("block", "drop", "sample")
+
+
 def log_prediction(features: dict, score: float, model_usage="lightgbm_v1"):
     """
     Логирует предикт в JSONL-файл с датой и фичами
@@ -10,16 +20,246 @@ def log_prediction(features: dict, score: float, model_usage="lightgbm_v1"):
     # Используем datetime.utcnow() — работает везде, несмотря на предупреждение
     timestamp = datetime.utcnow().isoformat()
     date_str = datetime.utcnow().strftime("%Y-%m-%d")
-    
+
     log_entry = {
         "timestamp": timestamp,
         "model_version": model_usage,
         "score": float(score),
         "features": features
     }
-    
+
     os.makedirs("monitoring/logs", exist_ok=True)
     log_path = f"monitoring/logs/predictions_{date_str}.jsonl"
-    
+
     with open(log_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
\ No newline at end of file
+        f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+
+
+class AsyncPredictionLogger:
+    """
+    Фоновый логгер предиктов.
+
+    Запрос только кладёт батч (матрица фичей + скоры) в ограниченную очередь,
+    а поток-писатель раз в flush_interval секунд или по накоплении batch_size
+    строк превращает их в JSONL и пишет одним буферизованным write на файл дня.
+    Формат строк совпадает с log_prediction; строки, отданные из кэша
+    предиктов, дополнительно помечаются "cached": true, а prediction_id и
+    wallet_address (если переданы) связывают предикт с будущим лейблом.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, max_queue_rows=100_000, batch_size=1000,
+                 flush_interval=1.0, policy="block", sample_rate=0.1):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Неизвестная политика '{policy}', ожидается одна из {BACKPRESSURE_POLICIES}")
+        self.log_dir = log_dir
+        self.max_queue_rows = max_queue_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.sample_rate = sample_rate
+
+        self._queue = deque()
+        self._queued_rows = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+        # Счётчики
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.batches_written = 0
+        self.write_errors = 0
+        self.encode_errors = 0
+
+    # ------------------------------------------------------------------
+    # Публичный API
+    # ------------------------------------------------------------------
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._closed = False
+                self._thread = threading.Thread(target=self._run, name="prediction-logger", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, features, scores, feature_names, model_version="lightgbm_v1", cached=None,
+               prediction_ids=None, wallets=None):
+        """
+        Ставит батч в очередь. features — 2-D массив (строки в порядке feature_names),
+        scores — 1-D массив скоров, cached — необязательная маска строк из кэша,
+        prediction_ids и wallets — необязательные списки по строкам.
+        Возвращает число принятых строк.
+        """
+        n = len(scores)
+        if n == 0:
+            return 0
+        if self._thread is None:
+            self.start()
+
+        timestamp = datetime.utcnow()
+        with self._cond:
+            if self._closed:
+                self.dropped += n
+                return 0
+
+            free = self.max_queue_rows - self._queued_rows
+            if n > free:
+                if self.policy == "block":
+                    while self._queued_rows + n > self.max_queue_rows and self._queued_rows > 0 and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        # Разбудил close(): финальный сброс уже идёт, батч в очередь не ставим
+                        self.dropped += n
+                        return 0
+                elif self.policy == "sample":
+                    # Под нагрузкой оставляем только долю строк
+                    keep = [i for i in range(n) if random.random() < self.sample_rate]
+                    self.sampled_out += n - len(keep)
+                    features, scores, cached, prediction_ids, wallets = (
+                        None if rows is None else [rows[i] for i in keep]
+                        for rows in (features, scores, cached, prediction_ids, wallets))
+                    n = len(keep)
+
+                free = self.max_queue_rows - self._queued_rows
+                if self.policy != "block" and n > free:
+                    self.dropped += n - max(free, 0)
+                    n = max(free, 0)
+                    features, scores, cached, prediction_ids, wallets = (
+                        None if rows is None else rows[:n]
+                        for rows in (features, scores, cached, prediction_ids, wallets))
+
+            if n == 0:
+                return 0
+            self._queue.append((timestamp, model_version, feature_names, features, scores, cached,
+                                prediction_ids, wallets))
+            self._queued_rows += n
+            if self._queued_rows >= self.batch_size:
+                self._cond.notify_all()
+        return n
+
+    def flush(self, timeout=None):
+        """Ждёт, пока поток-писатель опустошит очередь."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._queued_rows > 0 and self._thread is not None and self._thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Останавливает поток с финальным сбросом очереди на диск."""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queued_rows,
+            "queue_capacity": self.max_queue_rows,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "batches_written": self.batches_written,
+            "write_errors": self.write_errors,
+            "encode_errors": self.encode_errors,
+            "policy": self.policy,
+        }
+
+    # ------------------------------------------------------------------
+    # Поток-писатель
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._queued_rows < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                items = list(self._queue)
+                self._queue.clear()
+                rows = self._queued_rows
+                closed = self._closed
+
+            try:
+                if items:
+                    self._write(items)
+            except Exception as e:
+                # Поток-писатель не должен умирать: иначе submit() с политикой block зависнет навсегда
+                self.write_errors += 1
+                self._drop(rows)
+                print(f"❌ Ошибка лога предиктов: {type(e).__name__}: {e}")
+            finally:
+                with self._cond:
+                    self._queued_rows -= rows
+                    self._cond.notify_all()
+            with self._cond:
+                if closed and not self._queue:
+                    return
+
+    def _drop(self, n):
+        # dropped увеличивает и submit() — считаем под той же блокировкой
+        with self._cond:
+            self.dropped += n
+
+    def _write(self, items):
+        # Группируем строки по файлу дня — один open/write на файл за батч
+        chunks = {}
+        rows = 0
+        for item in items:
+            timestamp, n = item[0], len(item[4])
+            try:
+                lines = self._serialize(*item)
+            except Exception as e:
+                # Несериализуемое значение (например, объект вместо адреса) — теряем только этот батч
+                self.encode_errors += 1
+                self._drop(n)
+                print(f"❌ Батч лога предиктов не сериализуется: {type(e).__name__}: {e}")
+                continue
+            chunks.setdefault(timestamp.strftime("%Y-%m-%d"), []).extend(lines)
+            rows += n
+        if not chunks:
+            return
+
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            for date_str, lines in chunks.items():
+                log_path = os.path.join(self.log_dir, f"predictions_{date_str}.jsonl")
+                # Один системный write на батч: строки нескольких процессов (воркеры gunicorn)
+                # не перемешиваются внутри файла
+                data = memoryview(("\n".join(lines) + "\n").encode("utf-8"))
+                with open(log_path, "ab", buffering=0) as f:
+                    while data:
+                        data = data[f.write(data):]
+            self.written += rows
+            self.batches_written += 1
+        except Exception as e:
+            self.write_errors += 1
+            self._drop(rows)
+            print(f"❌ Ошибка записи лога предиктов: {type(e).__name__}: {e}")
+
+    @staticmethod
+    def _serialize(timestamp, model_version, feature_names, features, scores, cached, prediction_ids, wallets):
+        ts = timestamp.isoformat()
+        if hasattr(features, "tolist"):
+            features = features.tolist()
+        lines = []
+        for i, (row, score) in enumerate(zip(features, scores)):
+            entry = {
+                "timestamp": ts,
+                "model_version": model_version,
+                "score": float(score),
+                "features": dict(zip(feature_names, row))
+            }
+            if prediction_ids is not None:
+                entry["prediction_id"] = prediction_ids[i]
+            if wallets is not None and wallets[i] is not None:
+                entry["wallet_address"] = wallets[i]
+            if cached is not None and cached[i]:
+                entry["cached"] = True
+            lines.append(json.dumps(entry, ensure_ascii=False))
+        return lines
@@ -0,0 +1,139 @@
+# monitoring/log_reader.py
+"""
+Инкрементальное чтение логов предиктов.
+
+LogReader помнит, до какого байта прочитан каждый predictions_*.jsonl, и при
+каждом вызове read_new отдаёт только дописанные с тех пор целые строки —
+недописанный хвост остаётся до следующего раза. Один разбор батча отдаётся
+всем мониторам (monitoring/scheduler.py); смещения фиксируются commit-ом
+после обработки и сохраняются вызывающим вместе с его состоянием.
+
+Каждая строка батча несёт log_file и log_offset (конец строки в байтах файла),
+а batch.attrs["offsets"] / ["fingerprints"] — позиции, до которых дочитан батч:
+по ним потребитель может сделать повторную обработку идемпотентной.
+
+Вместе со смещением хранится отпечаток файла — хэш его первой строки: если файл
+обрезан и заново дописан дальше прежнего смещения (или пересоздан), отпечаток
+не совпадёт и файл перечитывается с начала.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from monitoring.log_store import LOG_DIR, META_COLUMNS, _log_dates, _log_path, parse_lines
+
+READ_CHUNK_BYTES = 64 << 20   # не больше стольких байт за один read_new
+FINGERPRINT_BYTES = 4096      # хэшируем первую строку, но не больше стольких байт
+
+
+def file_fingerprint(path):
+    """Хэш первой строки файла (или первых FINGERPRINT_BYTES байт); None — если она ещё не дописана."""
+    with open(path, "rb") as f:
+        head = f.read(FINGERPRINT_BYTES)
+    end = head.find(b"\n")
+    if end >= 0:
+        head = head[:end + 1]
+    elif len(head) < FINGERPRINT_BYTES:
+        return None
+    return hashlib.blake2b(head, digest_size=8).hexdigest()
+
+
+class LogReader:
+    """
+    offsets — {имя файла: прочитано байт}, fingerprints — {имя файла: отпечаток},
+    например из сохранённого состояния.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, offsets=None, max_bytes=READ_CHUNK_BYTES, fingerprints=None):
+        self.log_dir = log_dir
+        self.offsets = dict(offsets or {})
+        self.fingerprints = dict(fingerprints or {})
+        self.max_bytes = max_bytes
+        self._pending = None
+
+    def read_new(self):
+        """
+        Новые строки всех дневных файлов (по порядку дат) одним DataFrame.
+        Пустой DataFrame — если ничего не дописано. Смещения сдвигаются только после commit().
+        """
+        pending = dict(self.offsets)
+        fingerprints = dict(self.fingerprints)
+        budget = self.max_bytes
+        frames = []
+        names = []
+        for date_str in _log_dates(self.log_dir):
+            path = _log_path(date_str, self.log_dir)
+            name = os.path.basename(path)
+            names.append(name)
+            if budget <= 0:
+                continue
+            try:
+                size = os.path.getsize(path)
+                fingerprint = file_fingerprint(path)
+            except OSError:
+                continue
+            offset = pending.get(name, 0)
+            if size < offset:
+                # Файл пересоздан или обрезан — читаем заново
+                print(f"⚠️ {path} стал короче прочитанного ({size} < {offset}) — читаем с начала")
+                offset = 0
+            elif offset and name in fingerprints and fingerprints[name] != fingerprint:
+                # Обрезан и дописан дальше прежнего смещения: размер этого не выдаёт
+                print(f"⚠️ {path} переписан (первая строка изменилась) — читаем с начала")
+                offset = 0
+            if size == offset:
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read(min(size - offset, budget))
+            end = data.rfind(b"\n")
+            if end < 0:
+                continue   # строка ещё дописывается
+            data = data[:end + 1]
+            raw = data.split(b"\n")[:-1]
+            ends = offset + np.cumsum([len(line) + 1 for line in raw])
+            frame = parse_lines([line.decode("utf-8", errors="replace") for line in raw],
+                                source=f"{path}@{offset}", positions=ends.tolist())
+            frame.insert(0, "log_file", name)
+            frames.append(frame)
+            pending[name] = offset + len(data)
+            fingerprints[name] = fingerprint if fingerprint is not None else file_fingerprint(path)
+            budget -= len(data)
+
+        # Удалённые (компактированные) файлы забываем
+        self._pending = ({name: pending[name] for name in names if name in pending},
+                         {name: fingerprints[name] for name in names if name in fingerprints})
+        frames = [f for f in frames if len(f)]
+        batch = pd.concat(frames, ignore_index=True) if frames else \
+            pd.DataFrame(columns=["log_file"] + META_COLUMNS + ["log_offset"])
+        batch.attrs["offsets"], batch.attrs["fingerprints"] = (dict(d) for d in self._pending)
+        return batch
+
+    def commit(self):
+        """Фиксирует смещения последнего read_new."""
+        if self._pending is not None:
+            self.offsets, self.fingerprints = self._pending
+            self._pending = None
+        return self.offsets
+
+    def commit_to(self, batch):
+        """Фиксирует позиции, до которых дочитан batch (например, прочитанный другим LogReader-ом)."""
+        self.offsets = dict(batch.attrs["offsets"])
+        self.fingerprints = dict(batch.attrs["fingerprints"])
+        self._pending = None
+        return self.offsets
+
+    def backlog_bytes(self):
+        """Сколько байт логов ещё не прочитано."""
+        total = 0
+        for date_str in _log_dates(self.log_dir):
+            path = _log_path(date_str, self.log_dir)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            offset = self.offsets.get(os.path.basename(path), 0)
+            total += size - offset if size >= offset else size
+        return total
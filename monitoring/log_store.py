@@ -0,0 +1,296 @@
+# monitoring/log_store.py
+"""
+Колоночное хранилище логов предиктов.
+
+JSONL-файлы monitoring/logs/predictions_YYYY-MM-DD.jsonl компактируются в
+Parquet-партиции monitoring/log_store/date=YYYY-MM-DD[/hour=HH]/part.parquet
+с плоской типизированной схемой: timestamp, model_version, score, prediction_id,
+wallet_address и по колонке float64 на каждую фичу модели. read_predictions читает только нужные
+партиции и колонки; ещё не компактированные дни дочитываются из JSONL.
+"""
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.model_registry import current_model_path
+
+LOG_DIR = "monitoring/logs"
+STORE_DIR = "monitoring/log_store"
+MANIFEST_NAME = "_manifest.json"
+
+# Настройки по умолчанию
+PARTITION = "day"            # "day" или "hour"
+RETENTION_DAYS = 90          # сколько дней храним партиции
+DELETE_COMPACTED_JSONL = False
+
+META_COLUMNS = ["timestamp", "model_version", "score", "prediction_id", "wallet_address"]
+
+
+def _log_path(date_str, log_dir=LOG_DIR):
+    return os.path.join(log_dir, f"predictions_{date_str}.jsonl")
+
+
+def _log_dates(log_dir=LOG_DIR):
+    if not os.path.isdir(log_dir):
+        return []
+    dates = []
+    for name in os.listdir(log_dir):
+        if name.startswith("predictions_") and name.endswith(".jsonl"):
+            dates.append(name[len("predictions_"):-len(".jsonl")])
+    return sorted(dates)
+
+
+def _model_feature_names(model_path=None):
+    model_path = model_path or current_model_path()
+    if not os.path.exists(model_path):
+        return None
+    import joblib
+    return list(joblib.load(model_path).feature_name_)
+
+
+def parse_jsonl(path, feature_names=None):
+    """
+    Разбирает JSONL-лог в плоский DataFrame (META_COLUMNS + фичи).
+    Битые строки пропускаются с предупреждением.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_lines(f, feature_names, source=path)
+
+
+def parse_lines(lines, feature_names=None, source="", first_line=1, positions=None):
+    """
+    Строки JSONL → плоский DataFrame; общий разбор для файлов и дочитанных хвостов (log_reader).
+    positions — необязательные позиции строк (конец строки в байтах файла): для принятых
+    строк они попадают в колонку log_offset.
+    """
+    timestamps, versions, scores, features, ids, wallets, kept = [], [], [], [], [], [], []
+    positions = iter(positions) if positions is not None else None
+    for line_num, line in enumerate(lines, first_line):
+        position = next(positions) if positions is not None else None
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+            if not isinstance(entry, dict) or not isinstance(entry.get("features"), dict) or "score" not in entry:
+                print(f"⚠️ Неверный формат в строке {line_num} файла {source}")
+                continue
+        except Exception as e:
+            print(f"❌ Ошибка в строке {line_num} файла {source}: {e}")
+            continue
+        timestamps.append(entry.get("timestamp"))
+        versions.append(entry.get("model_version"))
+        scores.append(entry["score"])
+        features.append(entry["features"])
+        ids.append(entry.get("prediction_id"))
+        wallets.append(entry.get("wallet_address"))
+        kept.append(position)
+
+    df = pd.DataFrame({
+        "timestamp": pd.to_datetime(pd.Series(timestamps, dtype="object"), errors="coerce"),
+        "model_version": pd.Series(versions, dtype="string"),
+        "score": pd.Series(scores, dtype="float64"),
+        "prediction_id": pd.Series(ids, dtype="string"),
+        "wallet_address": pd.Series(wallets, dtype="string"),
+    })
+    if positions is not None:
+        df["log_offset"] = pd.Series(kept, dtype="int64")
+    feat_df = pd.DataFrame(features)
+    if feature_names is not None:
+        feat_df = feat_df.reindex(columns=feature_names)
+    feat_df = feat_df.apply(pd.to_numeric, errors="coerce").astype("float64")
+    return pd.concat([df, feat_df], axis=1)
+
+
+def _load_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _write_partitions(df, date_str, store_dir, partition):
+    date_dir = os.path.join(store_dir, f"date={date_str}")
+    # Пишем во временную папку и подменяем целиком — читатели не видят полузаписанный день
+    tmp_dir = date_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    if partition == "hour":
+        hours = df["timestamp"].dt.hour.fillna(0).astype(int)
+        for hour, part in df.groupby(hours):
+            hour_dir = os.path.join(tmp_dir, f"hour={hour:02d}")
+            os.makedirs(hour_dir)
+            part.to_parquet(os.path.join(hour_dir, "part.parquet"), index=False)
+    else:
+        df.to_parquet(os.path.join(tmp_dir, "part.parquet"), index=False)
+    shutil.rmtree(date_dir, ignore_errors=True)
+    os.replace(tmp_dir, date_dir)
+
+
+def compact_logs(partition=PARTITION, include_today=False, delete_source=DELETE_COMPACTED_JSONL,
+                 log_dir=LOG_DIR, store_dir=STORE_DIR, feature_names=None):
+    """
+    Компактирует JSONL-логи в Parquet. По умолчанию текущий день не трогаем —
+    в него ещё пишет API. Файл перекомпактируется, если изменился его размер.
+    """
+    if partition not in ("day", "hour"):
+        raise ValueError("partition должен быть 'day' или 'hour'")
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = _load_manifest(store_dir)
+    if feature_names is None:
+        feature_names = _model_feature_names()
+
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    compacted = []
+    for date_str in _log_dates(log_dir):
+        if date_str == today and not include_today:
+            continue
+        path = _log_path(date_str, log_dir)
+        size = os.path.getsize(path)
+        known = manifest.get(date_str)
+        if known and known["size"] == size and known["partition"] == partition:
+            continue
+
+        df = parse_jsonl(path, feature_names)
+        _write_partitions(df, date_str, store_dir, partition)
+        manifest[date_str] = {"size": size, "rows": len(df), "partition": partition}
+        _save_manifest(store_dir, manifest)
+        compacted.append(date_str)
+        print(f"📦 {path}: {len(df)} строк → {store_dir}/date={date_str}")
+
+        if delete_source and date_str != today:
+            os.remove(path)
+            manifest[date_str]["source_deleted"] = True
+            _save_manifest(store_dir, manifest)
+
+    return compacted
+
+
+def apply_retention(retention_days=RETENTION_DAYS, store_dir=STORE_DIR):
+    """Удаляет партиции старше retention_days дней."""
+    if not os.path.isdir(store_dir):
+        return []
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+    manifest = _load_manifest(store_dir)
+    removed = []
+    for name in os.listdir(store_dir):
+        if name.startswith("date=") and not name.endswith(".tmp") and name[len("date="):] < cutoff:
+            shutil.rmtree(os.path.join(store_dir, name))
+            manifest.pop(name[len("date="):], None)
+            removed.append(name)
+    _save_manifest(store_dir, manifest)
+    return removed
+
+
+def _partition_files(store_dir, start, end, days):
+    """Файлы партиций из days, пересекающихся с [start, end)."""
+    files = []
+    if not os.path.isdir(store_dir):
+        return files
+    for name in sorted(os.listdir(store_dir)):
+        if not name.startswith("date=") or name[len("date="):] not in days:
+            continue
+        day = datetime.strptime(name[len("date="):], "%Y-%m-%d")
+        if (start is not None and day + timedelta(days=1) <= start) or (end is not None and day >= end):
+            continue
+        date_dir = os.path.join(store_dir, name)
+        for sub in sorted(os.listdir(date_dir)):
+            sub_path = os.path.join(date_dir, sub)
+            if sub.startswith("hour="):
+                hour_start = day + timedelta(hours=int(sub[len("hour="):]))
+                if (start is not None and hour_start + timedelta(hours=1) <= start) or \
+                        (end is not None and hour_start >= end):
+                    continue
+                files.append(os.path.join(sub_path, "part.parquet"))
+            elif sub.endswith(".parquet"):
+                files.append(sub_path)
+    return files
+
+
+def read_predictions(start=None, end=None, columns=None, log_dir=LOG_DIR, store_dir=STORE_DIR):
+    """
+    Возвращает логи предиктов за [start, end) в виде плоского DataFrame.
+
+    columns — список нужных колонок (например ["score"]); читаются только они.
+    Дни, которых ещё нет в хранилище, дочитываются из JSONL.
+    """
+    if isinstance(start, str):
+        start = pd.Timestamp(start).to_pydatetime()
+    if isinstance(end, str):
+        end = pd.Timestamp(end).to_pydatetime()
+    need_time_filter = start is not None or end is not None
+    read_cols = None
+    if columns is not None:
+        read_cols = list(columns)
+        if need_time_filter and "timestamp" not in read_cols:
+            read_cols.append("timestamp")
+
+    # День берём из хранилища, только если JSONL с тех пор не дописывался
+    manifest = _load_manifest(store_dir) if os.path.isdir(store_dir) else {}
+    compacted_days = set()
+    for date_str, info in manifest.items():
+        path = _log_path(date_str, log_dir)
+        if not os.path.exists(path) or os.path.getsize(path) == info["size"]:
+            compacted_days.add(date_str)
+
+    frames = []
+    for path in _partition_files(store_dir, start, end, compacted_days):
+        available = pq.read_schema(path).names
+        cols = None if read_cols is None else [c for c in read_cols if c in available]
+        frames.append(pd.read_parquet(path, columns=cols))
+
+    for date_str in _log_dates(log_dir):
+        if date_str in compacted_days:
+            continue
+        day = datetime.strptime(date_str, "%Y-%m-%d")
+        if (start is not None and day + timedelta(days=1) <= start) or (end is not None and day >= end):
+            continue
+        df = parse_jsonl(_log_path(date_str, log_dir))
+        if read_cols is not None:
+            df = df[[c for c in read_cols if c in df.columns]]
+        frames.append(df)
+
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=columns if columns is not None else META_COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+
+    if need_time_filter:
+        mask = np.ones(len(df), dtype=bool)
+        if start is not None:
+            mask &= (df["timestamp"] >= start).to_numpy()
+        if end is not None:
+            mask &= (df["timestamp"] < end).to_numpy()
+        df = df.loc[mask].reset_index(drop=True)
+    if columns is not None:
+        df = df.reindex(columns=list(columns))
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Компактирование логов предиктов в Parquet")
+    parser.add_argument("--partition", choices=["day", "hour"], default=PARTITION)
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--include-today", action="store_true")
+    parser.add_argument("--delete-source", action="store_true", default=DELETE_COMPACTED_JSONL)
+    args = parser.parse_args()
+
+    compact_logs(partition=args.partition, include_today=args.include_today, delete_source=args.delete_source)
+    removed = apply_retention(args.retention_days)
+    if removed:
+        print(f"🗑️ Удалено партиций по ретенции: {len(removed)}")
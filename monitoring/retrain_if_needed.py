@@ -2,16 +2,32 @@
 import subprocess
 import sys
 
-def retrain_if_needed():
+def retrain_if_needed(drift_mode="raw", retrain_mode="full"):
     print("🔍 Проверка необходимости переобучения...")
     
     from monitoring.check_data_drift import check_data_drift
     from monitoring.check_score_drift import check_score_drift
+    from monitoring.log_store import compact_logs, apply_retention
 
-    feature_drift = check_data_drift()
-    score_drift = check_score_drift()
+    # Сначала докладываем закрытые дни в Parquet-хранилище
+    compact_logs()
+    apply_retention()
+
+    feature_drift = check_data_drift(drift_mode)
+    score_drift = check_score_drift(drift_mode)
     
     if feature_drift or score_drift:
+        if retrain_mode == "incremental":
+            # Дообучение текущей модели на новых лейблах, без полного пайплайна
+            from src.retrain import incremental_retrain
+            print("🔄 Дообучение модели на новых лейблах...")
+            report = incremental_retrain()
+            if report["published"]:
+                print(f"✅ Модель дообучена и опубликована: {report['published']}")
+            else:
+                print(f"⚠️ Новая версия не опубликована: {report.get('reason')}")
+            return
+
         print("🔄 Запуск переобучения модели...")
         result = subprocess.run([sys.executable, "train_pipeline.py"], capture_output=True, text=True)
         if result.returncode == 0:
@@ -23,4 +39,13 @@ def retrain_if_needed():
         print("ℹ️ Переобучение не требуется")
 
 if __name__ == "__main__":
-    retrain_if_needed()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drift-mode", choices=["raw", "sketch", "stream"], default="raw",
+                        help="raw — по логам предиктов, sketch — по потоковым скетчам API, "
+                             "stream — по скетчам демона мониторинга")
+    parser.add_argument("--retrain-mode", choices=["full", "incremental"], default="full",
+                        help="full — весь train_pipeline.py, incremental — дообучение текущей модели (src.retrain)")
+    args = parser.parse_args()
+    retrain_if_needed(args.drift_mode, args.retrain_mode)
\ No newline at end of file
@@ -0,0 +1,252 @@
+# monitoring/scheduler.py
+"""
+Резидентный демон мониторинга.
+
+Раз в MONITOR_POLL_INTERVAL секунд LogReader дочитывает из логов предиктов
+только новые строки — один разбор на всех потребителей:
+  * sketches — дневные скетчи дрейфа (фичи + score) в monitoring/stream_sketches/;
+  * labels   — предикты в хранилище лейблов (monitoring/label_store.py).
+Задачи запускаются по своим интервалам и читают уже накопленное, а не логи:
+  * drift    — retrain_if_needed по скетчам демона (--drift-mode stream);
+  * quality  — оконные метрики по лейблам.
+Смещения (и отпечатки) логов — свои у каждого потребителя — и время последних
+запусков задач хранятся в monitoring/scheduler_state.json — после перезапуска
+демон продолжает с места. Упавший потребитель смещений не сдвигает и получает
+те же строки повторно, с экспоненциальной паузой (до MONITOR_MAX_BACKOFF секунд).
+
+    python -m monitoring.scheduler            # демон (SIGTERM/Ctrl+C — штатная остановка)
+    python -m monitoring.scheduler --once     # один проход, например из cron
+"""
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from monitoring.drift_sketch import STREAM_SKETCH_DIR, SKETCH_REFERENCE_PATH, DriftSketch, load_sketch_reference
+from monitoring.log_reader import LogReader
+from monitoring.log_store import LOG_DIR
+
+STATE_PATH = "monitoring/scheduler_state.json"
+POLL_INTERVAL = float(os.getenv("MONITOR_POLL_INTERVAL", "30"))
+DRIFT_INTERVAL = float(os.getenv("MONITOR_DRIFT_INTERVAL", "3600"))
+QUALITY_INTERVAL = float(os.getenv("MONITOR_QUALITY_INTERVAL", "3600"))
+RETRAIN_MODE = os.getenv("MONITOR_RETRAIN_MODE", "full")
+MAX_BACKOFF = float(os.getenv("MONITOR_MAX_BACKOFF", "600"))   # потолок паузы перед повтором упавшего потребителя
+
+
+class StreamSketchConsumer:
+    """Дописывает новые строки логов в дневные скетчи на границах текущего референса."""
+
+    name = "sketches"
+
+    def __init__(self, sketch_dir=STREAM_SKETCH_DIR, reference_path=SKETCH_REFERENCE_PATH):
+        self.sketch_dir = sketch_dir
+        self.reference_path = reference_path
+
+    def consume(self, batch):
+        # Референс перечитываем каждый раз: после переобучения границы бинов меняются
+        reference = load_sketch_reference(self.reference_path)
+        if reference is None:
+            return
+        # Строки с неразобранной меткой времени groupby отбросил бы молча — кладём их в день чтения
+        days = batch["timestamp"].dt.strftime("%Y-%m-%d").fillna(datetime.utcnow().strftime("%Y-%m-%d"))
+        for date_str, part in batch.groupby(days):
+            path = os.path.join(self.sketch_dir, f"sketch_{date_str}_stream.npz")
+            sketch = DriftSketch.load(path) if os.path.exists(path) else None
+            if sketch is None or sketch.columns != reference.columns or \
+                    not np.array_equal(sketch.edges, reference.edges, equal_nan=True):
+                # Новый референс — день копится заново на новых границах
+                consumed = sketch.consumed if sketch is not None else {}
+                sketch = reference.empty_like()
+                sketch.consumed = consumed
+            # Строки, уже учтённые в скетче (сбой между его записью и сдвигом смещений), второй раз не считаем
+            done = part["log_file"].map({name: self._consumed_offset(sketch, name, batch)
+                                         for name in part["log_file"].unique()})
+            part = part[part["log_offset"] > done]
+            sketch.update(part.reindex(columns=reference.columns).to_numpy(dtype=np.float64))
+            for name in batch["log_file"].unique():
+                sketch.consumed[name] = [batch.attrs["fingerprints"].get(name), batch.attrs["offsets"][name]]
+            sketch.save(path)
+
+    @staticmethod
+    def _consumed_offset(sketch, name, batch):
+        fingerprint, offset = sketch.consumed.get(name, (None, 0))
+        # Файл переписан — прежняя отметка к нему не относится
+        return offset if fingerprint == batch.attrs["fingerprints"].get(name) else 0
+
+
+class LabelStoreConsumer:
+    """Добавляет новые предикты (с prediction_id) в хранилище лейблов."""
+
+    name = "labels"
+
+    def consume(self, batch):
+        from monitoring.label_store import LabelStore
+        store = LabelStore()
+        try:
+            store.add_predictions(batch)
+        finally:
+            store.close()
+
+
+def _drift_job():
+    from monitoring.retrain_if_needed import retrain_if_needed
+    retrain_if_needed(drift_mode="stream", retrain_mode=RETRAIN_MODE)
+
+
+def _quality_job():
+    from monitoring.check_model_quality import check_model_quality
+    check_model_quality(ingest=False)
+
+
+def default_consumers():
+    return [StreamSketchConsumer(), LabelStoreConsumer()]
+
+
+def default_jobs():
+    """{имя: (интервал в секундах, функция)}."""
+    return {"drift": (DRIFT_INTERVAL, _drift_job), "quality": (QUALITY_INTERVAL, _quality_job)}
+
+
+class MonitoringScheduler:
+    def __init__(self, consumers=None, jobs=None, state_path=STATE_PATH, poll_interval=POLL_INTERVAL,
+                 log_dir=LOG_DIR):
+        self.consumers = default_consumers() if consumers is None else consumers
+        self.jobs = default_jobs() if jobs is None else jobs
+        self.state_path = state_path
+        self.poll_interval = poll_interval
+        self.state = self._load_state()
+        # У каждого потребителя свои смещения: упавший не сдвигает их и дочитает своё при повторе.
+        # Старое состояние с общими смещениями достаётся всем потребителям.
+        shared = {"offsets": self.state.pop("offsets", {}), "fingerprints": self.state.pop("fingerprints", {})}
+        positions = self.state.get("consumers", {})
+        self.readers = {}
+        for consumer in self.consumers:
+            position = positions.get(consumer.name, shared)
+            self.readers[consumer.name] = LogReader(log_dir, position.get("offsets"),
+                                                    fingerprints=position.get("fingerprints"))
+        self._failures = {}
+        self._retry_at = {}
+        self._stop = threading.Event()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"consumers": {}, "last_run": {}, "rows_read": 0}
+
+    def _save_state(self):
+        self.state["consumers"] = {name: {"offsets": reader.offsets, "fingerprints": reader.fingerprints}
+                                   for name, reader in self.readers.items()}
+        self.state["updated_at"] = datetime.utcnow().isoformat()
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def _consume(self, consumer, batch):
+        """Отдаёт батч потребителю; при ошибке смещения не сдвигаются, повтор — с экспоненциальной паузой."""
+        try:
+            consumer.consume(batch)
+        except Exception as e:
+            fails = self._failures[consumer.name] = self._failures.get(consumer.name, 0) + 1
+            delay = min(self.poll_interval * 2 ** (fails - 1), MAX_BACKOFF)
+            self._retry_at[consumer.name] = time.time() + delay
+            print(f"❌ Потребитель {consumer.name}: {type(e).__name__}: {e} — повтор через {delay:.0f} с")
+            return False
+        self._failures.pop(consumer.name, None)
+        self._retry_at.pop(consumer.name, None)
+        self.readers[consumer.name].commit_to(batch)
+        return True
+
+    def poll(self):
+        """Дочитывает логи до конца и раздаёт новые строки потребителям. Возвращает число строк."""
+        total = 0
+        failed = set()
+        while True:
+            now = time.time()
+            # Потребители на одних и тех же позициях читают логи одним разбором
+            groups = {}
+            for consumer in self.consumers:
+                if consumer.name in failed or self._retry_at.get(consumer.name, 0.0) > now:
+                    continue
+                reader = self.readers[consumer.name]
+                key = json.dumps([reader.offsets, reader.fingerprints], sort_keys=True)
+                groups.setdefault(key, []).append(consumer)
+            progressed = False
+            for group in groups.values():
+                batch = self.readers[group[0].name].read_new()
+                if batch.empty:
+                    for consumer in group:
+                        self.readers[consumer.name].commit_to(batch)   # забываем удалённые файлы
+                    continue
+                bad_ts = int(batch["timestamp"].isna().sum())
+                if bad_ts:
+                    self.state["rows_bad_timestamp"] = self.state.get("rows_bad_timestamp", 0) + bad_ts
+                    print(f"⚠️ {bad_ts} строк логов без разбираемой метки времени")
+                for consumer in group:
+                    if self._consume(consumer, batch):
+                        progressed = True
+                    else:
+                        failed.add(consumer.name)
+                total += len(batch)
+                self.state["rows_read"] = self.state.get("rows_read", 0) + len(batch)
+                self._save_state()
+            if not progressed:
+                break
+        return total
+
+    def run_due(self, force=False):
+        """Запускает задачи, у которых истёк интервал (force — все)."""
+        now = time.time()
+        last_run = self.state.setdefault("last_run", {})
+        for name, (interval, fn) in self.jobs.items():
+            if not force and now - last_run.get(name, 0.0) < interval:
+                continue
+            print(f"▶️ Задача {name}")
+            try:
+                fn()
+            except Exception as e:
+                print(f"❌ Задача {name}: {type(e).__name__}: {e}")
+            last_run[name] = now
+            self._save_state()
+
+    def run_once(self, force=False):
+        rows = self.poll()
+        if rows:
+            print(f"📥 Новых строк логов: {rows}")
+        self.run_due(force)
+        return rows
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def serve_forever(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        print(f"🛰️ Демон мониторинга: опрос логов раз в {self.poll_interval} с, "
+              f"задачи: {', '.join(f'{n} ({i:.0f} с)' for n, (i, _) in self.jobs.items())}")
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.poll_interval)
+        self._save_state()
+        print("🛑 Демон мониторинга остановлен")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Демон мониторинга: инкрементальное чтение логов и задачи по расписанию")
+    parser.add_argument("--once", action="store_true", help="один проход и выход")
+    parser.add_argument("--force", action="store_true", help="с --once: запустить все задачи, не глядя на интервалы")
+    args = parser.parse_args()
+
+    scheduler = MonitoringScheduler()
+    if args.once:
+        scheduler.run_once(force=args.force)
+    else:
+        scheduler.serve_forever()
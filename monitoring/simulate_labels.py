@@ -1,55 +1,51 @@
 # monitoring/simulate_labels.py
-import pandas as pd
-import numpy as np
 import os
 from datetime import datetime, timedelta
-import json
+
+import numpy as np
+
+from monitoring.label_store import EPOCH, LabelStore
+from monitoring.log_store import read_predictions
+
+LABELS_CSV = "monitoring/logs/predictions_with_labels.csv"
+
 
 def simulate_labels(days_back=7):  # ← уменьшите до 7 дней для надёжности
-    """Имитирует true_label для демонстрации (в реальности — из БД)"""
-    all_features = []
-    all_scores = []
-    
-    for i in range(days_back):
-        date = (datetime.utcnow() - timedelta(days=i)).strftime("%Y-%m-%d")
-        log_file = f"monitoring/logs/predictions_{date}.jsonl"
-        if not os.path.exists(log_file):
-            continue
-            
-        with open(log_file, "r", encoding="utf-8") as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    entry = json.loads(line)
-                    if (isinstance(entry, dict) and 
-                        "features" in entry and 
-                        isinstance(entry["features"], dict) and
-                        "score" in entry):
-                        all_features.append(entry["features"])
-                        all_scores.append(entry["score"])
-                except Exception as e:
-                    print(f"⚠️ Ошибка в {log_file}, строка {line_num}: {e}")
-                    continue
-
-    if not all_features:
-        print("⚠️ Нет валидных логов для симуляции лейблов")
-        return
-
-    # Создаём датафрейм только из фичей
-    df_features = pd.DataFrame(all_features)
-    df = pd.DataFrame({"score": all_scores})
-    df = pd.concat([df, df_features], axis=1)
-
-    # Имитация лейблов
-    np.random.seed(42)
-    df["true_label"] = np.random.binomial(1, 1 - df["score"])  # дефолт = 1
-
-    # Сохраняем
-    output_file = "monitoring/logs/predictions_with_labels.csv"
-    df.to_csv(output_file, index=False)
-    print(f"✅ Симулировано {len(df)} лейблов и сохранено в {output_file}")
+    """
+    Имитирует лейблы для демонстрации (в реальности — батчи из БД): проставляет
+    их ещё не размеченным предиктам хранилища и выгружает CSV для src.retrain.
+    """
+    start = datetime.utcnow() - timedelta(days=days_back - 1)
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    store = LabelStore()
+    try:
+        store.ingest_predictions()
+        pending = store.unlabelled(start_ts=(start - EPOCH).total_seconds())
+        if not pending.empty:
+            # Имитация лейблов
+            rng = np.random.RandomState(42)
+            pending["label"] = rng.binomial(1, 1 - pending["score"])  # дефолт = 1
+            print(f"🏷️ Лейблы: {store.ingest_labels(pending[['prediction_id', 'label']])}")
+
+        df = read_predictions(start=start.strftime("%Y-%m-%d"))
+        if df.empty or "prediction_id" not in df.columns:
+            print("⚠️ Нет валидных логов для симуляции лейблов")
+            return
+        df = df.dropna(subset=["prediction_id"])
+        labels = store.labels_for(df["prediction_id"].astype(str))
+    finally:
+        store.close()
+
+    # score + фичи + лейбл, служебные колонки не нужны
+    df = df.drop(columns=["timestamp", "model_version", "wallet_address"])
+    df["prediction_id"] = df["prediction_id"].astype(str)
+    df = df.merge(labels.rename(columns={"label": "true_label"}), on="prediction_id", how="inner")
+    df = df.drop(columns=["prediction_id"])
+
+    os.makedirs(os.path.dirname(LABELS_CSV), exist_ok=True)
+    df.to_csv(LABELS_CSV, index=False)
+    print(f"✅ Симулировано лейблов: {len(df)}, сохранено в {LABELS_CSV}")
+
 
 if __name__ == "__main__":
-    simulate_labels()
\ No newline at end of file
+    simulate_labels()
@@ -0,0 +1,153 @@
+"""
+Офлайн-скоринг больших наборов кошельков.
+
+Parquet читается по row group-ам и только нужными колонками, каждая группа
+чистится как в load_and_clean_data/remove_high_corr_features, пропуски
+заполняются медианами трейна той же версии модели (как при обучении) и
+группа скорится в пуле процессов. По умолчанию берётся текущая версия из реестра. Скоры пишутся по частям в output_dir/part-XXXXX.parquet,
+а топ-K самых рискованных кошельков собирается в куче — пиковая память
+ограничена размером row group, а не всего набора.
+
+    python -m src.batch_score --input data/dataset.parquet --workers 4 --top-k 50
+"""
+import argparse
+import glob
+import heapq
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.data_preparation import MEDIANS_PATH, impute_with_medians, load_medians, remove_high_corr_features
+from src.model_registry import LEGACY_MODEL_PATH, current_model_path
+
+OUTPUT_DIR = "results/batch_scores"
+
+_worker = {}
+
+
+def _medians_path(model_path):
+    """Медианы трейна для модели: из её версии в реестре, у старой модели — models/feature_medians.json."""
+    path = os.path.join(os.path.dirname(model_path), "reference", os.path.basename(MEDIANS_PATH))
+    if os.path.exists(path):
+        return path
+    if os.path.abspath(model_path) == os.path.abspath(LEGACY_MODEL_PATH) and os.path.exists(MEDIANS_PATH):
+        return MEDIANS_PATH
+    return None
+
+
+def _init_worker(model_path, num_threads, medians_path):
+    model = joblib.load(model_path)
+    _worker["booster"] = model.booster_
+    _worker["feature_names"] = list(model.feature_name_)
+    _worker["num_threads"] = num_threads
+    _worker["medians"] = load_medians(medians_path) if medians_path else None
+
+
+def _score_row_group(path, row_group, row_offset, columns, output_dir, top_k):
+    """Скорит одну row group, пишет её part-файл и возвращает локальный топ-K."""
+    df = pq.ParquetFile(path).read_row_group(row_group, columns=columns).to_pandas()
+    # Та же чистка, что и при обучении
+    df = df.replace([np.inf, -np.inf], np.nan)
+    df = remove_high_corr_features(df)
+
+    feature_names = _worker["feature_names"]
+    X = df.reindex(columns=feature_names).astype(np.float64)
+    if _worker["medians"] is not None:
+        impute_with_medians(X, _worker["medians"])
+    X = X.to_numpy()
+    probs = _worker["booster"].predict(X, num_threads=_worker["num_threads"])
+
+    if "wallet_address" in df.columns:
+        wallets = df["wallet_address"].to_numpy()
+    else:
+        wallets = np.arange(row_offset, row_offset + len(df))
+    result = pd.DataFrame({"wallet": wallets, "probability": probs})
+    if "target" in df.columns:
+        result["is_scammer"] = df["target"].to_numpy()
+    result.to_parquet(os.path.join(output_dir, f"part-{row_group:05d}.parquet"), index=False)
+
+    k = min(top_k, len(result))
+    top = np.argpartition(-probs, k - 1)[:k] if k else np.array([], dtype=int)
+    return result.iloc[top].to_dict("records")
+
+
+def batch_score(input_path, output_dir=OUTPUT_DIR, model_path=None, workers=None,
+                threads_per_worker=1, top_k=50, name="LightGBM", medians_path=None):
+    """
+    Скорит весь parquet и возвращает DataFrame топ-K кошельков по вероятности.
+    model_path — по умолчанию модель текущей версии реестра, medians_path — её медианы.
+    Результаты: output_dir/part-*.parquet и results/{name}_top{top_k}_risky_wallets.csv.
+    """
+    workers = workers or os.cpu_count() or 1
+    model_path = model_path or current_model_path()
+    medians_path = medians_path or _medians_path(model_path)
+    if medians_path is None:
+        print(f"⚠️ Для {model_path} не найдены медианы трейна — пропуски скорятся как NaN")
+    print(f" Модель: {model_path}, медианы: {medians_path}")
+    parquet = pq.ParquetFile(input_path)
+    feature_names = list(joblib.load(model_path).feature_name_)
+
+    # Проекция: только фичи модели + идентификатор и таргет, если они есть
+    available = set(parquet.schema_arrow.names)
+    columns = [c for c in feature_names + ["wallet_address", "target"] if c in available]
+    missing = [c for c in feature_names if c not in available]
+    if missing:
+        print(f"⚠️ В {input_path} нет {len(missing)} фичей модели — они будут NaN: {missing[:5]}...")
+
+    # Убираем части предыдущего запуска, чтобы не смешать результаты
+    os.makedirs(output_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(output_dir, "part-*.parquet")):
+        os.remove(old)
+
+    offsets = np.concatenate([[0], np.cumsum([parquet.metadata.row_group(i).num_rows
+                                              for i in range(parquet.num_row_groups)])])
+    heap, seq = [], 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, threads_per_worker, medians_path)) as pool:
+        pending = set()
+        for rg in range(parquet.num_row_groups):
+            # Не больше 2 задач на воркер в полёте — память не растёт с размером набора
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                seq = _push_top(heap, done, top_k, seq)
+            pending.add(pool.submit(_score_row_group, input_path, rg, int(offsets[rg]),
+                                    columns, output_dir, top_k))
+        seq = _push_top(heap, pending, top_k, seq)
+
+    top = pd.DataFrame([row for _, _, row in sorted(heap, key=lambda item: (-item[0], item[1]))])
+    os.makedirs("results", exist_ok=True)
+    top.to_csv(f"results/{name}_top{top_k}_risky_wallets.csv", index=False)
+    print(f"✅ Проскорено {int(offsets[-1])} строк в {parquet.num_row_groups} частях → {output_dir}")
+    return top
+
+
+def _push_top(heap, futures, top_k, seq):
+    """Сливает локальные топы частей в общую min-кучу размера top_k."""
+    for future in futures:
+        for row in future.result():
+            item = (row["probability"], seq, row)
+            seq += 1
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item[0] > heap[0][0]:
+                heapq.heapreplace(heap, item)
+    return seq
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетный скоринг кошельков из parquet")
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", default=OUTPUT_DIR)
+    parser.add_argument("--model", default=None, help="по умолчанию — текущая версия из реестра")
+    parser.add_argument("--medians", default=None, help="медианы трейна (по умолчанию — из версии модели)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--top-k", type=int, default=50)
+    args = parser.parse_args()
+
+    batch_score(args.input, args.output, args.model, args.workers, args.threads_per_worker, args.top_k,
+                medians_path=args.medians)
@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Границы гистограмм: размер батча (строк) и ожидание в очереди (мс)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+WAIT_MS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100)
+
+
+class MicroBatcher:
+    """
+    Динамический микро-батчинг одиночных запросов.
+
+    Потоки запросов кладут свои матрицы фичей в очередь и ждут результат.
+    Фоновый поток собирает всё, что пришло за окно max_wait_ms (или до
+    max_batch_rows строк), скорит одним вызовом score_fn и раздаёт каждому
+    запросу его срез скоров. Запрос может передать свой score_fn (например,
+    движок конкретной версии модели) — такие запросы скорятся отдельной группой.
+    """
+
+    def __init__(self, score_fn, max_batch_rows=64, max_wait_ms=2.0):
+        self.score_fn = score_fn
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Метрики (пишет только поток-батчер)
+        self.batches = 0
+        self.rows = 0
+        self.batch_size_hist = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.wait_ms_hist = [0] * (len(WAIT_MS_BUCKETS) + 1)
+        self.wait_ms_sum = 0.0
+        self.wait_ms_max = 0.0
+        self.errors = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def score(self, X, score_fn=None, timeout=None):
+        """Скорит матрицу X в составе общего батча; блокирует до результата."""
+        if self._thread is None:
+            self.start()
+        future = Future()
+        self._queue.put((X, future, time.perf_counter(), score_fn or self.score_fn))
+        return future.result(timeout)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "batch_size_buckets": dict(zip([str(b) for b in BATCH_SIZE_BUCKETS] + ["+Inf"], self.batch_size_hist)),
+            "queue_wait_ms_buckets": dict(zip([str(b) for b in WAIT_MS_BUCKETS] + ["+Inf"], self.wait_ms_hist)),
+            "queue_wait_ms_avg": self.wait_ms_sum / self.rows if self.rows else 0.0,
+            "queue_wait_ms_max": self.wait_ms_max,
+            "queue_depth": self._queue.qsize(),
+            "errors": self.errors,
+        }
+
+    def _collect(self):
+        first = self._queue.get()
+        items = [first]
+        rows = len(first[0])
+        deadline = first[2] + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            rows += len(item[0])
+        return items, rows
+
+    def _run(self):
+        while True:
+            items, rows = self._collect()
+            groups = {}
+            for item in items:
+                groups.setdefault(item[3], []).append(item)
+            for score_fn, group in groups.items():
+                self._score_group(score_fn, group)
+            self._observe_batch(rows)
+
+    def _score_group(self, score_fn, items):
+        started = time.perf_counter()
+        try:
+            X = items[0][0] if len(items) == 1 else np.concatenate([item[0] for item in items])
+            proba = score_fn(X)
+        except Exception as e:
+            self.errors += 1
+            for item in items:
+                item[1].set_exception(e)
+            return
+
+        offset = 0
+        for X_part, future, enqueued, _ in items:
+            n = len(X_part)
+            future.set_result(proba[offset:offset + n])
+            offset += n
+            self._observe_wait((started - enqueued) * 1000.0, n)
+
+    def _observe_batch(self, rows):
+        self.batches += 1
+        self.rows += rows
+        self.batch_size_hist[_bucket(BATCH_SIZE_BUCKETS, rows)] += 1
+
+    def _observe_wait(self, wait_ms, n):
+        self.wait_ms_hist[_bucket(WAIT_MS_BUCKETS, wait_ms)] += n
+        self.wait_ms_sum += wait_ms * n
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+
+def _bucket(bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            return i
+    return len(bounds)
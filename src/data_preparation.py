@@ -1,39 +1,114 @@
+import json
+import os
+
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sklearn.model_selection import train_test_split
 
-def load_and_clean_data(path: str):
-    df = pd.read_parquet(path)
-    df = df.replace([np.inf, -np.inf], np.nan)
-    return df
+# Сильно скоррелированные признаки, которые выкидываем перед обучением
+HIGH_CORR_FEATURES = [
+    "market_rocp", "market_apo", "market_macdsignal_macdfix",
+    "market_macd_macdfix", "borrow_block_number", "borrow_timestamp",
+    "risky_first_tx_timestamp", "market_macd_macdext", "market_macd",
+    "market_macdsignal", "liquidation_count"
+]
+
+MEDIANS_PATH = "models/feature_medians.json"
+DATASET_PATH = "models/train_dataset.bin"
+
+def load_and_clean_data(path: str, columns=None, exclude=(), float32=False):
+    """
+    Читает parquet только нужными колонками (columns минус exclude) и по одной
+    колонке переводит в NumPy: ±inf → NaN на месте, без копии всей таблицы.
+    float32=True — вещественные фичи в float32 (вдвое меньше памяти).
+    """
+    if columns is None:
+        # Сохранённый pandas индекс (__index_level_0__ и т.п.) — не фича: pd.read_parquet
+        # восстанавливал его индексом, а split_data потом сбрасывал
+        schema = pq.read_schema(path)
+        index_columns = {c for c in (schema.pandas_metadata or {}).get("index_columns", []) if isinstance(c, str)}
+        columns = [name for name in schema.names if name not in index_columns]
+    names = [name for name in columns if name not in exclude]
+    table = pq.read_table(path, columns=names)
+    dtype = np.float32 if float32 else np.float64
+    data = {}
+    for name in names:
+        # Колонки забираем из таблицы по одной — память Arrow освобождается по ходу
+        column = table.column(0)
+        table = table.remove_column(0)
+        if pa.types.is_floating(column.type):
+            values = column.to_numpy().astype(dtype)
+            np.copyto(values, np.nan, where=np.isinf(values))
+        else:
+            values = column.to_pandas()
+        data[name] = values
+    return pd.DataFrame(data, copy=False)
 
 def remove_high_corr_features(df: pd.DataFrame):
-    removed_features = [
-        "market_rocp", "market_apo", "market_macdsignal_macdfix",
-        "market_macd_macdfix", "borrow_block_number", "borrow_timestamp",
-        "risky_first_tx_timestamp", "market_macd_macdext", "market_macd",
-        "market_macdsignal", "liquidation_count"
-    ]
-    to_remove = [f for f in removed_features if f in df.columns and f != 'wallet_address']
+    to_remove = [f for f in HIGH_CORR_FEATURES if f in df.columns and f != 'wallet_address']
+    if not to_remove:
+        return df
     df = df.drop(columns=to_remove, errors="ignore")
     return df
 
 def split_data(df: pd.DataFrame, random_state: int = 42):
-    df = df.sample(frac=1, random_state=random_state).reset_index(drop=True)
-    train, temp = train_test_split(df, test_size=0.5, random_state=random_state)
-    val, test = train_test_split(temp, test_size=0.5, random_state=random_state)
-    return train, val, test
+    # Делим позиции строк, а не сам датафрейм: каждая часть копируется один раз.
+    # Разбиение то же, что у df.sample(frac=1) + train_test_split по перемешанному df.
+    order = pd.Series(np.arange(len(df))).sample(frac=1, random_state=random_state).to_numpy()
+    train_idx, temp_idx = train_test_split(order, test_size=0.5, random_state=random_state)
+    val_idx, test_idx = train_test_split(temp_idx, test_size=0.5, random_state=random_state)
+    return tuple(df.take(idx).reset_index(drop=True) for idx in (train_idx, val_idx, test_idx))
 
 def prepare_features(df, exclude_cols=None):
     if exclude_cols is None:
         exclude_cols = ['target', 'wallet_address']
     return [col for col in df.columns if col not in exclude_cols]
 
-def fill_missing_with_median(X_train, X_val, X_test):
-    for col in X_train.columns:
-        if X_train[col].isna().any():
-            med = X_train[col].median()
-            X_train[col].fillna(med, inplace=True)
-            X_val[col].fillna(med, inplace=True)
-            X_test[col].fillna(med, inplace=True)
+def fit_medians(X_train: pd.DataFrame):
+    """
+    Медианы трейна одним вызовом — только для колонок, где в трейне есть пропуски
+    (как в исходном цикле): в остальных NaN на val/test и при скоринге остаётся NaN.
+    """
+    return X_train.median()[X_train.isna().any()]
+
+def impute_with_medians(X: pd.DataFrame, medians):
+    """Заполняет пропуски вектором медиан на месте (без цикла по колонкам)."""
+    X.fillna(medians.reindex(X.columns), inplace=True)
+    return X
+
+def save_medians(medians, path=MEDIANS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({name: (None if pd.isna(v) else float(v)) for name, v in medians.items()}, f, indent=2)
+
+def load_medians(path=MEDIANS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return pd.Series(json.load(f), dtype="float64")
+
+def fill_missing_with_median(X_train, X_val, X_test, medians_path=None):
+    medians = fit_medians(X_train)
+    for X in (X_train, X_val, X_test):
+        impute_with_medians(X, medians)
+    if medians_path:
+        save_medians(medians, medians_path)
     return X_train, X_val, X_test
+
+def save_lgb_dataset(X, y, path=DATASET_PATH, params=None):
+    """
+    Бинарный LightGBM Dataset (фичи уже разбиты по бинам) для lgb.train / lgb.cv:
+    повторные обучения на тех же данных не строят бины заново.
+    """
+    import lightgbm as lgb
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)  # save_binary не перезаписывает существующий файл
+    dataset = lgb.Dataset(X, label=y, params={"verbosity": -1, "feature_pre_filter": False, **(params or {})},
+                          free_raw_data=True)
+    dataset.save_binary(path)
+    return path
+
+def load_lgb_dataset(path=DATASET_PATH, params=None):
+    import lightgbm as lgb
+    return lgb.Dataset(path, params={"verbosity": -1, **(params or {})})
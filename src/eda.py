@@ -1,28 +1,182 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+"""
+Профиль датасета и EDA-графики.
+
+profile_dataset считает статистики всех числовых колонок за один векторный
+проход: одна сортировка матрицы по столбцам даёт min/max, квантили и число
+уникальных, суммы — среднее и std. Профиль пишется в results/data_profile.json
+(+ .parquet) с хэшем датасета и публикуется вместе с версией модели.
+
+Графики (boxplot по 10 признаков на картинку) рисуются только по запросу —
+группы параллельно в пуле процессов:
+    python train_pipeline.py --eda
+    python -m src.eda --data data/dataset.parquet --plots
+"""
+import argparse
+import json
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-def run_eda(df: pd.DataFrame, output_dir: str = "plots"):
-    os.makedirs(output_dir, exist_ok=True)
+import numpy as np
+import pandas as pd
+
+PROFILE_PATH = "results/data_profile.json"
+PROFILE_TABLE_PATH = "results/data_profile.parquet"
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+PLOT_GROUP = 10
+
+
+def _numeric_profile(values):
+    """Статистики по столбцам float-матрицы (NaN — пропуск, ±inf учитываются отдельно)."""
+    n_rows, n_cols = values.shape
+    finite = np.isfinite(values)
+    n_inf = np.isinf(values).sum(axis=0)
+    n_missing = np.isnan(values).sum(axis=0)
+    n_valid = finite.sum(axis=0)
+
+    # Одна сортировка: конечные значения в начале столбца (±inf → NaN, NaN уходят в конец)
+    ordered = np.sort(np.where(finite, values, np.nan), axis=0)
+    has_values = n_valid > 0
+    last = np.maximum(n_valid - 1, 0)
+    cols = np.arange(n_cols)
+
+    quantiles = {}
+    for q in QUANTILES:
+        # Линейная интерполяция, как в np.quantile
+        pos = q * last
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, last)
+        frac = pos - lo
+        value = ordered[lo, cols] * (1 - frac) + ordered[hi, cols] * frac
+        quantiles[f"q{int(round(q * 100)):02d}"] = np.where(has_values, value, np.nan)
+
+    # Уникальные — число смен значения в отсортированном столбце
+    changes = np.diff(ordered, axis=0) != 0
+    changes &= np.arange(1, max(n_rows, 1))[:, None] < n_valid[None, :]
+    n_unique = np.where(has_values, changes.sum(axis=0) + 1, 0)
+
+    safe = np.where(finite, values, 0.0)
+    total = safe.sum(axis=0)
+    mean = np.divide(total, n_valid, out=np.full(n_cols, np.nan), where=has_values)
+    dev = np.where(finite, values - mean, 0.0)
+    sq = (dev * dev).sum(axis=0)
+    std = np.divide(sq, n_valid - 1, out=np.full(n_cols, np.nan), where=n_valid > 1) ** 0.5
+    n_zero = ((values == 0) & finite).sum(axis=0)
+
+    return {
+        "count": n_valid,
+        "missing": n_missing,
+        "missing_share": n_missing / max(n_rows, 1),
+        "inf": n_inf,
+        "zero_share": n_zero / max(n_rows, 1),
+        "unique": n_unique,
+        "mean": mean,
+        "std": std,
+        "min": np.where(has_values, ordered[0], np.nan),
+        "max": np.where(has_values, ordered[last, cols], np.nan),
+        **quantiles,
+    }
+
+
+def profile_dataset(df: pd.DataFrame, target="target"):
+    """
+    Профиль датасета: DataFrame по колонкам (dtype, пропуски, ±inf, доля нулей,
+    уникальные, среднее, std, min/max, квантили). Нечисловые колонки — только
+    dtype, пропуски и число уникальных.
+    """
+    numeric_cols = df.select_dtypes(include="number").columns
+    profile = pd.DataFrame(_numeric_profile(df[numeric_cols].to_numpy(dtype=np.float64)), index=numeric_cols)
 
-    print("\n[INFO] Общая информация:")
-    print(df.info())
+    other_cols = df.columns.difference(numeric_cols, sort=False)
+    if len(other_cols):
+        other = pd.DataFrame({
+            "count": df[other_cols].notna().sum(),
+            "missing": df[other_cols].isna().sum(),
+            "unique": df[other_cols].nunique(),
+        })
+        other["missing_share"] = other["missing"] / max(len(df), 1)
+        profile = pd.concat([profile, other])
 
-    print("Описательная статистика:")
-    print(df.describe())
+    profile.insert(0, "dtype", [str(df[c].dtype) for c in profile.index])
+    profile.index.name = "column"
+    profile.attrs["n_rows"] = len(df)
+    if target in df.columns:
+        profile.attrs["target_rate"] = float(df[target].mean())
+    return profile
 
-    print(" Пропуски по столбцам:")
-    print(df.isnull().sum())
 
-    # Boxplots
+def save_profile(profile, dataset_sha256=None, path=PROFILE_PATH, table_path=PROFILE_TABLE_PATH):
+    """JSON (с хэшем датасета) для реестра и мониторинга + Parquet-таблица для анализа."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = profile.reset_index()
+    table.to_parquet(table_path, index=False)
+    records = json.loads(table.to_json(orient="records"))   # NaN → null
+    payload = {
+        "created_at": datetime.utcnow().isoformat(),
+        "dataset_sha256": dataset_sha256,
+        "n_rows": profile.attrs.get("n_rows"),
+        "target_rate": profile.attrs.get("target_rate"),
+        "columns": {r.pop("column"): r for r in records},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    return payload
+
+
+def load_profile(path=PROFILE_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _plot_group(values, start, output_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    values.plot(kind='box', subplots=True, layout=(2, 5), figsize=(20, 8))
+    plt.suptitle(f'Boxplots: Признаки {start+1} — {start+values.shape[1]}')
+    plt.tight_layout(rect=[0, 0.03, 1, 0.95])
+    path = f"{output_dir}/boxplot_{start}.png"
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def render_plots(df: pd.DataFrame, output_dir: str = "plots", workers=None):
+    """Boxplot-ы числовых признаков по PLOT_GROUP на картинку; группы — в пуле процессов."""
+    os.makedirs(output_dir, exist_ok=True)
     numeric_cols = df.select_dtypes(include='number').columns.drop('target', errors='ignore')
-    print(f"Число числовых признаков без целевой: {len(numeric_cols)}")
-
-    for i in range(0, len(numeric_cols), 10):
-        cols_to_plot = numeric_cols[i:i+10]
-        df[cols_to_plot].plot(kind='box', subplots=True, layout=(2, 5), figsize=(20, 8))
-        plt.suptitle(f'Boxplots: Признаки {i+1} — {i+len(cols_to_plot)}')
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-        plt.savefig(f"{output_dir}/boxplot_{i}.png")
-        plt.close()
+    groups = [(df[numeric_cols[i:i + PLOT_GROUP]], i) for i in range(0, len(numeric_cols), PLOT_GROUP)]
+    workers = min(workers or os.cpu_count() or 1, len(groups))
+    if workers <= 1:
+        return [_plot_group(values, start, output_dir) for values, start in groups]
+    # spawn: форкать процесс с уже поднятым OpenMP небезопасно
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_plot_group, *zip(*groups), [output_dir] * len(groups)))
+
+
+def run_eda(df: pd.DataFrame, output_dir: str = "plots", plots=True, workers=None):
+    """Профиль + сводка в консоль и (по умолчанию) графики."""
+    profile = profile_dataset(df)
+    print(f"\n[INFO] {len(df)} строк, {df.shape[1]} колонок")
+    print(profile[["dtype", "missing", "inf", "mean", "std", "min", "q50", "max"]].to_string())
+    if plots:
+        render_plots(df, output_dir, workers)
+    return profile
+
+
+if __name__ == "__main__":
+    from src.data_preparation import HIGH_CORR_FEATURES, load_and_clean_data
+    from src.stage_cache import sha256_file
+
+    parser = argparse.ArgumentParser(description="Профиль датасета и EDA-графики")
+    parser.add_argument("--data", default="data/dataset.parquet")
+    parser.add_argument("--plots", action="store_true", help="нарисовать boxplot-ы")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    df = load_and_clean_data(args.data, exclude=HIGH_CORR_FEATURES)
+    profile = run_eda(df, plots=args.plots, workers=args.workers)
+    save_profile(profile, sha256_file(args.data))
+    print(f"Профиль сохранён в {PROFILE_PATH}")
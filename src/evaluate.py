@@ -1,25 +1,152 @@
 from sklearn.metrics import (roc_auc_score, roc_curve, precision_recall_curve,
                              average_precision_score, classification_report)
-from sklearn.model_selection import cross_val_score
+from sklearn.model_selection import StratifiedKFold
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
-
-# внутри как тут нельзя делать from sklearn.metrics import (..., cross_val_score)  # ← НЕЛЬЗЯ!
-
- 
-
+import json
 import numpy as np
 import pandas as pd
 import os
-import shap
 
-def evaluate_model(model, X_train, X_val, X_test, y_train, y_val, y_test, name="LightGBM"):
+CV_FOLDS = 5
+CV_EARLY_STOPPING_ROUNDS = 50
+N_BOOTSTRAP = 1000
+BOOTSTRAP_CHUNK = 50   # реплик за один векторный шаг: память — chunk × n чисел
+
+# Параметры sklearn-обёртки, которых нет у lgb.train
+_SKLEARN_ONLY_PARAMS = ("n_estimators", "class_weight", "importance_type", "n_jobs", "random_state")
+
+
+def score_splits(model, splits, num_threads=None):
+    """
+    Скоры модели по каждой части один раз: {"train": proba, ...}.
+    Их переиспользуют оценка, референсы дрейфа и топ рискованных кошельков.
+    """
+    num_threads = num_threads or os.cpu_count() or 1
+    return {name: model.booster_.predict(X, num_threads=num_threads) for name, X in splits.items()}
+
+
+def cross_validate_lgb(model, X, y, folds=CV_FOLDS, early_stopping_rounds=CV_EARLY_STOPPING_ROUNDS,
+                       dataset_path=None, num_threads=None, random_state=42):
+    """
+    CV ROC AUC: фолды обучаются параллельно в потоках (LightGBM отпускает GIL),
+    у каждого фолда свой бюджет потоков — в сумме не больше ядер. Ранняя остановка
+    по AUC фолда, деревьев не больше n_estimators модели. Бины строятся один раз:
+    фолды — подмножества одного Dataset (бинарного из split-стадии, если он передан).
+    """
+    import lightgbm as lgb
+
+    num_threads = num_threads or os.cpu_count() or 1
+    workers = max(1, min(folds, num_threads))
+    params = {k: v for k, v in model.get_params().items() if k not in _SKLEARN_ONLY_PARAMS and v is not None}
+    params.update({"seed": random_state, "num_threads": max(1, num_threads // workers),
+                   "verbosity": -1, "feature_pre_filter": False})
+    rounds = model.get_params()["n_estimators"]
+
+    if dataset_path and os.path.exists(dataset_path):
+        full = lgb.Dataset(dataset_path, params={"verbosity": -1, "feature_pre_filter": False})
+    else:
+        full = lgb.Dataset(X, label=y, params={"verbosity": -1, "feature_pre_filter": False},
+                           free_raw_data=False)
+    full.construct()
+
+    # Подмножества строим заранее, в одном потоке
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state)
+    fold_sets = []
+    for train_idx, valid_idx in splitter.split(np.zeros(len(y)), np.asarray(y)):
+        train_set, valid_set = full.subset(train_idx.tolist()), full.subset(valid_idx.tolist())
+        train_set.construct()
+        valid_set.construct()
+        fold_sets.append((train_set, valid_set))
+
+    def run_fold(sets):
+        booster = lgb.train(params, sets[0], num_boost_round=rounds, valid_sets=[sets[1]],
+                            callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)])
+        return booster.best_score["valid_0"]["auc"], booster.best_iteration
+
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(run_fold, fold_sets))
+    return np.array([r[0] for r in results]), [r[1] for r in results]
+
+
+def _bootstrap_counts(rng, n, size):
+    """Матрица (size, n): сколько раз каждая строка попала в бутстрэп-реплику."""
+    idx = rng.integers(0, n, size=(size, n)) + (np.arange(size) * n)[:, None]
+    return np.bincount(idx.ravel(), minlength=size * n).reshape(size, n).astype(np.float64)
+
+
+def _weighted_auc_ap(y_sorted, group_starts, counts):
+    """
+    ROC AUC и average precision сразу для всех реплик (строки counts — веса строк).
+    Строки отсортированы по убыванию скора, group_starts — начала групп одинаковых скоров.
+    """
+    pos = np.add.reduceat(counts * y_sorted, group_starts, axis=1)
+    neg = np.add.reduceat(counts * (1 - y_sorted), group_starts, axis=1)
+    total_pos, total_neg = pos.sum(axis=1), neg.sum(axis=1)
+    # AUC: для каждой группы — отрицательные ниже неё (+ половина в ничьей)
+    neg_below = total_neg[:, None] - np.cumsum(neg, axis=1)
+    auc = (pos * (neg_below + 0.5 * neg)).sum(axis=1) / (total_pos * total_neg)
+    # AP: сумма прироста recall × precision по порогам (как average_precision_score)
+    tp, fp = np.cumsum(pos, axis=1), np.cumsum(neg, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        ap = (pos * precision).sum(axis=1) / total_pos
+    return auc, ap
+
+
+def bootstrap_ci(y_true, proba, threshold, n_boot=N_BOOTSTRAP, alpha=0.05, random_state=42,
+                 chunk=BOOTSTRAP_CHUNK):
+    """
+    Бутстрэп-интервалы ROC AUC, AP и F1 при пороге: реплики задаются весами строк,
+    метрики считаются матрично по пачкам из chunk реплик без пересортировки.
+    Возвращает {метрика: {"value", "low", "high"}}.
+    """
+    y = np.asarray(y_true, dtype=np.float64)
+    proba = np.asarray(proba, dtype=np.float64)
+    order = np.argsort(-proba, kind="mergesort")
+    y_sorted, p_sorted = y[order], proba[order]
+    group_starts = np.flatnonzero(np.r_[True, np.diff(p_sorted) != 0])
+    predicted = (p_sorted >= threshold).astype(np.float64)
+
+    rng = np.random.default_rng(random_state)
+    samples = {"roc_auc": [], "average_precision": [], "f1": []}
+    for start in range(0, n_boot, chunk):
+        counts = _bootstrap_counts(rng, len(y), min(chunk, n_boot - start))
+        auc, ap = _weighted_auc_ap(y_sorted, group_starts, counts)
+        tp = counts @ (y_sorted * predicted)
+        fp = counts @ ((1 - y_sorted) * predicted)
+        fn = counts @ (y_sorted * (1 - predicted))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            f1 = 2 * tp / (2 * tp + fp + fn)
+        samples["roc_auc"].append(auc)
+        samples["average_precision"].append(ap)
+        samples["f1"].append(f1)
+
+    ones = np.ones((1, len(y)))
+    auc, ap = _weighted_auc_ap(y_sorted, group_starts, ones)
+    tp, fp, fn = (y_sorted * predicted).sum(), ((1 - y_sorted) * predicted).sum(), (y_sorted * (1 - predicted)).sum()
+    point = {"roc_auc": auc[0], "average_precision": ap[0], "f1": 2 * tp / max(2 * tp + fp + fn, 1e-12)}
+    result = {}
+    for metric, values in samples.items():
+        values = np.concatenate(values)
+        # Реплики с одним классом дают NaN — их не учитываем
+        low, high = np.nanquantile(values, [alpha / 2, 1 - alpha / 2])
+        result[metric] = {"value": float(point[metric]), "low": float(low), "high": float(high)}
+    return result
+
+def evaluate_model(model, X_train, X_val, X_test, y_train, y_val, y_test, name="LightGBM",
+                   predictions=None, dataset_path=None, n_boot=N_BOOTSTRAP):
+    """
+    predictions — готовые скоры {"train", "val", "test"} (score_splits), чтобы не скорить заново;
+    dataset_path — бинарный LightGBM Dataset трейна для CV.
+    """
     os.makedirs('plots', exist_ok=True)
     os.makedirs('results', exist_ok=True)
 
     # Предсказания вероятностей
-    y_pred_train = model.predict_proba(X_train)[:, 1]
-    y_pred_val = model.predict_proba(X_val)[:, 1]
-    y_pred_test = model.predict_proba(X_test)[:, 1]
+    if predictions is None:
+        predictions = score_splits(model, {"train": X_train, "val": X_val, "test": X_test})
+    y_pred_train, y_pred_val, y_pred_test = predictions["train"], predictions["val"], predictions["test"]
 
     # ROC AUC
     train_roc_auc = roc_auc_score(y_train, y_pred_train)
@@ -29,9 +156,9 @@ def evaluate_model(model, X_train, X_val, X_test, y_train, y_val, y_test, name="
     print(f"Val   ROC AUC: {val_roc_auc:.4f}")
     print(f"Test  ROC AUC: {test_roc_auc:.4f}")
 
-    # Cross-validation
-    cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='roc_auc', n_jobs=-1)
-    print(f"CV ROC AUC: {np.mean(cv_scores):.4f} ± {np.std(cv_scores):.4f}")
+    # Cross-validation: фолды параллельно, с ранней остановкой
+    cv_scores, cv_iterations = cross_validate_lgb(model, X_train, y_train, dataset_path=dataset_path)
+    print(f"CV ROC AUC: {np.mean(cv_scores):.4f} ± {np.std(cv_scores):.4f} (деревьев по фолдам: {cv_iterations})")
 
     # === ОПТИМАЛЬНЫЙ ПОРОГ НА ОСНОВЕ F1 ===
     precision, recall, thresholds = precision_recall_curve(y_test, y_pred_test)
@@ -46,10 +173,18 @@ def evaluate_model(model, X_train, X_val, X_test, y_train, y_val, y_test, name="
     print("\nClassification Report (Test) with best threshold:")
     print(report)
 
+    # 95% бутстрэп-интервалы на тесте
+    ci = bootstrap_ci(y_test, y_pred_test, best_threshold, n_boot=n_boot)
+    ci_lines = [f"{metric}: {v['value']:.4f} [{v['low']:.4f}, {v['high']:.4f}]" for metric, v in ci.items()]
+    print(f"Test 95% CI ({n_boot} bootstrap):\n  " + "\n  ".join(ci_lines))
+
     # Сохраняем отчёт
     with open(f'results/{name}_classification_report.txt', 'w') as f:
         f.write(f"Best threshold: {best_threshold:.4f}\n\n")
         f.write(report)
+        f.write(f"\nTest 95% CI ({n_boot} bootstrap):\n" + "\n".join(ci_lines) + "\n")
+    with open(f'results/{name}_metrics_ci.json', 'w') as f:
+        json.dump({"threshold": float(best_threshold), "cv_roc_auc": cv_scores.tolist(), "test": ci}, f, indent=2)
 
     # ROC Curve
     fpr, tpr, _ = roc_curve(y_test, y_pred_test)
@@ -78,6 +213,9 @@ def evaluate_model(model, X_train, X_val, X_test, y_train, y_val, y_test, name="
     return best_threshold
 
 def shap_analysis(model, X_test, name="LightGBM"):
+    # shap тяжёлый — грузим только для офлайн-графиков
+    import shap
+
     sample = X_test.sample(min(500, len(X_test)), random_state=42)
     explainer = shap.TreeExplainer(model)
     shap_values = explainer.shap_values(sample)
@@ -95,13 +233,14 @@ def shap_analysis(model, X_test, name="LightGBM"):
     plt.savefig(f'plots/{name}_shap_beeswarm.png', bbox_inches='tight')
     plt.close()
 
-def get_risky_wallets(model, X_full, df_full, name="LightGBM"):
-    probs = model.predict_proba(X_full)[:, 1]
+def get_risky_wallets(model, X_full, df_full, name="LightGBM", probs=None):
+    if probs is None:
+        probs = model.predict_proba(X_full)[:, 1]
     wallet_col = df_full.get('wallet_address', df_full.index)
     result = pd.DataFrame({
         'wallet': wallet_col,
         'probability': probs,
         'is_scammer': df_full['target']
-    }).sort_values('probability', ascending=False).head(50)
+    }).nlargest(50, 'probability')
 
     result.to_csv(f'results/{name}_top50_risky_wallets.csv', index=False)
@@ -0,0 +1,162 @@
+"""
+Объяснения скоров через встроенный в LightGBM pred_contrib (TreeSHAP без пакета shap).
+
+booster.predict(X, pred_contrib=True) даёт для каждой строки вклад каждой фичи
+в сырой скор (log-odds) и базовое значение последним столбцом; их сумма —
+сырой скор, сигмоида от неё — risk_probability. Топ-N вкладов по модулю
+выбирается векторно для всего батча.
+
+Офлайн — глобальная важность по всем строкам (средний |вклад|) текущей версии:
+    python -m src.explain --data data/dataset.parquet      # → results/LightGBM_global_importance.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.prediction_cache import PredictionCache
+
+TOP_N = 5
+CHUNK_ROWS = 10_000
+
+
+class ContributionCache(PredictionCache):
+    """
+    Тот же LRU/TTL-кэш, что и для скоров, но значение — вектор вкладов строки
+    (n_features + 1). Ключ включает версию модели.
+    """
+
+    def _new_values(self, n, width):
+        return np.full((n, width + 1), np.nan)
+
+    @staticmethod
+    def _stored_value(value):
+        return np.array(value)
+
+
+def top_contributions(contrib, top_n=TOP_N):
+    """
+    Индексы и значения top_n вкладов по модулю для каждой строки, по убыванию:
+    (idx (n, k), values (n, k)). contrib — вклады фичей без столбца базы.
+    """
+    k = min(top_n, contrib.shape[1])
+    magnitude = np.abs(contrib)
+    idx = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(magnitude, idx, axis=1), axis=1, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=1)
+    return idx, np.take_along_axis(contrib, idx, axis=1)
+
+
+class Explainer:
+    """Объяснения для одной версии модели: вклады батча, топ-N на строку, кэш по версии."""
+
+    def __init__(self, booster, feature_names, version=None, cache=None, num_threads=None,
+                 parallel_min_rows=512):
+        self.booster = booster
+        self.feature_names = list(feature_names)
+        self.version = version
+        self.cache = cache
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.parallel_min_rows = parallel_min_rows
+
+    def contributions(self, X):
+        """Матрица вкладов (n, n_features + 1), последний столбец — базовое значение."""
+        num_threads = self.num_threads if len(X) >= self.parallel_min_rows else 1
+        if self.cache is None:
+            return self.booster.predict(X, pred_contrib=True, num_threads=num_threads)
+        contrib, hit, keys = self.cache.lookup(X, self.version)
+        if hit.all():
+            return contrib
+        miss = np.flatnonzero(~hit)
+        fresh = self.booster.predict(X[miss], pred_contrib=True, num_threads=num_threads)
+        contrib[miss] = fresh
+        self.cache.store([keys[i] for i in miss], fresh)
+        return contrib
+
+    def explain(self, X, top_n=TOP_N):
+        """
+        Батч → (вероятности, список объяснений по строкам). Объяснение строки:
+        {"base_value", "top_features": [{"feature", "value", "contribution"}, ...]}.
+        """
+        contrib = self.contributions(X)
+        proba = 1.0 / (1.0 + np.exp(-contrib.sum(axis=1)))
+        idx, values = top_contributions(contrib[:, :-1], top_n)
+        feature_values = np.take_along_axis(np.asarray(X, dtype=np.float64), idx, axis=1)
+
+        names = self.feature_names
+        base = contrib[:, -1].tolist()
+        explanations = []
+        for row_idx, row_vals, row_x, b in zip(idx.tolist(), values.tolist(), feature_values.tolist(), base):
+            explanations.append({
+                "base_value": b,
+                "top_features": [
+                    # NaN в JSON не пишем — отсутствующее значение фичи отдаём как null
+                    {"feature": names[j], "value": None if x != x else x, "contribution": c}
+                    for j, c, x in zip(row_idx, row_vals, row_x)
+                ],
+            })
+        return proba, explanations
+
+
+def global_importance(model, X, chunk_rows=CHUNK_ROWS, num_threads=None):
+    """
+    Глобальная важность по всем строкам X (по кускам chunk_rows): средний |вклад|,
+    средний вклад и доля строк, где фича в топ-5. Отсортировано по mean_abs_contribution.
+    """
+    booster = model.booster_ if hasattr(model, "booster_") else model
+    feature_names = booster.feature_name()
+    X = np.asarray(X, dtype=np.float64)
+    num_threads = num_threads or os.cpu_count() or 1
+    abs_sum = np.zeros(len(feature_names))
+    signed_sum = np.zeros(len(feature_names))
+    top_counts = np.zeros(len(feature_names))
+    for start in range(0, len(X), chunk_rows):
+        contrib = booster.predict(X[start:start + chunk_rows], pred_contrib=True, num_threads=num_threads)[:, :-1]
+        abs_sum += np.abs(contrib).sum(axis=0)
+        signed_sum += contrib.sum(axis=0)
+        idx, _ = top_contributions(contrib, TOP_N)
+        top_counts += np.bincount(idx.ravel(), minlength=len(feature_names))
+    n = max(len(X), 1)
+    return pd.DataFrame({
+        "feature": feature_names,
+        "mean_abs_contribution": abs_sum / n,
+        "mean_contribution": signed_sum / n,
+        "top5_share": top_counts / n,
+    }).sort_values("mean_abs_contribution", ascending=False).reset_index(drop=True)
+
+
+def save_global_importance(importance, name="LightGBM", plot=True):
+    os.makedirs("results", exist_ok=True)
+    importance.to_csv(f"results/{name}_global_importance.csv", index=False)
+    if plot:
+        import matplotlib.pyplot as plt
+        top = importance.head(20).iloc[::-1]
+        os.makedirs("plots", exist_ok=True)
+        plt.figure(figsize=(8, 6))
+        plt.barh(top["feature"], top["mean_abs_contribution"])
+        plt.xlabel("mean |contribution| (log-odds)")
+        plt.title(f"{name} global importance ({len(importance)} features)")
+        plt.savefig(f"plots/{name}_global_importance.png", bbox_inches="tight")
+        plt.close()
+
+
+if __name__ == "__main__":
+    from src.data_preparation import HIGH_CORR_FEATURES, load_and_clean_data, load_medians
+    from src.model_registry import load_version
+
+    parser = argparse.ArgumentParser(description="Глобальная важность фичей по pred_contrib")
+    parser.add_argument("--data", default="data/dataset.parquet")
+    parser.add_argument("--name", default="LightGBM")
+    parser.add_argument("--no-plot", action="store_true")
+    args = parser.parse_args()
+
+    bundle = load_version()
+    df = load_and_clean_data(args.data, columns=bundle.feature_names, exclude=HIGH_CORR_FEATURES)
+    medians_path = bundle.artifact("reference/feature_medians.json")
+    if medians_path:
+        # Пропуски — как при обучении
+        df = df.fillna(load_medians(medians_path))
+    importance = global_importance(bundle.model, df[bundle.feature_names])
+    save_global_importance(importance, args.name, plot=not args.no_plot)
+    print(importance.head(20).to_string(index=False))
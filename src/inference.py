@@ -1,9 +1,95 @@
 import joblib
+import os
+import threading
+from operator import itemgetter
+
+import numpy as np
 import pandas as pd
 
+INFERENCE_MODES = ("numpy", "pandas", "compiled")
+
+
 def load_model(path="models/lightgbm_model.pkl"):
     return joblib.load(path)
 
 def predict(model, X):
     return model.predict(X), model.predict_proba(X)[:, 1]
 
+
+class InferenceEngine:
+    """
+    Скоринг запросов API.
+
+    mode="numpy" — быстрый путь без pandas: порядок фичей компилируется один раз
+    в itemgetter, записи пакуются прямо в предвыделенный float64-буфер потока,
+    скоринг идёт через model.booster_.predict.
+    mode="pandas" — исходный путь (DataFrame + predict_proba), для сверки скоров.
+    mode="compiled" — упаковка как в numpy, скоринг NumPy-лесом из src.tree_export.
+    """
+
+    def __init__(self, model, mode="numpy", num_threads=None, parallel_min_rows=512, buffer_rows=256,
+                 forest_path="models/lightgbm_forest.npz"):
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"Неизвестный режим инференса '{mode}', ожидается один из {INFERENCE_MODES}")
+        self.model = model
+        self.booster = model.booster_
+        self.feature_names = list(model.feature_name_)
+        self.n_features = len(self.feature_names)
+        self.mode = mode
+        # Маленькие батчи быстрее в один поток, большие — на всех выделенных ядрах
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.parallel_min_rows = parallel_min_rows
+        self.buffer_rows = buffer_rows
+
+        self._getter = itemgetter(*self.feature_names)
+
+        self.forest = None
+        if mode == "compiled":
+            from src.tree_export import CompiledForest, export_forest
+            if forest_path and os.path.exists(forest_path):
+                self.forest = CompiledForest.load(forest_path)
+            # Экспорт устарел (другой набор фичей) или его нет — собираем лес из модели в памяти
+            if self.forest is None or self.forest.feature_names != self.feature_names:
+                self.forest = export_forest(model, path=None)
+        self._local = threading.local()
+
+    def _buffer(self, n_rows):
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < n_rows:
+            buf = np.empty((max(n_rows, self.buffer_rows), self.n_features), dtype=np.float64)
+            self._local.buf = buf
+        return buf[:n_rows]
+
+    def pack(self, records):
+        """
+        Список dict → матрица (n, n_features) в порядке feature_names.
+        Возвращает view на буфер потока: он перезаписывается следующим вызовом.
+        Отсутствующая фича — KeyError, как в pandas-пути; None → NaN.
+        """
+        X = self._buffer(len(records))
+        getter = self._getter
+        single = self.n_features == 1
+        for i, rec in enumerate(records):
+            values = getter(rec)
+            try:
+                X[i] = values
+            except (TypeError, ValueError):
+                if single:
+                    values = (values,)
+                X[i] = [np.nan if v is None else float(v) for v in values]
+        return X
+
+    def predict_matrix(self, X):
+        """Вероятности класса 1 для готовой float64-матрицы."""
+        if self.forest is not None:
+            return self.forest.predict_proba(X)
+        num_threads = self.num_threads if len(X) >= self.parallel_min_rows else 1
+        return self.booster.predict(X, num_threads=num_threads)
+
+    def predict_records(self, records):
+        """Скоринг списка dict. Возвращает (матрица фичей, вероятности)."""
+        if self.mode == "pandas":
+            X = pd.DataFrame(records)[self.feature_names]
+            return X.to_numpy(dtype=np.float64), self.model.predict_proba(X, num_threads=self.num_threads)[:, 1]
+        X = self.pack(records)
+        return X, self.predict_matrix(X)
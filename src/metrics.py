@@ -0,0 +1,194 @@
+"""
+Метрики API в формате Prometheus.
+
+Запись на горячем пути без блокировок: каждый поток пишет в свой шард
+(обычные списки в threading.local), а /metrics при сборе суммирует шарды.
+Шарды завершившихся потоков вливаются в общий «архивный» шард, чтобы
+потоки-на-запрос (werkzeug) не копили память.
+"""
+import threading
+from bisect import bisect_left
+
+# Секунды: от 50 мкс до 10 с
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+MAX_LIVE_SHARDS = 64
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Общая часть: шарды по потокам. Шард — {кортеж меток: список значений},
+    width — длина списка значений одной серии.
+    """
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=(), width=1):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.width = width
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []          # [(поток, шард)]
+        self._retired = {}
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._shards) >= MAX_LIVE_SHARDS:
+                    self._retire_dead()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _slot(self, labels):
+        shard = self._shard()
+        slot = shard.get(labels)
+        if slot is None:
+            slot = shard[labels] = [0] * self.width
+        return slot
+
+    def _retire_dead(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    @staticmethod
+    def _merge(target, shard):
+        for labels, values in list(shard.items()):
+            slot = target.setdefault(labels, [0] * len(values))
+            for i, v in enumerate(values):
+                slot[i] += v
+
+    def collect(self):
+        """Сумма по всем шардам: {кортеж меток: список значений}."""
+        with self._lock:
+            self._retire_dead()
+            total = {labels: list(values) for labels, values in self._retired.items()}
+            for _, shard in self._shards:
+                self._merge(total, shard)
+        return total
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, values in sorted(self.collect().items()):
+            lines.extend(self._render_values(labels, values))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labels):
+        self._slot(labels)[0] += amount
+
+    def _render_values(self, labels, values):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_fmt(values[0])}"]
+
+
+class Gauge(Counter):
+    """Gauge из inc/dec (например, запросы в работе): сумма по потокам."""
+
+    kind = "gauge"
+
+    def dec(self, amount=1, *labels):
+        self._slot(labels)[0] -= amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        # Значения серии: счётчики по бакетам (+Inf последним), сумма, количество
+        buckets = tuple(buckets)
+        super().__init__(name, help_text, labelnames, width=len(buckets) + 3)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        slot = self._slot(labels)
+        slot[bisect_left(self.buckets, value)] += 1
+        slot[-2] += value
+        slot[-1] += 1
+
+    def _render_values(self, labels, values):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), values[:-2]):
+            cumulative += count
+            le = f'le="{_fmt(float(bound))}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(float(values[-2]))}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {values[-1]}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge, значение которого читается при сборе: fn() → число или {кортеж меток: число}."""
+
+    def __init__(self, name, help_text, fn, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, v in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_fmt(v)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        return self._add(Histogram(name, help_text, buckets, labelnames))
+
+    def callback_gauge(self, name, help_text, fn, labelnames=()):
+        return self._add(CallbackGauge(name, help_text, fn, labelnames))
+
+    def render(self):
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,213 @@
+"""
+Версионированный реестр моделей.
+
+models/registry/
+    v0001/  model.pkl, threshold.pkl, features.json, meta.json, reference/*.npz
+    v0002/  ...
+    CURRENT — имя текущей версии
+
+Версия собирается во временной папке и публикуется атомарным os.rename,
+указатель CURRENT переключается через os.replace — читатель никогда не видит
+полузаписанную версию. RegistryWatcher следит за CURRENT и отдаёт новую
+версию колбэку (API подгружает и прогревает её в фоне).
+"""
+import errno
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime
+
+import joblib
+
+REGISTRY_DIR = "models/registry"
+CURRENT_FILE = "CURRENT"
+LEGACY_MODEL_PATH = "models/lightgbm_model.pkl"
+LEGACY_THRESHOLD_PATH = "models/lightgbm_best_threshold.pkl"
+LEGACY_VERSION = "lightgbm_v1"
+PUBLISH_ATTEMPTS = 100   # сколько раз пробуем занять номер версии при гонке публикаций
+
+# Артефакты референса, которые едут вместе с моделью
+REFERENCE_FILES = [
+    "monitoring/reference/reference_profile.npz",
+    "monitoring/reference/reference_score_profile.npz",
+    "monitoring/reference/sketch_reference.npz",
+    "models/lightgbm_forest.npz",
+    "models/feature_medians.json",
+    "results/data_profile.json",
+]
+
+
+class ModelBundle:
+    """Всё, что нужно для скоринга одной версией модели."""
+
+    def __init__(self, version, model, threshold, feature_names, path=None, meta=None):
+        self.version = version
+        self.model = model
+        self.threshold = float(threshold)
+        self.feature_names = list(feature_names)
+        self.path = path
+        self.meta = meta or {}
+
+    def artifact(self, name):
+        """Путь к артефакту версии (например reference/sketch_reference.npz) или None."""
+        if self.path is None:
+            return None
+        path = os.path.join(self.path, name)
+        return path if os.path.exists(path) else None
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(name for name in os.listdir(registry_dir)
+                  if name.startswith("v") and os.path.isdir(os.path.join(registry_dir, name)))
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    path = os.path.join(registry_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def set_current(version, registry_dir=REGISTRY_DIR):
+    """Атомарно переключает CURRENT (в том числе для отката)."""
+    if not os.path.isdir(os.path.join(registry_dir, version)):
+        raise ValueError(f"Версия {version} не найдена в {registry_dir}")
+    tmp = os.path.join(registry_dir, f".{CURRENT_FILE}.{uuid.uuid4().hex}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(registry_dir, CURRENT_FILE))
+
+
+def publish_version(model, threshold, feature_names=None, reference_files=REFERENCE_FILES,
+                    metadata=None, registry_dir=REGISTRY_DIR, make_current=True):
+    """Сохраняет модель новой версией и (по умолчанию) делает её текущей. Возвращает имя версии."""
+    os.makedirs(registry_dir, exist_ok=True)
+    feature_names = list(feature_names if feature_names is not None else model.feature_name_)
+
+    tmp_dir = os.path.join(registry_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(os.path.join(tmp_dir, "reference"))
+    joblib.dump(model, os.path.join(tmp_dir, "model.pkl"))
+    joblib.dump(threshold, os.path.join(tmp_dir, "threshold.pkl"))
+    with open(os.path.join(tmp_dir, "features.json"), "w", encoding="utf-8") as f:
+        json.dump(feature_names, f)
+    for path in reference_files:
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(tmp_dir, "reference", os.path.basename(path)))
+
+    # Номер версии занимаем атомарным rename: если его успел занять другой процесс — берём следующий.
+    # Любая другая ошибка (нет прав, нет места, ...) — не гонка: пробрасываем её, не зацикливаясь
+    for attempt in range(PUBLISH_ATTEMPTS):
+        versions = list_versions(registry_dir)
+        number = int(versions[-1][1:]) + 1 if versions else 1
+        version = f"v{number:04d}"
+        meta = {
+            "version": version,
+            "created_at": datetime.utcnow().isoformat(),
+            "threshold": float(threshold),
+            "n_features": len(feature_names),
+            **(metadata or {}),
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        try:
+            os.rename(tmp_dir, os.path.join(registry_dir, version))
+            break
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY) or attempt == PUBLISH_ATTEMPTS - 1:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+
+    if make_current:
+        set_current(version, registry_dir)
+    print(f"📦 Опубликована версия модели {version}")
+    return version
+
+
+def load_version(version=None, registry_dir=REGISTRY_DIR):
+    """
+    Загружает версию (по умолчанию текущую). Если реестр пуст —
+    старые файлы models/lightgbm_model.pkl + lightgbm_best_threshold.pkl.
+    """
+    version = version or current_version(registry_dir)
+    if version is None:
+        model = joblib.load(LEGACY_MODEL_PATH)
+        return ModelBundle(LEGACY_VERSION, model, joblib.load(LEGACY_THRESHOLD_PATH), model.feature_name_)
+
+    path = os.path.join(registry_dir, version)
+    model = joblib.load(os.path.join(path, "model.pkl"))
+    threshold = joblib.load(os.path.join(path, "threshold.pkl"))
+    with open(os.path.join(path, "features.json"), "r", encoding="utf-8") as f:
+        feature_names = json.load(f)
+    meta = {}
+    if os.path.exists(os.path.join(path, "meta.json")):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    return ModelBundle(version, model, threshold, feature_names, path, meta)
+
+
+def current_threshold(registry_dir=REGISTRY_DIR):
+    """Порог текущей версии без загрузки самой модели."""
+    version = current_version(registry_dir)
+    if version is None:
+        return float(joblib.load(LEGACY_THRESHOLD_PATH))
+    return float(joblib.load(os.path.join(registry_dir, version, "threshold.pkl")))
+
+
+def version_threshold(version, registry_dir=REGISTRY_DIR):
+    """Порог конкретной версии (например, из model_version логов); None — такой версии нет."""
+    if version == LEGACY_VERSION:
+        path = LEGACY_THRESHOLD_PATH
+    elif version in list_versions(registry_dir):
+        path = os.path.join(registry_dir, version, "threshold.pkl")
+    else:
+        return None
+    return float(joblib.load(path)) if os.path.exists(path) else None
+
+
+def current_model_path(registry_dir=REGISTRY_DIR):
+    version = current_version(registry_dir)
+    if version is None:
+        return LEGACY_MODEL_PATH
+    return os.path.join(registry_dir, version, "model.pkl")
+
+
+class RegistryWatcher:
+    """
+    Фоновый поток: раз в poll_interval секунд читает CURRENT и, если версия
+    сменилась, вызывает on_change(version). Колбэк сам грузит и прогревает модель;
+    при ошибке попытка повторится на следующем опросе.
+    """
+
+    def __init__(self, on_change, known_version=None, poll_interval=5.0, registry_dir=REGISTRY_DIR):
+        self.on_change = on_change
+        self.known_version = known_version
+        self.poll_interval = poll_interval
+        self.registry_dir = registry_dir
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="registry-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            version = current_version(self.registry_dir)
+            if version is None or version == self.known_version:
+                continue
+            try:
+                self.on_change(version)
+                self.known_version = version
+            except Exception as e:
+                print(f"❌ Не удалось загрузить версию {version}: {e}")
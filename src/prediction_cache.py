@@ -0,0 +1,102 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Ограниченный LRU-кэш скоров с TTL.
+
+    Ключ — (версия модели, blake2b от строки фичей в порядке feature_names).
+    Хранится только вероятность: порог применяется после, а смена версии
+    (вместе с ней и порога) сбрасывает кэш через invalidate(). Записи старой
+    версии, успевшие попасть в кэш после сброса, не совпадут по ключу и
+    вытеснятся по LRU/TTL.
+    """
+
+    def __init__(self, max_entries=100_000, ttl_seconds=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Счётчики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _keys(X, version):
+        # + 0.0 приводит -0.0 к 0.0, чтобы одинаковые значения давали одинаковые байты
+        X = np.ascontiguousarray(X, dtype=np.float64) + 0.0
+        return [(version, hashlib.blake2b(row.tobytes(), digest_size=16).digest()) for row in X]
+
+    def lookup(self, X, version):
+        """
+        Ищет скоры для строк X. Возвращает (proba, hit, keys): proba с NaN
+        на промахах, булеву маску попаданий и ключи для последующего store.
+        """
+        keys = self._keys(X, version)
+        proba = self._new_values(len(keys), np.shape(X)[1])
+        hit = np.zeros(len(keys), dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._data[key]
+                    self.expirations += 1
+                    continue
+                self._data.move_to_end(key)
+                proba[i] = entry[0]
+                hit[i] = True
+            n_hits = int(hit.sum())
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+        return proba, hit, keys
+
+    def store(self, keys, proba):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key, p in zip(keys, proba):
+                self._data[key] = (self._stored_value(p), expires)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    # Значения записей; подклассы (ContributionCache) хранят векторы вместо скора
+    def _new_values(self, n, width):
+        """Результат lookup для n строк с width фичами: NaN на месте промахов."""
+        return np.full(n, np.nan)
+
+    @staticmethod
+    def _stored_value(value):
+        return float(value)
+
+    def invalidate(self):
+        """Полный сброс (новая версия модели или порога)."""
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,171 @@
+"""
+Быстрое дообучение текущей модели на новых размеченных данных.
+
+Вместо полного train_pipeline.py (EDA, CV, SHAP, графики, CSV-дампы и 347
+деревьев с нуля) берём booster текущей версии из реестра и достраиваем к нему
+rounds деревьев через init_model. Holdout делится пополам: на одной части
+заново подбирается порог по F1, на другой валидационный гейт сравнивает новую
+и текущую модели (ROC AUC и F1 при своих порогах). Только прошедшая гейт модель,
+чей экспорт леса совпадает с LightGBM, публикуется в реестр (API подхватит её сам).
+
+    python -m src.retrain --labels monitoring/logs/predictions_with_labels.csv --rounds 50
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score, precision_recall_curve, roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from src.model_registry import REFERENCE_FILES, load_version, publish_version
+from src.tree_export import check_parity, export_forest
+
+LABELS_PATH = "monitoring/logs/predictions_with_labels.csv"
+LABEL_COL = "true_label"
+
+# Настройки по умолчанию
+EXTRA_ROUNDS = 50
+HOLDOUT_FRAC = 0.3
+THRESHOLD_FRAC = 0.5    # доля holdout под подбор порога; остальное — гейт
+MIN_ROWS = 200
+MAX_AUC_DROP = 0.005    # насколько новая модель может уступить текущей по ROC AUC на holdout
+MIN_AUC = 0.6           # абсолютный минимум ROC AUC на holdout
+
+
+def best_f1_threshold(y_true, proba):
+    """Порог с максимальным F1 — как в evaluate_model."""
+    precision, recall, thresholds = precision_recall_curve(y_true, proba)
+    f1_scores = 2 * (precision * recall) / (precision + recall + 1e-9)
+    return float(thresholds[min(np.argmax(f1_scores), len(thresholds) - 1)])
+
+
+def _load_labelled(path, feature_names):
+    df = pd.read_csv(path)
+    if LABEL_COL not in df.columns:
+        raise ValueError(f"В {path} нет колонки {LABEL_COL}")
+    df = df.dropna(subset=[LABEL_COL])
+    X = df.reindex(columns=feature_names).apply(pd.to_numeric, errors="coerce").astype("float64")
+    X = X.replace([np.inf, -np.inf], np.nan)
+    return X, df[LABEL_COL].astype(int)
+
+
+def _reference_files(bundle):
+    """Референсы дрейфа текущей версии (или общие из monitoring/reference) без экспорта леса."""
+    files = []
+    for path in REFERENCE_FILES:
+        if path.endswith("lightgbm_forest.npz"):
+            continue
+        files.append(bundle.artifact(os.path.join("reference", os.path.basename(path))) or path)
+    return files
+
+
+def incremental_retrain(labels_path=LABELS_PATH, rounds=EXTRA_ROUNDS, learning_rate=None,
+                        holdout_frac=HOLDOUT_FRAC, min_rows=MIN_ROWS, max_auc_drop=MAX_AUC_DROP,
+                        min_auc=MIN_AUC, random_state=42, publish=True):
+    """
+    Дообучает текущую модель и публикует её, если она прошла гейт.
+    Возвращает отчёт (dict); report["published"] — имя новой версии или None.
+    """
+    started = time.perf_counter()
+    bundle = load_version()
+    base = bundle.model
+    report = {"base_version": bundle.version, "published": None}
+
+    if not os.path.exists(labels_path):
+        print(f"ℹ️ Нет файла с лейблами {labels_path} — дообучение пропущено")
+        report["reason"] = "no_labels"
+        return report
+
+    X, y = _load_labelled(labels_path, bundle.feature_names)
+    if len(X) < min_rows or y.nunique() < 2:
+        print(f"ℹ️ Недостаточно размеченных данных для дообучения: {len(X)} строк, классов {y.nunique()}")
+        report["reason"] = "not_enough_labels"
+        return report
+
+    X_fit, X_hold, y_fit, y_hold = train_test_split(
+        X, y, test_size=holdout_frac, random_state=random_state, stratify=y)
+    # Порог подбираем не на тех строках, по которым потом судит гейт
+    X_thr, X_hold, y_thr, y_hold = train_test_split(
+        X_hold, y_hold, test_size=1 - THRESHOLD_FRAC, random_state=random_state, stratify=y_hold)
+
+    # Те же гиперпараметры, только rounds новых деревьев поверх текущего booster-а
+    params = {**base.get_params(), "n_estimators": rounds}
+    if learning_rate is not None:
+        params["learning_rate"] = learning_rate
+    model = lgb.LGBMClassifier(**params)
+    model.fit(X_fit, y_fit, init_model=base.booster_)
+
+    # Порог — на своей части holdout, гейт — на оставшейся
+    threshold = best_f1_threshold(y_thr, model.booster_.predict(X_thr.to_numpy()))
+    base_proba = base.booster_.predict(X_hold.to_numpy())
+    new_proba = model.booster_.predict(X_hold.to_numpy())
+    base_auc = roc_auc_score(y_hold, base_proba)
+    new_auc = roc_auc_score(y_hold, new_proba)
+    report.update({
+        "rows": len(X),
+        "trees": model.booster_.num_trees(),
+        "threshold": threshold,
+        "base_auc": float(base_auc),
+        "new_auc": float(new_auc),
+        "base_f1": float(f1_score(y_hold, (base_proba >= bundle.threshold).astype(int))),
+        "new_f1": float(f1_score(y_hold, (new_proba >= threshold).astype(int))),
+    })
+    print(f" Holdout ROC AUC: текущая {base_auc:.4f} → новая {new_auc:.4f}; "
+          f"F1 {report['base_f1']:.4f} → {report['new_f1']:.4f}, порог {threshold:.4f}")
+
+    failed = []
+    if new_auc < min_auc:
+        failed.append(f"ROC AUC {new_auc:.4f} < {min_auc}")
+    if new_auc < base_auc - max_auc_drop:
+        failed.append(f"ROC AUC упал на {base_auc - new_auc:.4f} (допустимо {max_auc_drop})")
+    report["gate_passed"] = not failed
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    if failed:
+        print("❌ Новая модель не прошла валидационный гейт: " + "; ".join(failed))
+        report["reason"] = "gate_failed"
+        return report
+    print(f"✅ Валидационный гейт пройден ({report['seconds']} с)")
+
+    if publish:
+        # Экспорт леса под новую модель едет в версию вместе с референсами
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            forest_path = os.path.join(tmp_dir, "lightgbm_forest.npz")
+            forest = export_forest(model, forest_path)
+            if not check_parity(model, X_hold.to_numpy(), forest)["ok"]:
+                # Без своего леса API в режиме compiled взял бы чужой или тот же неверный экспорт
+                print("❌ Скомпилированный лес расходится с LightGBM — версия не публикуется")
+                report["reason"] = "parity_failed"
+                return report
+            report["published"] = publish_version(
+                model, threshold, bundle.feature_names,
+                reference_files=_reference_files(bundle) + [forest_path],
+                metadata={
+                    "mode": "incremental",
+                    "base_version": bundle.version,
+                    "extra_rounds": rounds,
+                    "holdout_auc": float(new_auc),
+                    "labelled_rows": len(X),
+                },
+            )
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Дообучение текущей модели на новых лейблах")
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--rounds", type=int, default=EXTRA_ROUNDS)
+    parser.add_argument("--learning-rate", type=float, default=None)
+    parser.add_argument("--max-auc-drop", type=float, default=MAX_AUC_DROP)
+    parser.add_argument("--dry-run", action="store_true", help="не публиковать модель")
+    args = parser.parse_args()
+
+    incremental_retrain(args.labels, args.rounds, args.learning_rate,
+                        max_auc_drop=args.max_auc_drop, publish=not args.dry_run)
@@ -0,0 +1,245 @@
+"""
+Теневой скоринг: challenger-модели на живом трафике без влияния на ответ.
+
+/predict после ответа основной моделью отдаёт долю батчей (sample_rate)
+ShadowScorer-у: батч уходит в фоновый пул потоков, где каждый challenger
+скорит ту же матрицу фичей. Очередь ограничена (max_pending батчей) —
+если пул не успевает, батч пропускается, а не ждёт: задержку основного
+ответа теневой скоринг не добавляет никогда.
+
+По строке в monitoring/logs/shadow_YYYY-MM-DD.jsonl на (строку батча,
+challenger): prediction_id (связь с логом предиктов и лейблами), скоры
+обеих моделей, разница, расхождение решений при порогах каждой модели и
+время инференса challenger-а на батч. Сводка по challenger-ам:
+    python -m src.shadow --days 7
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.inference import InferenceEngine
+
+SHADOW_LOG_DIR = "monitoring/logs"
+SAMPLE_RATE = 0.1
+MAX_PENDING = 8
+
+
+class Challenger:
+    """Версия модели из реестра, которую скорим в тени."""
+
+    def __init__(self, bundle, num_threads=1):
+        self.version = bundle.version
+        self.threshold = bundle.threshold
+        self.feature_names = bundle.feature_names
+        self.engine = InferenceEngine(bundle.model, num_threads=num_threads)
+        # Прогрев в один поток — как у основной модели, до fork воркеров
+        self.engine.predict_matrix(np.zeros((1, len(self.feature_names))))
+
+
+class ShadowScorer:
+    """
+    challengers — список Challenger. latency_metric — необязательная гистограмма
+    (src.metrics) с меткой version для времени инференса challenger-ов.
+    """
+
+    def __init__(self, challengers, sample_rate=SAMPLE_RATE, max_pending=MAX_PENDING, workers=1,
+                 log_dir=SHADOW_LOG_DIR, latency_metric=None):
+        self.challengers = list(challengers)
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.workers = workers
+        self.log_dir = log_dir
+        self.latency_metric = latency_metric
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # Счётчики
+        self.submitted = 0
+        self.sampled_out = 0
+        self.dropped_busy = 0
+        self.errors = 0
+        self.per_version = {c.version: {"rows": 0, "batches": 0, "disagreements": 0, "abs_delta_sum": 0.0,
+                                        "seconds_sum": 0.0} for c in self.challengers}
+
+    def submit(self, X, proba, threshold, version, prediction_ids, feature_names):
+        """
+        Ставит батч в теневой скоринг (или пропускает). X не должен меняться после вызова —
+        буфер движка сюда не передаём. Возвращает True, если батч принят.
+        """
+        if not self.challengers:
+            return False
+        if random.random() >= self.sample_rate:
+            with self._lock:
+                self.sampled_out += 1
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped_busy += 1
+                return False
+            self._pending += 1
+            self.submitted += 1
+            if self._executor is None:
+                # Потоки — лениво, в воркере после fork
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="shadow")
+            executor = self._executor
+        executor.submit(self._run, X, np.asarray(proba, dtype=np.float64), threshold, version,
+                        list(prediction_ids), list(feature_names), datetime.utcnow())
+        return True
+
+    def _run(self, X, proba, threshold, version, prediction_ids, feature_names, timestamp):
+        try:
+            primary_pred = proba >= threshold
+            lines = []
+            for challenger in self.challengers:
+                X_c = X
+                if challenger.feature_names != feature_names:
+                    # У challenger-а другой набор/порядок фичей: нужных нет — NaN
+                    index = {name: j for j, name in enumerate(feature_names)}
+                    X_c = np.full((len(X), len(challenger.feature_names)), np.nan)
+                    for j, name in enumerate(challenger.feature_names):
+                        if name in index:
+                            X_c[:, j] = X[:, index[name]]
+                started = time.perf_counter()
+                score = challenger.engine.predict_matrix(X_c)
+                seconds = time.perf_counter() - started
+                delta = score - proba
+                disagree = (score >= challenger.threshold) != primary_pred
+
+                with self._lock:
+                    stats = self.per_version[challenger.version]
+                    stats["rows"] += len(score)
+                    stats["batches"] += 1
+                    stats["disagreements"] += int(disagree.sum())
+                    stats["abs_delta_sum"] += float(np.abs(delta).sum())
+                    stats["seconds_sum"] += seconds
+                if self.latency_metric is not None:
+                    self.latency_metric.observe(seconds, challenger.version)
+
+                ts, latency_ms = timestamp.isoformat(), round(seconds * 1000, 3)
+                for pid, p, s, d, dis in zip(prediction_ids, proba.tolist(), score.tolist(), delta.tolist(),
+                                             disagree.tolist()):
+                    lines.append(json.dumps({
+                        "timestamp": ts, "prediction_id": pid,
+                        "model_version": version, "score": p,
+                        "challenger_version": challenger.version, "challenger_score": s,
+                        "delta": d, "disagree": dis,
+                        "batch_rows": len(score), "latency_ms": latency_ms,
+                    }))
+            self._write(timestamp, lines)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"❌ Теневой скоринг: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _write(self, timestamp, lines):
+        os.makedirs(self.log_dir, exist_ok=True)
+        path = os.path.join(self.log_dir, f"shadow_{timestamp.strftime('%Y-%m-%d')}.jsonl")
+        data = memoryview(("\n".join(lines) + "\n").encode("utf-8"))
+        # Один системный write на батч — строки воркеров не перемешиваются
+        with open(path, "ab", buffering=0) as f:
+            while data:
+                data = data[f.write(data):]
+
+    def close(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        challengers = {}
+        for version, s in self.per_version.items():
+            rows, batches = s["rows"], s["batches"]
+            challengers[version] = {
+                "rows": rows,
+                "disagreement_rate": s["disagreements"] / rows if rows else None,
+                "mean_abs_delta": s["abs_delta_sum"] / rows if rows else None,
+                "mean_batch_ms": 1000 * s["seconds_sum"] / batches if batches else None,
+            }
+        return {
+            "sample_rate": self.sample_rate,
+            "pending": self._pending,
+            "submitted": self.submitted,
+            "sampled_out": self.sampled_out,
+            "dropped_busy": self.dropped_busy,
+            "errors": self.errors,
+            "challengers": challengers,
+        }
+
+
+def load_shadow_log(days=7, log_dir=SHADOW_LOG_DIR):
+    import pandas as pd
+    frames = []
+    today = datetime.utcnow()
+    for i in range(days):
+        path = os.path.join(log_dir, f"shadow_{(today - timedelta(days=i)).strftime('%Y-%m-%d')}.jsonl")
+        if os.path.exists(path):
+            frames.append(pd.read_json(path, lines=True, dtype={"prediction_id": str}))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def shadow_report(days=7, log_dir=SHADOW_LOG_DIR):
+    """
+    Сводка по challenger-ам: строки, расхождения решений, разница скоров, латентность
+    батча (p50/p95) и — где уже есть лейблы — ROC AUC основной модели и challenger-а.
+    """
+    import pandas as pd
+    from sklearn.metrics import roc_auc_score
+
+    df = load_shadow_log(days, log_dir)
+    if df.empty:
+        return df
+
+    labels = None
+    try:
+        from monitoring.label_store import LabelStore
+        store = LabelStore()
+        labels = store.labels_for(df["prediction_id"].unique())
+        store.close()
+    except Exception as e:
+        print(f"⚠️ Лейблы недоступны: {e}")
+
+    rows = []
+    for version, part in df.groupby("challenger_version"):
+        batches = part.drop_duplicates(["timestamp", "latency_ms", "batch_rows"])
+        row = {
+            "challenger_version": version,
+            "rows": len(part),
+            "disagreement_rate": part["disagree"].mean(),
+            "mean_abs_delta": part["delta"].abs().mean(),
+            "mean_delta": part["delta"].mean(),
+            "latency_ms_p50": batches["latency_ms"].quantile(0.5),
+            "latency_ms_p95": batches["latency_ms"].quantile(0.95),
+            "labelled": 0, "auc_primary": None, "auc_challenger": None,
+        }
+        if labels is not None and len(labels):
+            joined = part.merge(labels, on="prediction_id")
+            row["labelled"] = len(joined)
+            if joined["label"].nunique() == 2:
+                row["auc_primary"] = roc_auc_score(joined["label"], joined["score"])
+                row["auc_challenger"] = roc_auc_score(joined["label"], joined["challenger_score"])
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сводка теневого скоринга challenger-моделей")
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+    report = shadow_report(args.days)
+    if report.empty:
+        print("ℹ️ Нет логов теневого скоринга")
+    else:
+        print(report.to_string(index=False))
@@ -0,0 +1,222 @@
+"""
+Кэш стадий train_pipeline.py.
+
+Каждая стадия объявляет входы: стадии-зависимости, файлы данных, код (модули
+и саму функцию стадии) и параметры. Ключ стадии — sha256 от всего этого,
+поэтому изменение данных или кода перезапускает стадию и всё, что от неё
+зависит, а остальное берётся с диска:
+
+    .stage_cache/<стадия>/<ключ>/result.pkl   — возвращённое значение (joblib)
+    .stage_cache/<стадия>/<ключ>/outputs/...  — копии файлов, которые стадия пишет
+    .stage_cache/<стадия>/<ключ>/meta.json
+
+При попадании файлы-выходы восстанавливаются на свои места, а значение стадии
+читается с диска лениво — только если его запросит стадия, которой нужно
+выполниться. Стадии с persist=False (например, загрузка датасета) значение не
+сохраняют: при попадании и запросе они просто выполняются заново.
+"""
+import glob
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import joblib
+
+CACHE_DIR = ".stage_cache"
+FILE_HASHES = "_file_hashes.json"
+KEEP_ENTRIES = 3   # сколько последних ключей храним на стадию
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    """sha256 файла, читаемого кусками."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _source(obj):
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return repr(obj)
+
+
+class StageCache:
+    """
+    graph — {стадия: [стадии-зависимости]}.
+    force — имена стадий, которые пересчитываются без оглядки на кэш ("all" — все).
+    only — подмножество стадий для запуска: их зависимости берутся из кэша (или
+    считаются, если их там нет), все прочие стадии пропускаются.
+    Стадия — функция fn(cache); результаты зависимостей она берёт через
+    cache.result(имя). В results лежат уже материализованные значения.
+    """
+
+    def __init__(self, graph, cache_dir=CACHE_DIR, force=(), only=None):
+        self.graph = graph
+        self.cache_dir = cache_dir
+        self.force = set(force or ())
+        self.only = set(only) if only else None
+        self.needed = self._closure(self.only) if self.only else set(graph)
+        self.keys = {}
+        self.results = {}
+        self._sources = {}   # стадия → путь к result.pkl или функция стадии (persist=False)
+        self._file_hashes = None
+
+    def _closure(self, names):
+        needed, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.graph.get(name, ()))
+        return needed
+
+    # ------------------------------------------------------------------
+    # Хэши входов
+    # ------------------------------------------------------------------
+    def file_hash(self, path):
+        """sha256 файла; повторно не читается, пока не изменились размер и mtime."""
+        if self._file_hashes is None:
+            index_path = os.path.join(self.cache_dir, FILE_HASHES)
+            self._file_hashes = {}
+            if os.path.exists(index_path):
+                with open(index_path, "r", encoding="utf-8") as f:
+                    self._file_hashes = json.load(f)
+        st = os.stat(path)
+        cached = self._file_hashes.get(os.path.abspath(path))
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = sha256_file(path)
+        self._file_hashes[os.path.abspath(path)] = [st.st_size, st.st_mtime_ns, digest]
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, FILE_HASHES), "w", encoding="utf-8") as f:
+            json.dump(self._file_hashes, f)
+        return digest
+
+    def stage_key(self, name, fn, deps=(), files=(), code=(), params=None):
+        payload = {
+            "stage": name,
+            "deps": {dep: self.keys[dep] for dep in deps},
+            "files": {path: self.file_hash(path) for path in files},
+            "code": hashlib.sha256("\n".join(_source(obj) for obj in (fn, *code)).encode()).hexdigest(),
+            "params": params or {},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Запуск стадии
+    # ------------------------------------------------------------------
+    def run(self, name, fn, files=(), code=(), params=None, outputs=(), persist=True, check=None):
+        """
+        Выполняет fn(self) или отмечает стадию как взятую из кэша. files — файлы данных
+        и кода, code — модули, чей исходник входит в ключ, outputs — пути или glob-шаблоны
+        файлов, которые пишет стадия. persist=False — значение не сохраняется на диск.
+        check(value) — проверка, что значение из кэша ещё годно (иначе стадия выполняется).
+        """
+        if name not in self.needed:
+            print(f"⏭️ Стадия {name}: пропущена (--only)")
+            return
+
+        key = self.stage_key(name, fn, self.graph.get(name, ()), files, code, params)
+        self.keys[name] = key
+        stage_dir = os.path.join(self.cache_dir, name, key)
+        forced = "all" in self.force or name in self.force
+        self.results.pop(name, None)
+        self._sources.pop(name, None)
+
+        result_path = os.path.join(stage_dir, "result.pkl")
+        cached = os.path.exists(os.path.join(stage_dir, "meta.json")) and \
+            (not persist or os.path.exists(result_path))
+        if not forced and cached:
+            self._restore_outputs(stage_dir)
+            self._sources[name] = result_path if persist else fn
+            if check is None or check(self.result(name)):
+                print(f"♻️ Стадия {name}: из кэша ({key[:10]})")
+                return
+            print(f"⚠️ Стадия {name}: результат в кэше устарел — перезапуск")
+            self.results.pop(name, None)
+            self._sources.pop(name, None)
+        elif self.only is not None and name not in self.only:
+            print(f"⚠️ Стадия {name}: нет в кэше — запускаем как зависимость")
+
+        print(f"▶️ Стадия {name}: запуск")
+        started = time.time()
+        value = fn(self)
+        seconds = time.time() - started
+        self._save(name, stage_dir, value if persist else None, outputs, started, seconds, persist)
+        print(f"✅ Стадия {name}: {seconds:.1f} с")
+        self.results[name] = value
+        self._sources[name] = result_path if persist else fn
+
+    def result(self, name, default=None):
+        """Значение стадии: из памяти, с диска или — для persist=False — повторным запуском."""
+        if name in self.results:
+            return self.results[name]
+        source = self._sources.get(name)
+        if source is None:
+            return default
+        if callable(source):
+            print(f"▶️ Стадия {name}: запуск (значение нужно зависимой стадии)")
+            value = source(self)
+        else:
+            value = joblib.load(source)
+        self.results[name] = value
+        return value
+
+    def release(self, name):
+        """Отпускает значение стадии из памяти (при повторном запросе оно будет получено заново)."""
+        self.results.pop(name, None)
+
+    # ------------------------------------------------------------------
+    # Хранение
+    # ------------------------------------------------------------------
+    def _save(self, name, stage_dir, value, outputs, started, seconds, persist=True):
+        tmp_dir = stage_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(os.path.join(tmp_dir, "outputs"))
+        saved = []
+        for pattern in outputs:
+            for path in sorted(glob.glob(pattern)):
+                # Берём только файлы, записанные этим запуском стадии
+                if os.path.isfile(path) and os.path.getmtime(path) >= started - 1:
+                    dst = os.path.join(tmp_dir, "outputs", os.path.normpath(path))
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    shutil.copy2(path, dst)
+                    saved.append(os.path.normpath(path))
+        if persist:
+            joblib.dump(value, os.path.join(tmp_dir, "result.pkl"))
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"stage": name, "created_at": datetime.utcnow().isoformat(),
+                       "seconds": round(seconds, 2), "outputs": saved}, f, indent=2)
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        os.rename(tmp_dir, stage_dir)
+        self._prune(os.path.dirname(stage_dir))
+
+    def _restore_outputs(self, stage_dir):
+        with open(os.path.join(stage_dir, "meta.json"), "r", encoding="utf-8") as f:
+            outputs = json.load(f)["outputs"]
+        for path in outputs:
+            src = os.path.join(stage_dir, "outputs", path)
+            if os.path.exists(path):
+                a, b = os.stat(path), os.stat(src)
+                if a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns:
+                    continue
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copy2(src, path)
+        # Свежий mtime, чтобы запись не вытеснилась при очистке
+        os.utime(stage_dir)
+
+    @staticmethod
+    def _prune(stage_root):
+        entries = [os.path.join(stage_root, d) for d in os.listdir(stage_root)
+                   if not d.endswith(".tmp")]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for old in entries[KEEP_ENTRIES:]:
+            shutil.rmtree(old, ignore_errors=True)
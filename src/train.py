@@ -1,45 +1,42 @@
 import lightgbm as lgb
-import numpy as np
 import joblib
 import os
-from scipy.stats import randint, uniform
-from sklearn.model_selection import RandomizedSearchCV
 
-import lightgbm as lgb
-import joblib
-import os
-
-def train_lightgbm(X_train, y_train, random_state=42):
+# 🔑 Фиксированные гиперпараметры из Colab (лучший результат);
+# подобрать заново под свежие данные — python -m src.tuning или train_pipeline.py --tune
+BEST_PARAMS = {
+    'colsample_bytree': 0.6705331755251293,
+    'learning_rate': 0.04404205637217672,
+    'max_depth': 9,
+    'min_child_samples': 40,
+    'n_estimators': 347,
+    'num_leaves': 118,
+    'reg_alpha': 0.22855002179729966,
+    'reg_lambda': 0.17495492709593619,
+    'subsample': 0.9910841716647179
+}
+
+# Базовые параметры
+BASE_PARAMS = {
+    'objective': 'binary',
+    'metric': 'auc',
+    'boosting_type': 'gbdt',
+    'n_jobs': -1,
+    'verbosity': -1
+}
+
+
+def train_lightgbm(X_train, y_train, random_state=42, params=None):
     """
     Обучение LightGBM с фиксированными гиперпараметрами из Colab.
+    params — гиперпараметры вместо BEST_PARAMS (например, найденные src.tuning).
     """
     os.makedirs('models', exist_ok=True)
 
-    # 🔑 Фиксированные гиперпараметры из Colab (лучший результат)
-    best_params = {
-        'colsample_bytree': 0.6705331755251293,
-        'learning_rate': 0.04404205637217672,
-        'max_depth': 9,
-        'min_child_samples': 40,
-        'n_estimators': 347,
-        'num_leaves': 118,
-        'reg_alpha': 0.22855002179729966,
-        'reg_lambda': 0.17495492709593619,
-        'subsample': 0.9910841716647179
-    }
-
-    # Базовые параметры
-    base_params = {
-        'objective': 'binary',
-        'metric': 'auc',
-        'boosting_type': 'gbdt',
-        'random_state': random_state,
-        'n_jobs': -1,
-        'verbosity': -1
-    }
+    best_params = dict(params if params is not None else BEST_PARAMS)
 
     # Объединяем
-    final_params = {**base_params, **best_params}
+    final_params = {**BASE_PARAMS, 'random_state': random_state, **best_params}
 
     # Создаём и обучаем модель
     model = lgb.LGBMClassifier(**final_params)
@@ -48,4 +45,4 @@ def train_lightgbm(X_train, y_train, random_state=42):
     # Сохраняем
     joblib.dump(model, 'models/lightgbm_model.pkl')
 
-    return model, best_params, X_train.columns.tolist()
\ No newline at end of file
+    return model, best_params, X_train.columns.tolist()
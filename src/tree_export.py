@@ -0,0 +1,191 @@
+"""
+Экспорт обученного LightGBM в плоские NumPy-массивы и векторизованный скоринг без lightgbm.
+
+Все узлы всех деревьев лежат в общих массивах (фича сплита, порог, левый/правый
+потомок, значение листа, default_left, тип пропусков); у листа фича = -1.
+CompiledForest проходит все строки по всем деревьям одновременно, уровень за уровнем.
+"""
+import argparse
+import json
+
+import numpy as np
+
+# Типы обработки пропусков в сплите (как в LightGBM)
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+K_ZERO_THRESHOLD = 1e-35
+
+FOREST_PATH = "models/lightgbm_forest.npz"
+
+
+def _flatten_tree(tree, nodes):
+    """Рекурсивно раскладывает dict-дерево из dump_model в список nodes. Возвращает (индекс, глубина)."""
+    idx = len(nodes)
+    if "leaf_value" in tree:
+        nodes.append((-1, 0.0, -1, -1, float(tree["leaf_value"]), False, MISSING_NONE))
+        return idx, 0
+    if tree["decision_type"] != "<=":
+        raise NotImplementedError("Категориальные сплиты не поддерживаются компилятором деревьев")
+    # dump_model заменяет ±inf в порогах на ±1e300 (AvoidInf) — возвращаем бесконечность
+    threshold = float(tree["threshold"])
+    if abs(threshold) >= 1e300:
+        threshold = np.copysign(np.inf, threshold)
+    nodes.append(None)
+    left, left_depth = _flatten_tree(tree["left_child"], nodes)
+    right, right_depth = _flatten_tree(tree["right_child"], nodes)
+    nodes[idx] = (
+        int(tree["split_feature"]), threshold, left, right, 0.0,
+        bool(tree["default_left"]), _MISSING_TYPES[tree["missing_type"]],
+    )
+    return idx, 1 + max(left_depth, right_depth)
+
+
+def export_forest(model, path=FOREST_PATH):
+    """Сплющивает booster_.dump_model() в массивы и сохраняет в .npz."""
+    dump = model.booster_.dump_model()
+    objective = dump.get("objective", "")
+    if not objective.startswith("binary"):
+        raise NotImplementedError(f"Поддерживается только binary-объектив, а не '{objective}'")
+    sigmoid = 1.0
+    for token in objective.split()[1:]:
+        if token.startswith("sigmoid:"):
+            sigmoid = float(token.split(":", 1)[1])
+
+    nodes, roots, max_depth = [], [], 0
+    for info in dump["tree_info"]:
+        if info["tree_structure"].get("is_linear") or dump.get("is_linear"):
+            raise NotImplementedError("Линейные деревья не поддерживаются")
+        root, depth = _flatten_tree(info["tree_structure"], nodes)
+        roots.append(root)
+        max_depth = max(max_depth, depth)
+
+    feature, threshold, left, right, value, default_left, missing_type = zip(*nodes)
+    arrays = {
+        "feature": np.asarray(feature, dtype=np.int32),
+        "threshold": np.asarray(threshold, dtype=np.float64),
+        "left": np.asarray(left, dtype=np.int32),
+        "right": np.asarray(right, dtype=np.int32),
+        "value": np.asarray(value, dtype=np.float64),
+        "default_left": np.asarray(default_left, dtype=bool),
+        "missing_type": np.asarray(missing_type, dtype=np.int8),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": np.int32(max_depth),
+        "sigmoid": np.float64(sigmoid),
+        "average_output": np.bool_(dump.get("average_output", False)),
+        "feature_names": np.asarray(dump["feature_names"]),
+    }
+    if path is not None:
+        np.savez(path, **arrays)
+    return CompiledForest(arrays)
+
+
+class CompiledForest:
+    """Векторизованный обход леса; зависит только от NumPy."""
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.default_left = arrays["default_left"]
+        self.missing_type = arrays["missing_type"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.sigmoid = float(arrays["sigmoid"])
+        self.average_output = bool(arrays["average_output"])
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+        self.n_trees = len(self.roots)
+
+        # Рабочие массивы обхода: лист ссылается сам на себя, поэтому все строки
+        # проходят ровно max_depth шагов без масок активности
+        is_leaf = self.feature < 0
+        own = np.arange(len(self.feature), dtype=np.int32)
+        self._split_feature = np.where(is_leaf, 0, self.feature).astype(np.intp)
+        self._left = np.where(is_leaf, own, self.left)
+        self._right = np.where(is_leaf, own, self.right)
+        # Куда идёт NaN: при missing_type=NaN — default_left, иначе NaN → 0.0
+        zero_goes_left = np.where(self.missing_type == MISSING_ZERO, self.default_left, 0.0 <= self.threshold)
+        self._nan_left = np.where(self.missing_type == MISSING_NAN, self.default_left, zero_goes_left)
+        self._zero_missing = self.missing_type == MISSING_ZERO
+        self._has_zero_missing = bool(self._zero_missing.any())
+
+    @classmethod
+    def load(cls, path=FOREST_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def predict_raw(self, X, chunk_rows=2048):
+        X = np.asarray(X, dtype=np.float64)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), chunk_rows):
+            out[start:start + chunk_rows] = self._predict_chunk(X[start:start + chunk_rows])
+        return out
+
+    def predict_proba(self, X, chunk_rows=2048):
+        """Вероятность класса 1 (как predict_proba(X)[:, 1])."""
+        return 1.0 / (1.0 + np.exp(-self.sigmoid * self.predict_raw(X, chunk_rows)))
+
+    def _predict_chunk(self, X):
+        n, n_features = X.shape
+        flat = np.ascontiguousarray(X).ravel()
+        row_offset = (np.arange(n, dtype=np.intp) * n_features)[:, None]
+        node = np.repeat(self.roots[None, :], n, axis=0)      # (n, n_trees)
+        for _ in range(self.max_depth):
+            x = flat[row_offset + self._split_feature[node]]
+            go_left = x <= self.threshold[node]
+            is_nan = np.isnan(x)
+            if is_nan.any():
+                go_left[is_nan] = self._nan_left[node[is_nan]]
+            if self._has_zero_missing:
+                zero = self._zero_missing[node] & (np.abs(x) <= K_ZERO_THRESHOLD)
+                go_left[zero] = self.default_left[node[zero]]
+            node = np.where(go_left, self._left[node], self._right[node])
+        raw = self.value[node].sum(axis=1)
+        if self.average_output:
+            raw /= self.n_trees
+        return raw
+
+
+def check_parity(model, X, forest=None, threshold=None, atol=1e-9):
+    """
+    Сверка CompiledForest с model.predict_proba. Возвращает dict с максимальным
+    расхождением и, если задан threshold, числом разошедшихся решений.
+    """
+    if forest is None:
+        forest = export_forest(model, path=None)
+    X = np.asarray(X, dtype=np.float64)
+    expected = model.predict_proba(X)[:, 1]
+    actual = forest.predict_proba(X)
+    diff = np.abs(expected - actual)
+    report = {
+        "rows": int(len(X)),
+        "max_abs_diff": float(diff.max()) if len(diff) else 0.0,
+        "n_mismatch": int((diff > atol).sum()),
+        "ok": bool((diff <= atol).all()),
+    }
+    if threshold is not None:
+        report["decision_mismatch"] = int(((expected >= threshold) != (actual >= threshold)).sum())
+    return report
+
+
+if __name__ == "__main__":
+    import joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Экспорт LightGBM в NumPy-лес и сверка скоров")
+    parser.add_argument("--model", default="models/lightgbm_model.pkl")
+    parser.add_argument("--out", default=FOREST_PATH)
+    parser.add_argument("--check-data", default=None, help="parquet для сверки с predict_proba")
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    forest = export_forest(model, args.out)
+    print(f"✅ Лес сохранён в {args.out}: {forest.n_trees} деревьев, {len(forest.feature)} узлов, "
+          f"глубина {forest.max_depth}")
+
+    if args.check_data:
+        df = pd.read_parquet(args.check_data, columns=forest.feature_names)
+        df = df.head(args.rows).replace([np.inf, -np.inf], np.nan)
+        print(json.dumps(check_parity(model, df.to_numpy(dtype=np.float64), forest), indent=2))
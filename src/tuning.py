@@ -0,0 +1,249 @@
+"""
+Подбор гиперпараметров LightGBM: successive halving с ранней остановкой на val.
+
+N случайных конфигураций обучаются на бюджете min_rounds деревьев (с ранней
+остановкой по AUC на валидации); в следующий раунд проходит лучшая 1/eta
+часть с бюджетом × eta — и так до max_rounds. Конфигурации внутри раунда
+считаются в пуле процессов, у каждого trial свой бюджет потоков LightGBM
+(workers × threads_per_trial ≤ ядер), чтобы пул и OpenMP не делили ядра.
+
+Каждый завершённый trial дописывается в results/tuning/trials.jsonl — прерванный
+поиск с теми же настройками продолжается с места остановки. time_budget
+ограничивает время поиска: после него новые trials не запускаются.
+
+    python -m src.tuning --trials 27 --threads-per-trial 2 --time-budget 1800
+"""
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from src.stage_cache import sha256_file
+
+TRIALS_PATH = "results/tuning/trials.jsonl"
+BEST_PARAMS_PATH = "models/best_params.json"
+
+N_TRIALS = 27
+MIN_ROUNDS = 50
+MAX_ROUNDS = 1350
+ETA = 3
+EARLY_STOPPING_ROUNDS = 50
+THREADS_PER_TRIAL = 2
+
+# Пространство поиска в именах sklearn-API: лучшие параметры сразу идут в train_lightgbm
+SEARCH_SPACE = {
+    "learning_rate": ("log", 0.01, 0.2),
+    "num_leaves": ("int", 15, 255),
+    "max_depth": ("choice", [-1, 4, 6, 8, 10, 12]),
+    "min_child_samples": ("int", 10, 200),
+    "colsample_bytree": ("float", 0.5, 1.0),
+    "subsample": ("float", 0.6, 1.0),
+    "reg_alpha": ("log", 1e-3, 10.0),
+    "reg_lambda": ("log", 1e-3, 10.0),
+}
+
+# Данные trial-процесса: грузятся один раз в initializer пула
+_worker = {}
+
+
+def sample_configs(n_trials, space=SEARCH_SPACE, seed=42):
+    """n_trials случайных конфигураций; тот же seed — те же конфигурации (нужно для продолжения)."""
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n_trials):
+        config = {}
+        for name, (kind, *args) in space.items():
+            if kind == "log":
+                config[name] = float(np.exp(rng.uniform(np.log(args[0]), np.log(args[1]))))
+            elif kind == "int":
+                config[name] = int(rng.integers(args[0], args[1] + 1))
+            elif kind == "choice":
+                config[name] = args[0][int(rng.integers(len(args[0])))]
+            else:
+                config[name] = float(rng.uniform(args[0], args[1]))
+        if config.get("subsample", 1.0) < 1.0:
+            config["subsample_freq"] = 1   # без частоты bagging в LightGBM не включается
+        configs.append(config)
+    return configs
+
+
+def rung_budgets(min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, eta=ETA):
+    budgets = [min_rounds]
+    while budgets[-1] * eta <= max_rounds:
+        budgets.append(budgets[-1] * eta)
+    return budgets
+
+
+def _init_worker(dataset_path, X_val, y_val):
+    import lightgbm as lgb
+    train_set = lgb.Dataset(dataset_path, params={"verbosity": -1, "feature_pre_filter": False})
+    _worker["train"] = train_set
+    _worker["valid"] = lgb.Dataset(X_val, label=y_val, reference=train_set)
+
+
+def _run_trial(trial_id, config, rounds, threads, early_stopping_rounds, seed):
+    import lightgbm as lgb
+    params = {
+        "objective": "binary", "metric": "auc", "verbosity": -1, "seed": seed,
+        "num_threads": threads, "feature_pre_filter": False, **config,
+    }
+    started = time.perf_counter()
+    booster = lgb.train(
+        params, _worker["train"], num_boost_round=rounds, valid_sets=[_worker["valid"]],
+        callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)],
+    )
+    return {
+        "trial": trial_id,
+        "rounds": rounds,
+        "best_iteration": int(booster.best_iteration or rounds),
+        "score": float(booster.best_score["valid_0"]["auc"]),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def _search_id(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _load_trials(path, search_id):
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue   # недописанная строка прерванного поиска
+                if record.get("search_id") == search_id:
+                    done[(record["trial"], record["rounds"])] = record
+    return done
+
+
+def successive_halving(dataset_path, X_val, y_val, n_trials=N_TRIALS, min_rounds=MIN_ROUNDS,
+                       max_rounds=MAX_ROUNDS, eta=ETA, threads_per_trial=THREADS_PER_TRIAL, workers=None,
+                       time_budget=None, early_stopping_rounds=EARLY_STOPPING_ROUNDS, seed=42,
+                       trials_path=TRIALS_PATH):
+    """
+    Поиск по бинарному Dataset трейна (save_lgb_dataset) с валидацией на X_val/y_val.
+    Возвращает лучший trial: {"params": ..., "score": ..., ...}; params включают
+    n_estimators = лучшая итерация ранней остановки.
+    """
+    workers = workers or max(1, (os.cpu_count() or 1) // threads_per_trial)
+    configs = sample_configs(n_trials, seed=seed)
+    budgets = rung_budgets(min_rounds, max_rounds, eta)
+    search_id = _search_id({
+        "n_trials": n_trials, "budgets": budgets, "seed": seed, "space": SEARCH_SPACE,
+        "early_stopping_rounds": early_stopping_rounds, "val_rows": len(X_val),
+        "dataset": sha256_file(dataset_path),
+    })
+    done = _load_trials(trials_path, search_id)
+    if done:
+        print(f"♻️ Продолжаем поиск {search_id}: {len(done)} trials уже посчитаны")
+    os.makedirs(os.path.dirname(trials_path) or ".", exist_ok=True)
+
+    started = time.perf_counter()
+    alive = list(range(n_trials))
+    results = {}
+    X_val = np.ascontiguousarray(X_val, dtype=np.float64)
+    y_val = np.asarray(y_val)
+    # spawn: форкать процесс с уже поднятым OpenMP небезопасно
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(dataset_path, X_val, y_val)) as pool, \
+            open(trials_path, "a", encoding="utf-8") as log:
+        def log_trial(record):
+            log.write(json.dumps({"search_id": search_id, **record, "params": configs[record["trial"]]}) + "\n")
+            log.flush()
+
+        for rung, rounds in enumerate(budgets):
+            futures = []
+            for trial in alive:
+                previous = results.get(trial)
+                if (trial, rounds) in done:
+                    results[trial] = done[(trial, rounds)]
+                elif previous and previous["best_iteration"] + early_stopping_rounds < previous["rounds"]:
+                    # Trial уже остановился раньше бюджета — с большим бюджетом результат тот же
+                    results[trial] = {**previous, "rounds": rounds, "seconds": 0.0}
+                    log_trial(results[trial])
+                else:
+                    futures.append(pool.submit(_run_trial, trial, configs[trial], rounds,
+                                               threads_per_trial, early_stopping_rounds, seed))
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                record = future.result()
+                results[record["trial"]] = record
+                log_trial(record)
+                if time_budget is not None and time.perf_counter() - started > time_budget:
+                    # Ещё не начатые trials раунда снимаем, идущие дорабатывают
+                    for pending in futures:
+                        pending.cancel()
+
+            finished = [t for t in alive if results.get(t, {}).get("rounds") == rounds]
+            finished.sort(key=lambda t: results[t]["score"], reverse=True)
+            best = results[finished[0]] if finished else None
+            print(f" Раунд {rung}: {rounds} деревьев, {len(finished)} trials"
+                  + (f", лучший AUC {best['score']:.4f} (trial {best['trial']})" if best else ""))
+            if time_budget is not None and time.perf_counter() - started > time_budget:
+                print(f"⏱️ Бюджет времени {time_budget} с исчерпан — поиск остановлен")
+                break
+            alive = finished[:max(1, math.ceil(len(finished) / eta))]
+
+    scored = list(results.values())
+    if not scored:
+        raise RuntimeError("Ни один trial не завершился за бюджет времени")
+    # Лучший — на самом большом бюджете, до которого дошли trials
+    top_rounds = max(r["rounds"] for r in scored)
+    best = max((r for r in scored if r["rounds"] == top_rounds), key=lambda r: r["score"])
+    params = {**configs[best["trial"]], "n_estimators": best["best_iteration"]}
+    print(f"✅ Лучший trial {best['trial']}: AUC {best['score']:.4f}, {best['best_iteration']} деревьев "
+          f"({time.perf_counter() - started:.0f} с)")
+    return {"search_id": search_id, "trial": best["trial"], "score": best["score"], "params": params}
+
+
+def save_best_params(best, path=BEST_PARAMS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(best, f, indent=2)
+
+
+def load_best_params(path=BEST_PARAMS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["params"]
+
+
+if __name__ == "__main__":
+    from src.data_preparation import (DATASET_PATH, HIGH_CORR_FEATURES, fill_missing_with_median,
+                                      load_and_clean_data, prepare_features, save_lgb_dataset, split_data)
+
+    parser = argparse.ArgumentParser(description="Подбор гиперпараметров LightGBM (successive halving)")
+    parser.add_argument("--data", default="data/dataset.parquet")
+    parser.add_argument("--trials", type=int, default=N_TRIALS)
+    parser.add_argument("--min-rounds", type=int, default=MIN_ROUNDS)
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    parser.add_argument("--eta", type=int, default=ETA)
+    parser.add_argument("--threads-per-trial", type=int, default=THREADS_PER_TRIAL)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--time-budget", type=float, default=None, help="секунд на весь поиск")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    df = load_and_clean_data(args.data, exclude=HIGH_CORR_FEATURES)
+    train, val, test = split_data(df, random_state=42)
+    cols = prepare_features(df)
+    X_train, X_val, _ = fill_missing_with_median(train[cols], val[cols], test[cols])
+    save_lgb_dataset(X_train, train["target"], DATASET_PATH)
+    del df, train, test, X_train
+
+    best = successive_halving(DATASET_PATH, X_val, val["target"], n_trials=args.trials,
+                              min_rounds=args.min_rounds, max_rounds=args.max_rounds, eta=args.eta,
+                              threads_per_trial=args.threads_per_trial, workers=args.workers,
+                              time_budget=args.time_budget, seed=args.seed)
+    save_best_params(best)
+    print(f"Параметры сохранены в {BEST_PARAMS_PATH}: {best['params']}")
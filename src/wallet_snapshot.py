@@ -0,0 +1,190 @@
+"""
+Снапшот фичей и скоров по кошелькам для /score/<wallet>.
+
+models/wallet_snapshot/
+    s20261018T120000/  features.npy (n, n_features) float64, scores.npy, wallets.npy (байтовые строки),
+                       hashes.npy (uint64), index.npy (хэш-таблица), meta.json
+    CURRENT — имя текущего снапшота
+
+Все массивы открываются через np.load(mmap_mode="r"): страницы подгружаются с
+диска по первому обращению и лежат в page cache один раз на всех воркеров.
+Индекс — открытая адресация с линейным пробированием: слот = blake2b(адрес)
+& (размер - 1), в слоте — номер строки или -1; поиск кошелька читает пару
+слотов и одну строку фичей.
+
+Снапшот пишется в train_pipeline.py (стадия snapshot) или пакетно:
+    python -m src.wallet_snapshot --data data/dataset.parquet
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+SNAPSHOT_DIR = "models/wallet_snapshot"
+CURRENT_FILE = "CURRENT"
+KEEP_SNAPSHOTS = 2
+LOAD_FACTOR = 0.5   # доля занятых слотов индекса
+
+
+def wallet_hash(wallet):
+    """Стабильный между процессами 64-битный хэш адреса (встроенный hash() солится)."""
+    return int.from_bytes(hashlib.blake2b(str(wallet).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def build_index(hashes, load_factor=LOAD_FACTOR):
+    """Хэш-таблица размера 2^k ≥ n / load_factor: слот → номер строки (-1 — пусто)."""
+    size = 1 << max(3, int(np.ceil(np.log2(max(len(hashes), 1) / load_factor))))
+    mask = size - 1
+    table = np.full(size, -1, dtype=np.int64)
+    for row, h in enumerate(hashes.tolist()):
+        slot = h & mask
+        while table[slot] != -1:
+            slot = (slot + 1) & mask
+        table[slot] = row
+    return table
+
+
+def write_snapshot(wallets, X, scores, feature_names, model_version, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Пишет снапшот в новую папку и атомарно переключает CURRENT. Дубликаты адресов —
+    остаётся последняя строка. Возвращает имя снапшота.
+    """
+    wallets = np.asarray([str(w) for w in wallets], dtype=object)
+    _, last = np.unique(wallets[::-1], return_index=True)
+    keep = np.sort(len(wallets) - 1 - last)
+    if len(keep) < len(wallets):
+        print(f"⚠️ {len(wallets) - len(keep)} повторных адресов — в снапшот идёт последняя строка")
+    wallets = wallets[keep]
+    X = np.ascontiguousarray(np.asarray(X, dtype=np.float64)[keep])
+    scores = np.asarray(scores, dtype=np.float64)[keep]
+
+    hashes = np.fromiter((wallet_hash(w) for w in wallets), dtype=np.uint64, count=len(wallets))
+    name = datetime.utcnow().strftime("s%Y%m%dT%H%M%S%f")
+    tmp_dir = os.path.join(snapshot_dir, f".tmp-{name}")
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "features.npy"), X)
+    np.save(os.path.join(tmp_dir, "scores.npy"), scores)
+    np.save(os.path.join(tmp_dir, "wallets.npy"), np.asarray([w.encode("utf-8") for w in wallets], dtype=bytes))
+    np.save(os.path.join(tmp_dir, "hashes.npy"), hashes)
+    np.save(os.path.join(tmp_dir, "index.npy"), build_index(hashes))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": datetime.utcnow().isoformat(),
+            "model_version": model_version,
+            "feature_names": list(feature_names),
+            "n_wallets": int(len(wallets)),
+        }, f, indent=2)
+    os.rename(tmp_dir, os.path.join(snapshot_dir, name))
+
+    pointer = os.path.join(snapshot_dir, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    # Старые снапшоты удаляем: открытые через mmap файлы остаются доступны до закрытия
+    names = sorted(n for n in os.listdir(snapshot_dir) if n.startswith("s"))
+    for old in names[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(os.path.join(snapshot_dir, old), ignore_errors=True)
+    print(f"📇 Снапшот кошельков {name}: {len(wallets)} адресов, модель {model_version}")
+    return name
+
+
+def current_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class WalletSnapshot:
+    """Открытый снапшот: поиск строк по адресам, скоры и фичи — через mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.model_version = self.meta["model_version"]
+        self.feature_names = self.meta["feature_names"]
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self.features = load("features.npy")
+        self.scores = load("scores.npy")
+        self.wallets = load("wallets.npy")
+        self.hashes = load("hashes.npy")
+        self.index = load("index.npy")
+        self._mask = len(self.index) - 1
+
+    @classmethod
+    def open_current(cls, snapshot_dir=SNAPSHOT_DIR):
+        name = current_snapshot(snapshot_dir)
+        return cls(os.path.join(snapshot_dir, name)) if name else None
+
+    def __len__(self):
+        return len(self.scores)
+
+    def find(self, wallet):
+        """Номер строки кошелька или -1."""
+        h = wallet_hash(wallet)
+        key = str(wallet).encode("utf-8")
+        index, hashes, mask = self.index, self.hashes, self._mask
+        slot = h & mask
+        while True:
+            row = int(index[slot])
+            if row == -1:
+                return -1
+            if int(hashes[row]) == h and self.wallets[row] == key:
+                return row
+            slot = (slot + 1) & mask
+
+    def lookup(self, wallets):
+        """Адреса → массив номеров строк (-1 — нет в снапшоте)."""
+        return np.fromiter((self.find(w) for w in wallets), dtype=np.int64, count=len(wallets))
+
+    def matrix(self, rows, feature_names=None):
+        """Фичи строк (копия) в порядке feature_names; фичей, которых нет в снапшоте, — NaN."""
+        X = np.asarray(self.features[rows], dtype=np.float64)
+        if feature_names is None or list(feature_names) == self.feature_names:
+            return X
+        index = {name: j for j, name in enumerate(self.feature_names)}
+        out = np.full((len(X), len(feature_names)), np.nan)
+        for j, name in enumerate(feature_names):
+            if name in index:
+                out[:, j] = X[:, index[name]]
+        return out
+
+
+def snapshot_from_parquet(path, bundle, chunk_rows=100_000):
+    """Пакетная сборка: фичи из parquet, пропуски — медианами версии, скоры — её моделью."""
+    from src.data_preparation import HIGH_CORR_FEATURES, impute_with_medians, load_and_clean_data, load_medians
+
+    feature_names = bundle.feature_names
+    df = load_and_clean_data(path, columns=feature_names + ["wallet_address"], exclude=HIGH_CORR_FEATURES)
+    if "wallet_address" not in df.columns:
+        raise ValueError(f"В {path} нет колонки wallet_address")
+    X = df.reindex(columns=feature_names)
+    medians_path = bundle.artifact("reference/feature_medians.json")
+    if medians_path:
+        impute_with_medians(X, load_medians(medians_path))
+    X = X.to_numpy(dtype=np.float64)
+    booster = bundle.model.booster_
+    scores = np.concatenate([booster.predict(X[i:i + chunk_rows]) for i in range(0, len(X), chunk_rows)]) \
+        if len(X) else np.empty(0)
+    return write_snapshot(df["wallet_address"].to_numpy(), X, scores, feature_names, bundle.version)
+
+
+if __name__ == "__main__":
+    from src.model_registry import load_version
+
+    parser = argparse.ArgumentParser(description="Снапшот фичей и скоров по кошелькам для /score")
+    parser.add_argument("--data", default="data/dataset.parquet")
+    parser.add_argument("--version", default=None, help="версия модели (по умолчанию текущая)")
+    args = parser.parse_args()
+    snapshot_from_parquet(args.data, load_version(args.version))
@@ -0,0 +1,160 @@
+"""
+Форматы тел /predict помимо списка JSON-объектов.
+
+Запрос:
+    application/json                     — объект / список объектов (как раньше)
+                                           или колонки {"фича": [значения, ...]}
+    application/vnd.apache.arrow.stream  — Arrow IPC (stream или file)
+    application/x-ndjson                 — по объекту на строку, читается потоком
+
+Колоночные форматы пишутся сразу в матрицу фичей по колонкам, без dict на строку.
+Ответ выбирается по Accept: JSON (строки или колонки), Arrow IPC или NDJSON,
+который отдаётся потоком кусками.
+"""
+import json
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+JSON_MIME = "application/json"
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+ARROW_FILE_MIME = "application/vnd.apache.arrow.file"
+NDJSON_MIME = "application/x-ndjson"
+ARROW_MIMES = (ARROW_MIME, ARROW_FILE_MIME)
+
+# Необязательная колонка с адресом кошелька: не фича, но пишется в лог предиктов
+WALLET_COLUMN = "wallet_address"
+
+NDJSON_CHUNK_ROWS = 4096
+RESPONSE_CHUNK_ROWS = 1000
+READ_CHUNK_BYTES = 1 << 16
+
+
+def is_columnar(data):
+    """Колоночный JSON: объект, в котором все значения — списки."""
+    return isinstance(data, dict) and bool(data) and all(isinstance(v, list) for v in data.values())
+
+
+def _check_missing(names, feature_names):
+    missing = [name for name in feature_names if name not in names]
+    if missing:
+        # Как в pandas-пути: отсутствующая фича — ошибка запроса
+        raise KeyError(f"Нет фичей: {missing[:10]}")
+
+
+def matrix_from_columns(columns, feature_names):
+    """{"фича": [значения]} → float64-матрица (n, n_features); None → NaN."""
+    _check_missing(columns, feature_names)
+    n_rows = len(columns[feature_names[0]]) if feature_names else 0
+    X = np.empty((n_rows, len(feature_names)), dtype=np.float64)
+    for j, name in enumerate(feature_names):
+        values = columns[name]
+        if len(values) != n_rows:
+            raise ValueError(f"Колонка '{name}': {len(values)} значений вместо {n_rows}")
+        X[:, j] = np.asarray(values, dtype=np.float64)
+    return X
+
+
+def matrix_from_arrow(body, feature_names):
+    """
+    Arrow IPC (stream или file) → (float64-матрица, кошельки или None); null → NaN.
+    Прочие лишние колонки игнорируются.
+    """
+    buffer = pa.py_buffer(body)
+    try:
+        table = pa.ipc.open_stream(buffer).read_all()
+    except pa.ArrowInvalid:
+        table = pa.ipc.open_file(buffer).read_all()
+    _check_missing(table.column_names, feature_names)
+    X = np.empty((table.num_rows, len(feature_names)), dtype=np.float64)
+    for j, name in enumerate(feature_names):
+        column = pc.cast(table.column(name), pa.float64())
+        X[:, j] = column.to_numpy(zero_copy_only=False)
+    wallets = table.column(WALLET_COLUMN).to_pylist() if WALLET_COLUMN in table.column_names else None
+    return X, wallets
+
+
+def wallets_of(records):
+    """Адреса кошельков из записей (None, где адреса нет)."""
+    return [rec.get(WALLET_COLUMN) if isinstance(rec, dict) else None for rec in records]
+
+
+def _iter_lines(stream, chunk_size=READ_CHUNK_BYTES):
+    """Строки потока, читаемого крупными кусками (readline у WSGI-потока читает по байту)."""
+    tail = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def matrix_from_ndjson(stream, pack, chunk_rows=NDJSON_CHUNK_ROWS):
+    """
+    Читает NDJSON построчно и пакует по chunk_rows записей функцией pack
+    (InferenceEngine.pack) — в памяти одновременно не больше chunk_rows dict.
+    Возвращает (матрица, кошельки или None).
+    """
+    parts, records, wallets = [], [], []
+    for line in _iter_lines(stream):
+        line = line.strip()
+        if not line:
+            continue
+        records.append(json.loads(line))
+        if len(records) >= chunk_rows:
+            parts.append(pack(records).copy())
+            wallets.extend(wallets_of(records))
+            records = []
+    if records:
+        parts.append(pack(records).copy())
+        wallets.extend(wallets_of(records))
+    if not parts:
+        raise ValueError("Пустое тело NDJSON")
+    X = parts[0] if len(parts) == 1 else np.concatenate(parts)
+    return X, wallets if any(w is not None for w in wallets) else None
+
+
+
+def arrow_bytes(pred, proba, prediction_ids=None):
+    columns = {
+        "prediction": pa.array(np.asarray(pred, dtype=np.int8)),
+        "risk_probability": pa.array(np.asarray(proba, dtype=np.float64)),
+    }
+    if prediction_ids is not None:
+        columns["prediction_id"] = pa.array(prediction_ids, type=pa.string())
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def columnar_json(pred, proba, prediction_ids=None):
+    result = {"prediction": np.asarray(pred).tolist(), "risk_probability": np.asarray(proba).tolist()}
+    if prediction_ids is not None:
+        result["prediction_id"] = list(prediction_ids)
+    return result
+
+
+def ndjson_chunks(pred, proba, prediction_ids=None, chunk_rows=RESPONSE_CHUNK_ROWS):
+    """Генератор кусков NDJSON-ответа: по chunk_rows строк за раз."""
+    pred = np.asarray(pred).tolist()
+    proba = np.asarray(proba).tolist()
+    for start in range(0, len(pred), chunk_rows):
+        end = start + chunk_rows
+        if prediction_ids is None:
+            yield "".join(
+                f'{{"prediction": {p}, "risk_probability": {pr!r}}}\n'
+                for p, pr in zip(pred[start:end], proba[start:end])
+            )
+        else:
+            # id генерирует сам API (hex и дефис) — экранирование не нужно
+            yield "".join(
+                f'{{"prediction_id": "{i}", "prediction": {p}, "risk_probability": {pr!r}}}\n'
+                for i, p, pr in zip(prediction_ids[start:end], pred[start:end], proba[start:end])
+            )
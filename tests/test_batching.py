@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.batching import MicroBatcher
+
+
+def _scale(factor, calls):
+    def score(X):
+        calls.append(len(X))
+        return X[:, 0] * factor
+    return score
+
+
+def test_results_are_routed_to_their_callers():
+    calls = []
+    batcher = MicroBatcher(_scale(1.0, calls), max_batch_rows=64, max_wait_ms=20)
+    start = threading.Barrier(32)
+
+    def request(i):
+        X = np.full((1 + i % 3, 2), float(i))
+        start.wait()
+        return i, batcher.score(X, timeout=5)
+
+    with ThreadPoolExecutor(32) as pool:
+        results = list(pool.map(request, range(32)))
+    for i, proba in results:
+        np.testing.assert_array_equal(proba, np.full(1 + i % 3, float(i)))
+    # Одновременные запросы действительно склеились в общие батчи
+    assert len(calls) < 32
+    assert batcher.stats()["rows"] == sum(1 + i % 3 for i in range(32))
+
+
+def test_requests_are_grouped_by_score_fn():
+    default_calls, other_calls = [], []
+    batcher = MicroBatcher(_scale(1.0, default_calls), max_batch_rows=64, max_wait_ms=20)
+    other = _scale(-1.0, other_calls)
+    start = threading.Barrier(16)
+
+    def request(i):
+        start.wait()
+        fn = other if i % 2 else None
+        return i, batcher.score(np.full((1, 1), float(i + 1)), score_fn=fn, timeout=5)
+
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(request, range(16)))
+    for i, proba in results:
+        assert proba[0] == (-(i + 1) if i % 2 else i + 1)
+    # Каждый score_fn видит только строки своих запросов
+    assert sum(default_calls) == 8 and sum(other_calls) == 8
+
+
+def test_score_fn_error_reaches_only_its_group():
+    def broken(X):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(_scale(2.0, []), max_batch_rows=64, max_wait_ms=20)
+    with ThreadPoolExecutor(2) as pool:
+        bad = pool.submit(batcher.score, np.ones((1, 1)), broken, 5)
+        good = pool.submit(batcher.score, np.ones((1, 1)), None, 5)
+        with pytest.raises(RuntimeError):
+            bad.result()
+        assert good.result()[0] == 2.0
+    assert batcher.stats()["errors"] == 1
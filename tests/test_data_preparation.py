@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from src.data_preparation import fill_missing_with_median, load_and_clean_data, prepare_features, split_data
+
+
+def test_stored_index_is_not_a_feature(tmp_path):
+    path = tmp_path / "data.parquet"
+    pd.DataFrame({"a": [1.0, np.inf, 3.0], "target": [0, 1, 0]}, index=[5, 7, 9]).to_parquet(path)
+    df = load_and_clean_data(str(path))
+    assert list(df.columns) == ["a", "target"]
+    assert prepare_features(df) == ["a"]
+    assert np.isnan(df["a"][1])
+
+
+def test_named_index_and_exclude(tmp_path):
+    path = tmp_path / "data.parquet"
+    frame = pd.DataFrame({"a": [1.0, 2.0], "b": [3.0, 4.0], "wallet_address": ["x", "y"]})
+    frame.set_index("wallet_address").to_parquet(path)
+    assert list(load_and_clean_data(str(path), exclude=["b"]).columns) == ["a"]
+    # Явно перечисленные колонки читаются как есть
+    frame.to_parquet(path, index=False)
+    assert list(load_and_clean_data(str(path), columns=["wallet_address", "a"]).columns) == ["wallet_address", "a"]
+
+
+def test_float32_and_split_match_baseline(tmp_path):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({"a": rng.normal(size=40), "target": rng.integers(0, 2, 40)})
+    path = tmp_path / "data.parquet"
+    frame.to_parquet(path, index=False)
+    assert load_and_clean_data(str(path), float32=True)["a"].dtype == np.float32
+
+    # Разбиение совпадает с исходным df.sample(frac=1) + train_test_split
+    from sklearn.model_selection import train_test_split
+    shuffled = frame.sample(frac=1, random_state=42).reset_index(drop=True)
+    train, temp = train_test_split(shuffled, test_size=0.5, random_state=42)
+    val, test = train_test_split(temp, test_size=0.5, random_state=42)
+    for ours, baseline in zip(split_data(frame, random_state=42), (train, val, test)):
+        np.testing.assert_array_equal(ours["a"].to_numpy(), baseline["a"].to_numpy())
+
+
+def test_fill_missing_only_train_nan_columns(tmp_path):
+    X_train = pd.DataFrame({"x": [1.0, np.nan, 3.0], "y": [1.0, 2.0, 3.0]})
+    X_val = pd.DataFrame({"x": [np.nan], "y": [np.nan]})
+    X_test = X_val.copy()
+    path = tmp_path / "medians.json"
+    _, X_val, _ = fill_missing_with_median(X_train, X_val, X_test, medians_path=str(path))
+    assert X_train["x"][1] == 2.0 and X_val["x"][0] == 2.0
+    assert np.isnan(X_val["y"][0])
+    assert path.exists()
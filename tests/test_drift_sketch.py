@@ -0,0 +1,85 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from monitoring.drift_sketch import (DriftSketch, DriftSketchRecorder, align_to_reference, build_sketch_reference,
+                                     compact_sketches, load_sketches, sketch_drift)
+
+
+def _reference(tmp_path, scale=1.0, seed=0, name="reference.npz"):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(2000, 3)) * scale, columns=["a", "b", "c"])
+    return build_sketch_reference(X, rng.random(2000), path=str(tmp_path / name))
+
+
+def _batch(n=500, seed=1, shift=0.0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 3)) + shift
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X, rng.random(n)
+
+
+def test_merge_equals_single_update(tmp_path):
+    reference = _reference(tmp_path)
+    X, scores = _batch()
+    values = np.column_stack([X, scores])
+    whole, first, second = reference.empty_like(), reference.empty_like(), reference.empty_like()
+    whole.update(values)
+    first.update(values[:123])
+    second.update(values[123:])
+    merged = first.merge(second)
+    np.testing.assert_array_equal(merged.counts, whole.counts)
+    np.testing.assert_array_equal(merged.nan_counts, whole.nan_counts)
+    assert merged.n_rows == whole.n_rows == 500
+
+    with pytest.raises(ValueError):
+        whole.merge(_reference(tmp_path, scale=3.0, name="other.npz").empty_like())
+
+
+def test_recorder_snapshots_align_to_reference(tmp_path):
+    reference = _reference(tmp_path)
+    X, scores = _batch()
+    # API отдаёт фичи в своём порядке и с колонкой, которой нет в референсе
+    recorder = DriftSketchRecorder(reference, ["c", "a", "extra", "b"], sketch_dir=str(tmp_path / "sk"))
+    recorder.update(np.column_stack([X[:, 2], X[:, 0], np.ones(len(X)), X[:, 1]]), scores)
+    path = recorder.flush()
+    assert recorder.flush() is None   # дельта обнулена
+
+    aligned = align_to_reference(DriftSketch.load(path), reference)
+    expected = reference.empty_like()
+    expected.update(np.column_stack([X, scores]))
+    np.testing.assert_array_equal(aligned.counts, expected.counts)
+    assert aligned.columns == reference.columns
+
+
+def test_incompatible_snapshots_are_skipped_and_kept(tmp_path):
+    reference, old = _reference(tmp_path), _reference(tmp_path, scale=3.0, name="old.npz")
+    sketch_dir = str(tmp_path / "sk")
+    day = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
+    X, scores = _batch()
+    for name, ref in (("1_1", reference), ("2_2", reference), ("3_3", old)):
+        sketch = ref.empty_like()
+        sketch.update(np.column_stack([X, scores]))
+        sketch.save(os.path.join(sketch_dir, f"sketch_{day}_{name}.npz"))
+
+    assert load_sketches(day, sketch_dir=sketch_dir, reference=reference).n_rows == 1000
+    compact_sketches(sketch_dir, reference=reference)
+    assert sorted(os.listdir(sketch_dir)) == [f"sketch_{day}_3_3.npz", f"sketch_{day}_daily.npz"]
+    assert load_sketches(day, sketch_dir=sketch_dir, reference=reference).n_rows == 1000
+    with pytest.raises(ValueError):
+        sketch_drift(reference, DriftSketch.load(os.path.join(sketch_dir, f"sketch_{day}_3_3.npz")))
+
+
+def test_sketch_drift_sees_shift(tmp_path):
+    reference = _reference(tmp_path)
+    same, shifted = reference.empty_like(), reference.empty_like()
+    X, scores = _batch(2000)
+    same.update(np.column_stack([X, scores]))
+    X, scores = _batch(2000, shift=1.0)
+    shifted.update(np.column_stack([X, scores]))
+    assert sketch_drift(reference, same)["a"]["psi"] < 0.05
+    assert sketch_drift(reference, shifted)["a"]["psi"] > 0.25
+    assert sketch_drift(reference, shifted)["score"]["psi"] < 0.05
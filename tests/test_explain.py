@@ -0,0 +1,34 @@
+import lightgbm as lgb
+import numpy as np
+
+from src.explain import ContributionCache, Explainer
+
+
+def _booster():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 4))
+    y = (X[:, 0] - X[:, 1] > 0).astype(int)
+    model = lgb.LGBMClassifier(n_estimators=20, num_leaves=7, verbose=-1).fit(X, y)
+    return model.booster_, X
+
+
+def test_cached_contributions_match_direct():
+    booster, X = _booster()
+    cache = ContributionCache(max_entries=100)
+    explainer = Explainer(booster, ["a", "b", "c", "d"], version="v1", cache=cache)
+    direct = booster.predict(X[:50], pred_contrib=True)
+
+    np.testing.assert_array_equal(explainer.contributions(X[:30]), direct[:30])
+    # Половина батча из кэша, половина — заново
+    np.testing.assert_array_equal(explainer.contributions(X[10:50]), direct[10:50])
+    assert cache.stats()["hits"] == 20 and cache.stats()["misses"] == 50
+
+
+def test_lookup_miss_shape():
+    cache = ContributionCache()
+    values, hit, keys = cache.lookup(np.zeros((3, 4)), "v1")
+    assert values.shape == (3, 5) and np.isnan(values).all() and not hit.any()
+    cache.store(keys[:1], [np.arange(5.0)])
+    values, hit, _ = cache.lookup(np.zeros((3, 4)), "v1")
+    assert hit.all()   # одинаковые строки — один ключ
+    np.testing.assert_array_equal(values[2], np.arange(5.0))
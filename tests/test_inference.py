@@ -0,0 +1,58 @@
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.inference import InferenceEngine
+
+ATOL = 1e-9
+
+
+@pytest.fixture(scope="module")
+def model():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(1500, 5)), columns=[f"feat_{i}" for i in range(5)])
+    X[rng.random(X.shape) < 0.1] = np.nan
+    y = (X["feat_0"].fillna(0) - X["feat_3"].fillna(0) > 0).astype(int)
+    return lgb.LGBMClassifier(n_estimators=30, num_leaves=15, verbose=-1).fit(X, y)
+
+
+def _records(model, n=300, seed=1):
+    rng = np.random.default_rng(seed)
+    records = []
+    for row in rng.normal(size=(n, len(model.feature_name_))):
+        rec = dict(zip(reversed(model.feature_name_), row[::-1].tolist()))   # порядок ключей не важен
+        if rng.random() < 0.2:
+            rec[model.feature_name_[1]] = None
+        if rng.random() < 0.1:
+            rec[model.feature_name_[2]] = 0.0
+        records.append(rec)
+    return records
+
+
+def test_modes_score_records_identically(model, tmp_path):
+    records = _records(model)
+    expected = model.predict_proba(pd.DataFrame(records)[model.feature_name_].astype("float64"))[:, 1]
+    for mode in ("numpy", "pandas", "compiled"):
+        engine = InferenceEngine(model, mode=mode, num_threads=1, forest_path=str(tmp_path / "missing.npz"))
+        X, proba = engine.predict_records(records)
+        np.testing.assert_allclose(proba, expected, rtol=0, atol=ATOL, err_msg=mode)
+        assert X.shape == (len(records), len(model.feature_name_))
+        assert np.isnan(X[:, 1]).sum() == sum(r[model.feature_name_[1]] is None for r in records)
+
+
+def test_single_record_and_buffer_reuse(model):
+    engine = InferenceEngine(model, num_threads=1, buffer_rows=4)
+    records = _records(model, n=10)
+    _, batch = engine.predict_records(records)
+    # Буфер потока переиспользуется: одиночные вызовы после батча не видят его строк
+    singles = [engine.predict_records([rec])[1][0] for rec in records]
+    np.testing.assert_allclose(singles, batch, rtol=0, atol=ATOL)
+
+
+def test_missing_feature_raises_keyerror(model):
+    engine = InferenceEngine(model, num_threads=1)
+    record = _records(model, n=1)[0]
+    del record[model.feature_name_[0]]
+    with pytest.raises(KeyError):
+        engine.predict_records([record])
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import monitoring.label_store as label_store
+from monitoring.label_store import EPOCH, INGEST_OVERLAP_SECONDS, LabelStore
+
+
+def _predictions(ids, wallets, day="2026-01-02", hour=0, version="v0001", scores=None):
+    n = len(ids)
+    return pd.DataFrame({
+        "prediction_id": ids,
+        "wallet_address": wallets,
+        "timestamp": pd.to_datetime([f"{day} {hour:02d}:00:00"] * n),
+        "model_version": [version] * n,
+        "score": scores if scores is not None else np.linspace(0.1, 0.9, n),
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LabelStore(str(tmp_path / "labels.sqlite"))
+    yield store
+    store.close()
+
+
+def _labels(store):
+    return dict(store.conn.execute("SELECT prediction_id, label FROM predictions").fetchall())
+
+
+def test_ingest_overlap_skips_duplicates(store, monkeypatch):
+    frames = [_predictions(["p1", "p2"], ["w1", "w2"]), _predictions(["p2", "p3"], ["w2", "w3"], hour=1)]
+    starts = []
+
+    def read_predictions(start=None, columns=None):
+        starts.append(start)
+        return frames.pop(0)
+
+    monkeypatch.setattr(label_store, "read_predictions", read_predictions)
+    assert store.ingest_predictions() == 2
+    # Второй раз — от последней метки минус перекрытие; повтор p2 не дублируется
+    assert store.ingest_predictions() == 1
+    assert starts[1] == pd.Timestamp("2026-01-02 00:00:00") - pd.Timedelta(seconds=INGEST_OVERLAP_SECONDS)
+    assert store.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] == 3
+
+
+def test_id_label_wins_over_wallet_label(store):
+    store.add_predictions(_predictions(["p1", "p2"], ["w1", "w1"]))
+    assert store.ingest_labels(pd.DataFrame({"prediction_id": ["p1"], "label": [1]})) == {"by_id": 1, "by_wallet": 0}
+    result = store.ingest_labels(pd.DataFrame({"wallet_address": ["w1"], "label": [0]}))
+    assert result == {"by_id": 0, "by_wallet": 1}
+    assert _labels(store) == {"p1": 1, "p2": 0}
+
+    # Будущие предикты кошелька получают его лейбл сразу
+    store.add_predictions(_predictions(["p3"], ["w1"], hour=2))
+    assert _labels(store)["p3"] == 0
+
+
+def test_refresh_quality_is_incremental_and_uses_version_thresholds(store):
+    store.add_predictions(_predictions(["a1", "a2"], ["w1", "w2"], hour=0, scores=[0.4, 0.8]))
+    store.add_predictions(_predictions(["b1", "b2"], ["w3", "w4"], hour=1, version="v0002", scores=[0.4, 0.8]))
+    store.ingest_labels(pd.DataFrame({"prediction_id": ["a1", "a2", "b1", "b2"], "label": [1, 1, 1, 1]}))
+    thresholds = {"v0001": 0.3, "v0002": 0.5}
+    assert store.refresh_quality(0.9, granularities=("hour",), version_threshold=thresholds.get) == 2
+    windows = store.quality_windows("hour")
+    assert windows["f1"].tolist() == pytest.approx([1.0, 2 / 3])
+    assert windows["threshold"].tolist() == [0.3, 0.5]
+
+    # Без новых лейблов ничего не пересчитывается; новый лейбл трогает только своё окно и день
+    assert store.refresh_quality(0.9, granularities=("hour", "day")) == 0
+    store.add_predictions(_predictions(["c1"], ["w5"], hour=5, scores=[0.6]))
+    store.ingest_labels(pd.DataFrame({"prediction_id": ["c1"], "label": [0]}))
+    assert store.refresh_quality(0.9, granularities=("hour", "day"), version_threshold=thresholds.get) == 2
+    day = store.quality_windows("day")
+    assert len(day) == 1 and day["n"][0] == 5 and pd.isna(day["threshold"][0])   # в дне два порога
+    assert (EPOCH + pd.Timedelta(seconds=day["window_start"][0])).strftime("%Y-%m-%d") == "2026-01-02"
@@ -0,0 +1,105 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from monitoring.drift_sketch import DriftSketch, build_sketch_reference
+from monitoring.log_reader import LogReader
+from monitoring.scheduler import MonitoringScheduler, StreamSketchConsumer
+
+DAY = "2026-01-02"
+
+
+def _line(i, day=DAY):
+    return json.dumps({"timestamp": f"{day}T00:00:{i % 60:02d}", "model_version": "v1", "score": i / 100,
+                       "features": {"a": float(i)}, "prediction_id": f"p{i}"}) + "\n"
+
+
+def _append(log_dir, text, day=DAY, mode="a"):
+    with open(os.path.join(log_dir, f"predictions_{day}.jsonl"), mode, encoding="utf-8") as f:
+        f.write(text)
+
+
+class Recorder:
+    def __init__(self, name, fail=0):
+        self.name = name
+        self.fail = fail
+        self.seen = []
+
+    def consume(self, batch):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("boom")
+        self.seen.extend(batch["prediction_id"])
+
+
+def test_partial_line_tail_waits_for_newline(tmp_path):
+    _append(tmp_path, _line(1) + _line(2)[:10])
+    reader = LogReader(str(tmp_path))
+    batch = reader.read_new()
+    assert list(batch["prediction_id"]) == ["p1"]
+    assert list(batch["log_offset"]) == [len(_line(1))]
+    reader.commit()
+    _append(tmp_path, _line(2)[10:])
+    batch = reader.read_new()
+    assert list(batch["prediction_id"]) == ["p2"]
+    assert batch.attrs["offsets"][f"predictions_{DAY}.jsonl"] == len(_line(1)) + len(_line(2))
+
+
+def test_truncated_or_rewritten_file_is_reread(tmp_path):
+    _append(tmp_path, _line(1) + _line(2))
+    reader = LogReader(str(tmp_path))
+    reader.read_new()
+    reader.commit()
+    # Обрезан: файл короче смещения
+    _append(tmp_path, _line(3), mode="w")
+    assert list(reader.read_new()["prediction_id"]) == ["p3"]
+    reader.commit()
+    # Переписан и дописан дальше прежнего смещения: размер этого не выдаёт, выдаёт отпечаток
+    _append(tmp_path, _line(10) + _line(11) + _line(12), mode="w")
+    assert list(reader.read_new()["prediction_id"]) == ["p10", "p11", "p12"]
+
+
+def test_failed_consumer_keeps_its_offsets_and_retries(tmp_path):
+    log_dir, state_path = tmp_path / "logs", str(tmp_path / "state.json")
+    log_dir.mkdir()
+    _append(log_dir, _line(1) + _line(2))
+    ok, flaky = Recorder("ok"), Recorder("flaky", fail=1)
+    scheduler = MonitoringScheduler([ok, flaky], {}, state_path, poll_interval=0, log_dir=str(log_dir))
+    scheduler.poll()
+    assert ok.seen == ["p1", "p2"] and flaky.seen == []
+    state = json.load(open(state_path))["consumers"]
+    assert state["ok"]["offsets"] and not state["flaky"]["offsets"]
+
+    # После перезапуска упавший получает те же строки, успешный — только новые
+    _append(log_dir, _line(3))
+    scheduler = MonitoringScheduler([ok, flaky], {}, state_path, poll_interval=0, log_dir=str(log_dir))
+    scheduler.poll()
+    assert ok.seen == ["p1", "p2", "p3"]
+    assert flaky.seen == ["p1", "p2", "p3"]
+
+
+def test_failed_consumer_waits_for_backoff(tmp_path):
+    _append(tmp_path, _line(1))
+    flaky = Recorder("flaky", fail=5)
+    scheduler = MonitoringScheduler([flaky], {}, str(tmp_path / "state.json"), poll_interval=60,
+                                    log_dir=str(tmp_path))
+    scheduler.poll()
+    scheduler.poll()
+    assert flaky.fail == 4   # второй опрос внутри паузы потребителя не трогает
+
+
+def test_sketch_replay_is_idempotent(tmp_path):
+    _append(tmp_path, "".join(_line(i) for i in range(20)))
+    reference_path = str(tmp_path / "reference.npz")
+    build_sketch_reference(pd.DataFrame({"a": np.arange(100.0)}), np.linspace(0, 1, 100), path=reference_path)
+    consumer = StreamSketchConsumer(str(tmp_path / "sketches"), reference_path)
+    batch = LogReader(str(tmp_path)).read_new()
+    consumer.consume(batch)
+    # Сбой после записи скетча, но до сдвига смещений: тот же батч приходит снова
+    consumer.consume(batch)
+    _append(tmp_path, _line(20))
+    consumer.consume(LogReader(str(tmp_path), batch.attrs["offsets"], fingerprints=batch.attrs["fingerprints"]).read_new())
+    sketch = DriftSketch.load(str(tmp_path / "sketches" / f"sketch_{DAY}_stream.npz"))
+    assert sketch.n_rows == 21
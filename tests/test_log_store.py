@@ -0,0 +1,71 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from monitoring.log_store import MANIFEST_NAME, apply_retention, compact_logs, read_predictions
+
+
+def _day(days_ago):
+    return (datetime.utcnow() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+
+
+def _write_log(log_dir, date_str, hours, mode="w"):
+    with open(os.path.join(log_dir, f"predictions_{date_str}.jsonl"), mode, encoding="utf-8") as f:
+        for i, hour in enumerate(hours):
+            f.write(json.dumps({"timestamp": f"{date_str}T{hour:02d}:00:00", "model_version": "v1",
+                                "score": i / 10, "features": {"a": float(i)}, "prediction_id": f"{date_str}-{hour}-{i}"})
+                    + "\n")
+
+
+def _dirs(tmp_path):
+    log_dir, store_dir = tmp_path / "logs", tmp_path / "store"
+    log_dir.mkdir()
+    return str(log_dir), str(store_dir)
+
+
+def _manifest(store_dir):
+    with open(os.path.join(store_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_compaction_manifest_and_appended_days(tmp_path):
+    log_dir, store_dir = _dirs(tmp_path)
+    day = _day(1)
+    _write_log(log_dir, day, [1, 2, 3])
+    assert compact_logs(log_dir=log_dir, store_dir=store_dir, feature_names=["a"]) == [day]
+    info = _manifest(store_dir)[day]
+    assert info["rows"] == 3 and info["size"] == os.path.getsize(os.path.join(log_dir, f"predictions_{day}.jsonl"))
+    # Неизменённый файл повторно не компактируется
+    assert compact_logs(log_dir=log_dir, store_dir=store_dir, feature_names=["a"]) == []
+
+    # Дописанный после компактирования день читается из JSONL, пока его не перекомпактируют
+    _write_log(log_dir, day, [4], mode="a")
+    assert len(read_predictions(log_dir=log_dir, store_dir=store_dir)) == 4
+    assert compact_logs(log_dir=log_dir, store_dir=store_dir, feature_names=["a"]) == [day]
+    df = read_predictions(columns=["prediction_id", "score"], log_dir=log_dir, store_dir=store_dir)
+    assert list(df.columns) == ["prediction_id", "score"] and len(df) == 4
+
+
+def test_hour_partitions_are_pruned_by_time(tmp_path):
+    log_dir, store_dir = _dirs(tmp_path)
+    day = _day(1)
+    _write_log(log_dir, day, [0, 5, 5, 23])
+    compact_logs(partition="hour", log_dir=log_dir, store_dir=store_dir, feature_names=["a"])
+    assert sorted(os.listdir(os.path.join(store_dir, f"date={day}"))) == ["hour=00", "hour=05", "hour=23"]
+    start = pd.Timestamp(f"{day} 05:00")
+    df = read_predictions(start=start, end=start + pd.Timedelta(hours=1), log_dir=log_dir, store_dir=store_dir)
+    assert len(df) == 2 and (df["timestamp"].dt.hour == 5).all()
+
+
+def test_retention_drops_old_partitions_and_manifest_entries(tmp_path):
+    log_dir, store_dir = _dirs(tmp_path)
+    old, recent = _day(100), _day(1)
+    _write_log(log_dir, old, [1])
+    _write_log(log_dir, recent, [1])
+    compact_logs(log_dir=log_dir, store_dir=store_dir, feature_names=["a"], delete_source=True)
+    assert os.listdir(log_dir) == []
+    assert apply_retention(retention_days=90, store_dir=store_dir) == [f"date={old}"]
+    assert list(_manifest(store_dir)) == [recent]
+    assert read_predictions(log_dir=log_dir, store_dir=store_dir)["prediction_id"].tolist() == [f"{recent}-1-0"]
@@ -0,0 +1,30 @@
+import threading
+
+from src.metrics import MetricsRegistry
+
+
+def test_counters_and_histogram_sum_over_threads():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Запросы", labelnames=("route",))
+    latency = registry.histogram("latency_seconds", "Время", buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(100):
+            requests.inc(1, "/predict")
+            latency.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latency.observe(5.0)
+
+    assert requests.collect() == {("/predict",): [400]}
+    assert latency.width == 5
+    text = registry.render()
+    assert 'requests_total{route="/predict"} 400' in text
+    assert 'latency_seconds_bucket{le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{le="1.0"} 400' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 401' in text
+    assert "latency_seconds_count 401" in text
@@ -0,0 +1,46 @@
+import errno
+import os
+
+import pytest
+
+from src import model_registry
+from src.model_registry import current_version, list_versions, publish_version
+
+
+def test_publish_takes_next_number_after_race(tmp_path, monkeypatch):
+    registry = str(tmp_path)
+    rename = os.rename
+    raced = []
+
+    def racing_rename(src, dst):
+        # Другой процесс успевает занять номер между list_versions и rename
+        if not raced:
+            raced.append(dst)
+            os.makedirs(os.path.join(dst, "model"))
+            raise OSError(errno.ENOTEMPTY, "Directory not empty", dst)
+        return rename(src, dst)
+
+    monkeypatch.setattr(model_registry.os, "rename", racing_rename)
+    version = publish_version(object(), 0.5, feature_names=["a"], reference_files=[], registry_dir=registry)
+    assert version == "v0002" and current_version(registry) == "v0002"
+    assert list_versions(registry) == ["v0001", "v0002"]
+
+
+def test_publish_reraises_other_errors(tmp_path, monkeypatch):
+    def failing_rename(src, dst):
+        raise PermissionError(errno.EACCES, "Permission denied", dst)
+
+    monkeypatch.setattr(model_registry.os, "rename", failing_rename)
+    with pytest.raises(PermissionError):
+        publish_version(object(), 0.5, feature_names=["a"], reference_files=[], registry_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == []   # временная папка убрана
+
+
+def test_publish_gives_up_after_attempts(tmp_path, monkeypatch):
+    def busy_rename(src, dst):
+        raise FileExistsError(errno.EEXIST, "File exists", dst)
+
+    monkeypatch.setattr(model_registry, "PUBLISH_ATTEMPTS", 3)
+    monkeypatch.setattr(model_registry.os, "rename", busy_rename)
+    with pytest.raises(FileExistsError):
+        publish_version(object(), 0.5, feature_names=["a"], reference_files=[], registry_dir=str(tmp_path))
@@ -0,0 +1,57 @@
+import numpy as np
+
+import src.prediction_cache as prediction_cache
+from src.prediction_cache import PredictionCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def _rows(*values):
+    return np.array([[v, 1.0] for v in values])
+
+
+def test_hits_misses_and_canonical_keys():
+    cache = PredictionCache(max_entries=10)
+    proba, hit, keys = cache.lookup(_rows(1.0, 2.0), "v1")
+    assert np.isnan(proba).all() and not hit.any()
+    cache.store(keys, [0.1, 0.2])
+
+    # -0.0 и 0.0 — одна строка; другая версия модели — другой ключ
+    cache.store(cache.lookup(_rows(0.0), "v1")[2], [0.3])
+    proba, hit, _ = cache.lookup(_rows(2.0, -0.0, 3.0), "v1")
+    np.testing.assert_array_equal(hit, [True, True, False])
+    np.testing.assert_array_equal(proba[:2], [0.2, 0.3])
+    assert not cache.lookup(_rows(1.0), "v2")[1].any()
+    assert cache.stats()["hits"] == 2
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = PredictionCache(max_entries=2)
+    cache.store(cache.lookup(_rows(1.0, 2.0), "v1")[2], [0.1, 0.2])
+    cache.lookup(_rows(1.0), "v1")                        # 1.0 теперь свежее 2.0
+    cache.store(cache.lookup(_rows(3.0), "v1")[2], [0.3])
+    np.testing.assert_array_equal(cache.lookup(_rows(1.0, 2.0, 3.0), "v1")[1], [True, False, True])
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+
+def test_ttl_expiry_and_invalidate(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(prediction_cache, "time", clock)
+    cache = PredictionCache(ttl_seconds=10)
+    cache.store(cache.lookup(_rows(1.0), "v1")[2], [0.1])
+    clock.now += 9
+    assert cache.lookup(_rows(1.0), "v1")[1].all()
+    clock.now += 2
+    assert not cache.lookup(_rows(1.0), "v1")[1].any()
+    assert cache.stats()["expirations"] == 1 and cache.stats()["size"] == 0
+
+    cache.store(cache.lookup(_rows(1.0), "v1")[2], [0.1])
+    cache.invalidate()
+    assert not cache.lookup(_rows(1.0), "v1")[1].any()
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,40 @@
+import json
+import threading
+import time
+
+import numpy as np
+
+from monitoring.log_predictions import AsyncPredictionLogger
+
+
+def test_writes_jsonl_lines(tmp_path):
+    logger = AsyncPredictionLogger(str(tmp_path), flush_interval=0.01).start()
+    logger.submit(np.array([[1.0, 2.0]]), np.array([0.5]), ["a", "b"], prediction_ids=["p1"], wallets=["w1"])
+    logger.close()
+    (path,) = tmp_path.iterdir()
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    assert entry["features"] == {"a": 1.0, "b": 2.0}
+    assert entry["prediction_id"] == "p1" and entry["wallet_address"] == "w1"
+    assert logger.stats()["written"] == 1
+
+
+def test_blocked_submit_woken_by_close_is_dropped(tmp_path):
+    release = threading.Event()
+    logger = AsyncPredictionLogger(str(tmp_path), max_queue_rows=2, batch_size=2, flush_interval=0.01)
+    write = logger._write
+    logger._write = lambda items: (release.wait(5), write(items))
+    logger.start()
+    assert logger.submit(np.zeros((2, 1)), np.zeros(2), ["a"]) == 2
+
+    accepted = []
+    waiter = threading.Thread(target=lambda: accepted.append(logger.submit(np.zeros((2, 1)), np.zeros(2), ["a"])))
+    waiter.start()
+    time.sleep(0.05)            # писатель держит первый батч, второй submit ждёт места
+    closer = threading.Thread(target=logger.close)
+    closer.start()
+    waiter.join(5)
+    release.set()
+    closer.join(5)
+    assert accepted == [0]
+    stats = logger.stats()
+    assert stats["dropped"] == 2 and stats["written"] == 2 and stats["queue_depth"] == 0
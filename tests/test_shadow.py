@@ -0,0 +1,72 @@
+import lightgbm as lgb
+import numpy as np
+import pytest
+
+from src.model_registry import ModelBundle
+from src.shadow import Challenger, ShadowScorer, load_shadow_log
+
+FEATURES = ["a", "b", "c"]
+
+
+@pytest.fixture(scope="module")
+def models():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 3))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    primary = lgb.LGBMClassifier(n_estimators=10, num_leaves=7, verbose=-1).fit(X, y)
+    challenger = lgb.LGBMClassifier(n_estimators=30, num_leaves=15, verbose=-1).fit(X, y)
+    return primary, challenger, rng.normal(size=(50, 3))
+
+
+def test_challenger_scores_are_logged(models, tmp_path):
+    primary, model, X = models
+    # Challenger обучен на тех же фичах, но ждёт их в другом порядке
+    reordered = ["c", "a", "b"]
+    challenger_model = lgb.LGBMClassifier(n_estimators=30, num_leaves=15, verbose=-1)
+    challenger_model.fit(X[:, [2, 0, 1]], (X[:, 0] > 0).astype(int))
+    challengers = [Challenger(ModelBundle("v2", model, 0.5, FEATURES)),
+                   Challenger(ModelBundle("v3", challenger_model, 0.4, reordered))]
+    scorer = ShadowScorer(challengers, sample_rate=1.0, log_dir=str(tmp_path))
+    proba = primary.predict_proba(X)[:, 1]
+    ids = [f"p{i}" for i in range(len(X))]
+    assert scorer.submit(X, proba, 0.5, "v1", ids, FEATURES)
+    scorer.close()
+
+    log = load_shadow_log(days=1, log_dir=str(tmp_path))
+    assert len(log) == 2 * len(X)
+    v2 = log[log["challenger_version"] == "v2"]
+    np.testing.assert_allclose(v2["challenger_score"], model.predict_proba(X)[:, 1])
+    np.testing.assert_allclose(v2["delta"], v2["challenger_score"] - proba)
+    assert v2["prediction_id"].tolist() == ids
+    v3 = log[log["challenger_version"] == "v3"]
+    np.testing.assert_allclose(v3["challenger_score"], challenger_model.predict_proba(X[:, [2, 0, 1]])[:, 1])
+
+    stats = scorer.stats()
+    assert stats["submitted"] == 1 and stats["pending"] == 0 and stats["errors"] == 0
+    expected = ((model.predict_proba(X)[:, 1] >= 0.5) != (proba >= 0.5)).mean()
+    assert stats["challengers"]["v2"]["disagreement_rate"] == pytest.approx(expected)
+
+
+def test_sampling_busy_queue_and_errors(models, tmp_path):
+    primary, model, X = models
+    proba = primary.predict_proba(X)[:, 1]
+    ids = [str(i) for i in range(len(X))]
+
+    scorer = ShadowScorer([Challenger(ModelBundle("v2", model, 0.5, FEATURES))], sample_rate=0.0,
+                          log_dir=str(tmp_path))
+    assert not scorer.submit(X, proba, 0.5, "v1", ids, FEATURES)
+    assert scorer.stats()["sampled_out"] == 1
+
+    # Очередь занята — батч пропускается, а не ждёт
+    scorer.sample_rate, scorer.max_pending = 1.0, 0
+    assert not scorer.submit(X, proba, 0.5, "v1", ids, FEATURES)
+    assert scorer.stats()["dropped_busy"] == 1
+
+    # Ошибка challenger-а считается и не оставляет батч «в работе»
+    scorer.max_pending = 1
+    scorer.challengers[0].engine.predict_matrix = lambda X: (_ for _ in ()).throw(RuntimeError("boom"))
+    assert scorer.submit(X, proba, 0.5, "v1", ids, FEATURES)
+    scorer.close()
+    stats = scorer.stats()
+    assert stats["errors"] == 1 and stats["pending"] == 0
+    assert not list(tmp_path.iterdir())
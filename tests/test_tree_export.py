@@ -0,0 +1,43 @@
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.tree_export import CompiledForest, check_parity, export_forest
+
+ATOL = 1e-9
+
+
+def _data(n=2000, n_features=6, seed=0):
+    """Синтетика с пропусками и точными нулями — оба вида missing-веток в сплитах."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features))
+    y = (X[:, 0] + 0.5 * X[:, 1] - X[:, 2] + rng.normal(scale=0.5, size=n) > 0).astype(int)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    X[rng.random(X.shape) < 0.1] = 0.0
+    return pd.DataFrame(X, columns=[f"feat_{i}" for i in range(n_features)]), y
+
+
+@pytest.mark.parametrize("params", [{}, {"zero_as_missing": True}, {"use_missing": False}])
+def test_compiled_forest_matches_predict_proba(params, tmp_path):
+    X, y = _data()
+    model = lgb.LGBMClassifier(n_estimators=40, num_leaves=15, min_child_samples=5, verbose=-1, **params)
+    model.fit(X, y)
+
+    path = str(tmp_path / "forest.npz")
+    export_forest(model, path)
+    forest = CompiledForest.load(path)
+    X_test, _ = _data(n=500, seed=1)
+    X_test.iloc[:5] = np.nan
+    X_test.iloc[5:10] = 0.0
+    expected = model.predict_proba(X_test)[:, 1]
+    np.testing.assert_allclose(forest.predict_proba(X_test.to_numpy()), expected, rtol=0, atol=ATOL)
+    assert forest.feature_names == list(X.columns)
+
+
+def test_check_parity_reports_ok():
+    X, y = _data()
+    model = lgb.LGBMClassifier(n_estimators=20, verbose=-1).fit(X, y)
+    report = check_parity(model, X.to_numpy(), threshold=0.5)
+    assert report["ok"] and report["n_mismatch"] == 0 and report["decision_mismatch"] == 0
+    assert report["rows"] == len(X)
@@ -0,0 +1,58 @@
+import json
+import os
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from src.model_registry import ModelBundle
+from src.wallet_snapshot import KEEP_SNAPSHOTS, WalletSnapshot, snapshot_from_parquet, write_snapshot
+
+FEATURES = ["a", "b", "c"]
+
+
+def _model(seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(500, 3)), columns=FEATURES)
+    return lgb.LGBMClassifier(n_estimators=15, num_leaves=7, verbose=-1).fit(X, (X["a"] > 0).astype(int))
+
+
+def test_lookup_matches_direct_scoring(tmp_path, monkeypatch):
+    model = _model()
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame(rng.normal(size=(3000, 3)), columns=FEATURES)
+    frame.loc[rng.random(len(frame)) < 0.1, "b"] = np.nan
+    frame["wallet_address"] = [f"0x{i:040x}" for i in range(len(frame))]
+    path = str(tmp_path / "data.parquet")
+    frame.to_parquet(path)
+
+    # Снапшот пишется в относительный SNAPSHOT_DIR — работаем из временной папки
+    monkeypatch.chdir(tmp_path)
+    snapshot_from_parquet(path, ModelBundle("v1", model, 0.5, FEATURES))
+    snapshot = WalletSnapshot.open_current()
+    assert len(snapshot) == len(frame) and snapshot.model_version == "v1"
+
+    sample = frame.sample(200, random_state=0)
+    rows = snapshot.lookup(sample["wallet_address"].tolist() + ["0xmissing"])
+    assert rows[-1] == -1
+    rows = rows[:-1]
+    direct = model.predict_proba(sample[FEATURES])[:, 1]
+    np.testing.assert_allclose(snapshot.scores[rows], direct, rtol=1e-12)
+    np.testing.assert_allclose(model.predict_proba(snapshot.matrix(rows))[:, 1], direct, rtol=1e-12)
+
+
+def test_duplicates_reordering_and_rotation(tmp_path):
+    snapshot_dir = str(tmp_path)
+    wallets = ["w1", "w2", "w1"]
+    X = np.arange(9.0).reshape(3, 3)
+    for _ in range(KEEP_SNAPSHOTS + 1):
+        name = write_snapshot(wallets, X, [0.1, 0.2, 0.3], FEATURES, "v1", snapshot_dir=snapshot_dir)
+    assert len([n for n in os.listdir(snapshot_dir) if n.startswith("s")]) == KEEP_SNAPSHOTS
+
+    snapshot = WalletSnapshot.open_current(snapshot_dir)
+    assert snapshot.name == name and len(snapshot) == 2
+    row = snapshot.find("w1")
+    assert snapshot.scores[row] == 0.3   # повторный адрес — последняя строка
+    np.testing.assert_array_equal(snapshot.matrix([row], ["c", "x", "a"]), [[8.0, np.nan, 6.0]])
+    with open(os.path.join(snapshot_dir, name, "meta.json"), encoding="utf-8") as f:
+        assert json.load(f)["n_wallets"] == 2
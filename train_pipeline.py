@@ -1,32 +1,82 @@
 from src.data_preparation import *
-from src.eda import run_eda
-from src.train import train_lightgbm
-from src.evaluate import evaluate_model, shap_analysis, get_risky_wallets
+from src.stage_cache import StageCache
+import src.data_preparation as data_preparation
+import src.eda as eda
+import src.model_registry as model_registry
+import src.train as train_module
+import src.tuning as tuning
+import src.tree_export as tree_export
+import src.wallet_snapshot as wallet_snapshot
+import monitoring.drift_engine as drift_engine
+import monitoring.drift_sketch as drift_sketch
+import numpy as np
 import pandas as pd
+import argparse
 import os
 import joblib
 
-if __name__ == "__main__":
-    # Загрузка и очистка
-    df = load_and_clean_data("data/dataset.parquet")
-    df = remove_high_corr_features(df)
+DATA_PATH = "data/dataset.parquet"
+RANDOM_STATE = 42
+# float32 вдвое уменьшает память под фичи; бины LightGBM могут слегка сместиться
+FLOAT32 = False
+# EDA-графики (--eda): без флага считается только профиль датасета
+EDA = False
+# Подбор гиперпараметров (--tune): иначе — BEST_PARAMS из src/train.py
+TUNE = False
+TUNE_SETTINGS = {"n_trials": tuning.N_TRIALS, "threads_per_trial": tuning.THREADS_PER_TRIAL, "time_budget": None}
+
+# Стадии и их зависимости (порядок — порядок запуска)
+STAGES = {
+    "load": [],
+    "profile": ["load"],
+    "eda": ["load"],
+    "split": ["load"],
+    "tune": ["split"],
+    "train": ["split", "tune"],
+    "export": ["split", "train"],
+    "scores": ["split", "train"],
+    "evaluate": ["split", "train", "scores"],
+    "shap": ["split", "train", "scores"],
+    "reference": ["split", "train", "scores"],
+    "publish": ["profile", "train", "export", "evaluate", "reference"],
+    "snapshot": ["split", "train", "scores", "publish"],
+}
+
+
+def load_stage(cache):
+    # Скоррелированные признаки не читаются из parquet вовсе
+    return load_and_clean_data(DATA_PATH, exclude=HIGH_CORR_FEATURES, float32=FLOAT32)
+
 
-    # EDA
-    run_eda(df)
+def profile_stage(cache):
+    # Статистики всех колонок одним векторным проходом; кэшируется по хэшу датасета
+    df = cache.result("load")
+    profile = eda.profile_dataset(df)
+    eda.save_profile(profile, cache.file_hash(DATA_PATH))
+    print(f" Профиль датасета: {len(df)} строк, {len(profile)} колонок → {eda.PROFILE_PATH}")
 
-    # Разделение
-    train, val, test = split_data(df, random_state=42)
+
+def eda_stage(cache):
+    # Графики — только по запросу, группы рисуются в пуле процессов
+    if not EDA:
+        return None
+    eda.render_plots(cache.result("load"))
+
+
+def split_stage(cache):
+    df = cache.result("load")
+    train, val, test = split_data(df, random_state=RANDOM_STATE)
     feature_cols = prepare_features(df)
-    
-    X_train_raw = train[feature_cols].copy()
-    y_train = train['target'].copy()
-    X_val_raw = val[feature_cols].copy()
-    y_val = val['target'].copy()
-    X_test_raw = test[feature_cols].copy()
-    y_test = test['target'].copy()
 
-    # Заполнение пропусков
-    X_train, X_val, X_test = fill_missing_with_median(X_train_raw, X_val_raw, X_test_raw)
+    # train/val/test уже отдельные копии — выборка колонок без лишних .copy()
+    X_train, y_train = train[feature_cols], train['target']
+    X_val, y_val = val[feature_cols], val['target']
+    X_test, y_test = test[feature_cols], test['target']
+
+    # Заполнение пропусков вектором медиан трейна (сохраняется артефактом)
+    X_train, X_val, X_test = fill_missing_with_median(X_train, X_val, X_test, medians_path=MEDIANS_PATH)
+    # Бинарный Dataset LightGBM — для обучений через lgb.train/lgb.cv без повторного биннинга
+    save_lgb_dataset(X_train, y_train, DATASET_PATH)
 
     # Отладочная информация
     print(" Оставленные признаки:", len(X_train.columns))
@@ -34,26 +84,89 @@ if __name__ == "__main__":
 
     print(" Разделение завершено:")
     print(f"Train: {X_train.shape}, Val: {X_val.shape}, Test: {X_test.shape}")
+    # Из исходных частей дальше нужны только адреса кошельков и таргет
+    meta_cols = [c for c in ("wallet_address", "target") if c in df.columns]
+    train, val, test = train[meta_cols], val[meta_cols], test[meta_cols]
+    return {"train": train, "val": val, "test": test,
+            "X_train": X_train, "X_val": X_val, "X_test": X_test,
+            "y_train": y_train, "y_val": y_val, "y_test": y_test}
 
-    # Обучение
-    model, best_params, feature_names_from_model = train_lightgbm(X_train, y_train)
 
+def tune_stage(cache):
+    if not TUNE:
+        return None
+    s = cache.result("split")
+    best = tuning.successive_halving(DATASET_PATH, s["X_val"], s["y_val"], **TUNE_SETTINGS)
+    tuning.save_best_params(best)
+    return best
+
+
+def train_stage(cache):
+    s, tuned = cache.result("split"), cache.result("tune")
+    model, best_params, feature_names_from_model = train_module.train_lightgbm(
+        s["X_train"], s["y_train"], params=tuned["params"] if tuned else None)
+    return {"model": model, "best_params": best_params, "feature_names": feature_names_from_model}
+
+
+def export_stage(cache):
+    # Экспорт леса в NumPy-массивы для лёгкого скоринга + сверка с predict_proba
+    s, t = cache.result("split"), cache.result("train")
+    model = t["model"]
+    # Пишем во временный файл: неверный экспорт не должен попасть ни в models/, ни в версию реестра
+    tmp_path = "models/.lightgbm_forest.npz"
+    forest = tree_export.export_forest(model, tmp_path)
+    parity = tree_export.check_parity(model, s["X_test"][t["feature_names"]], forest)
+    print(f" Экспорт леса: {forest.n_trees} деревьев, макс. расхождение со predict_proba {parity['max_abs_diff']:.2e}")
+    if not parity["ok"]:
+        os.remove(tmp_path)
+        # Как и в retrain: версия с расходящимся лесом не публикуется
+        raise RuntimeError("Скомпилированный лес расходится с LightGBM — модель не публикуется")
+    os.replace(tmp_path, "models/lightgbm_forest.npz")
+    return parity
+
+
+def scores_stage(cache):
+    # Скоры каждой части — один раз для оценки, референсов и топа кошельков
+    from src.evaluate import score_splits
+    s, t = cache.result("split"), cache.result("train")
+    names = t["feature_names"]
+    return score_splits(t["model"], {part: s[f"X_{part}"][names] for part in ("train", "val", "test")})
+
+
+def evaluate_stage(cache):
     # Оценка с оптимальным порогом
-    best_threshold = evaluate_model(
-        model, 
-        X_train, 
-        X_val[feature_names_from_model], 
-        X_test[feature_names_from_model], 
-        y_train, y_val, y_test,
-        name="LightGBM"
+    from src.evaluate import evaluate_model
+    s, t = cache.result("split"), cache.result("train")
+    feature_names_from_model = t["feature_names"]
+    return evaluate_model(
+        t["model"],
+        s["X_train"],
+        s["X_val"][feature_names_from_model],
+        s["X_test"][feature_names_from_model],
+        s["y_train"], s["y_val"], s["y_test"],
+        name="LightGBM",
+        predictions=cache.result("scores"),
+        dataset_path=DATASET_PATH,
     )
 
+
+def shap_stage(cache):
     # SHAP и рискованные кошельки
-    shap_analysis(model, X_test[feature_names_from_model], name="LightGBM")
-    X_full = pd.concat([X_train, X_val, X_test])[feature_names_from_model]
-    df_full = pd.concat([train, val, test]).reset_index(drop=True)
-    get_risky_wallets(model, X_full, df_full, name="LightGBM")
+    from src.evaluate import shap_analysis, get_risky_wallets
+    from src.explain import global_importance, save_global_importance
+    s, t = cache.result("split"), cache.result("train")
+    model, feature_names_from_model = t["model"], t["feature_names"]
+    shap_analysis(model, s["X_test"][feature_names_from_model], name="LightGBM")
+    # Глобальная важность по вкладам pred_contrib на всём тесте, а не на выборке из 500 строк
+    save_global_importance(global_importance(model, s["X_test"][feature_names_from_model]), name="LightGBM")
+    # Скоры всех строк — уже посчитанные по частям, без повторного скоринга X_full
+    scores = cache.result("scores")
+    probs = np.concatenate([scores["train"], scores["val"], scores["test"]])
+    df_full = pd.concat([s["train"], s["val"], s["test"]]).reset_index(drop=True)
+    get_risky_wallets(model, None, df_full, name="LightGBM", probs=probs)
 
+
+def reference_stage(cache):
     # ===========================================================
     #  СОХРАНЕНИЕ РЕФЕРЕНСНЫХ ДАННЫХ ДЛЯ МОНИТОРИНГА (PARQUET + CSV)
     # ===========================================================
@@ -61,10 +174,10 @@ if __name__ == "__main__":
     os.makedirs("monitoring/reference", exist_ok=True)
 
     # Используем X_train как есть — он уже содержит только фичи, пошедшие в модель
-    X_train_for_ref = X_train.copy()
+    X_train_for_ref = cache.result("split")["X_train"].copy()
 
-    # Скоры на трейне
-    train_scores = model.predict_proba(X_train_for_ref)[:, 1]
+    # Скоры на трейне (из стадии scores)
+    train_scores = cache.result("scores")["train"]
 
     # Parquet — для быстрой загрузки в скриптах
     X_train_for_ref.to_parquet("monitoring/reference/reference_features.parquet", index=False)
@@ -74,12 +187,119 @@ if __name__ == "__main__":
     X_train_for_ref.to_csv("monitoring/reference/reference_features.csv", index=False)
     pd.DataFrame({"score": train_scores}).to_csv("monitoring/reference/reference_scores.csv", index=False)
 
+    # Компактные профили референса для проверок дрейфа (квантили, бины, KS-подвыборка)
+    drift_engine.build_reference_profile(X_train_for_ref, drift_engine.PROFILE_PATH)
+    drift_engine.build_reference_profile(pd.DataFrame({"score": train_scores}), drift_engine.SCORE_PROFILE_PATH)
+
+    # Границы бинов для потоковых скетчей дрейфа в API
+    drift_sketch.build_sketch_reference(X_train_for_ref, train_scores)
+
     print("Референсные данные сохранены в monitoring/reference/ (parquet + csv)")
-    # Сохраняем порог
+
+
+def publish_stage(cache):
+    # Сохраняем порог и публикуем версию в реестр — API подхватит её без перезапуска
+    t, best_threshold = cache.result("train"), cache.result("evaluate")
     joblib.dump(best_threshold, "models/lightgbm_best_threshold.pkl")
     print(f" Лучший порог сохранён: {best_threshold:.4f}")
-    print(f"Использовано признаков: {len(feature_names_from_model)}")
+    return model_registry.publish_version(
+        t["model"], best_threshold, t["feature_names"],
+        metadata={"params": {k: str(v) for k, v in t["best_params"].items()}})
+
+
+def snapshot_stage(cache):
+    # Фичи и скоры всех кошельков датасета для /score/<wallet> (mmap-снапшот)
+    s, t = cache.result("split"), cache.result("train")
+    parts = ("train", "val", "test")
+    if "wallet_address" not in s["train"].columns:
+        print("⚠️ В датасете нет wallet_address — снапшот кошельков не строится")
+        return None
+    names = t["feature_names"]
+    scores = cache.result("scores")
+    return wallet_snapshot.write_snapshot(
+        np.concatenate([s[part]["wallet_address"].to_numpy() for part in parts]),
+        np.concatenate([s[f"X_{part}"][names].to_numpy(dtype=np.float64) for part in parts]),
+        np.concatenate([scores[part] for part in parts]),
+        names, cache.result("publish"))
+
+
+def _published(version):
+    # Версия из кэша стадии publish могла быть удалена из реестра — тогда публикуем заново
+    return version is not None and os.path.isdir(os.path.join(model_registry.REGISTRY_DIR, version))
+
+
+def _snapshot_version(name):
+    try:
+        return wallet_snapshot.WalletSnapshot(os.path.join(wallet_snapshot.SNAPSHOT_DIR, name)).model_version
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def run_pipeline(cache):
+    """Прогоняет все стадии через кэш; значения стадий — в cache.result(имя)."""
+    # Ключ стадии: данные + исходники кода + параметры + ключи зависимостей
+    evaluate_code = [os.path.join("src", "evaluate.py")]
+    # Датасет на диск не пишется: при попадании split и дальше он даже не читается
+    cache.run("load", load_stage, files=[DATA_PATH], code=[data_preparation], params={"float32": FLOAT32},
+              persist=False)
+    cache.run("profile", profile_stage, code=[eda], outputs=[eda.PROFILE_PATH, eda.PROFILE_TABLE_PATH])
+    cache.run("eda", eda_stage, code=[eda], params={"eda": EDA}, outputs=["plots/boxplot_*.png"])
+    cache.run("split", split_stage, code=[data_preparation], params={"random_state": RANDOM_STATE},
+              outputs=[MEDIANS_PATH, DATASET_PATH])
+    # Полный датасет дальше не нужен — не держим его в памяти до конца пайплайна
+    cache.release("load")
+    cache.run("tune", tune_stage, code=[tuning], params={"tune": TUNE, **TUNE_SETTINGS},
+              outputs=[tuning.BEST_PARAMS_PATH])
+    cache.run("train", train_stage, code=[train_module], outputs=["models/lightgbm_model.pkl"])
+    cache.run("export", export_stage, code=[tree_export], outputs=["models/lightgbm_forest.npz"])
+    cache.run("scores", scores_stage, files=evaluate_code)
+    cache.run("evaluate", evaluate_stage, files=evaluate_code,
+              outputs=["results/LightGBM_classification_report.txt", "results/LightGBM_metrics_ci.json",
+                       "plots/LightGBM_roc_curve.png", "plots/LightGBM_pr_curve.png"])
+    cache.run("shap", shap_stage, files=evaluate_code + [os.path.join("src", "explain.py")],
+              outputs=["plots/LightGBM_shap_*.png", "results/LightGBM_top50_risky_wallets.csv",
+                       "results/LightGBM_global_importance.csv", "plots/LightGBM_global_importance.png"])
+    cache.run("reference", reference_stage, code=[drift_engine, drift_sketch], outputs=["monitoring/reference/*"])
+    cache.run("publish", publish_stage, code=[model_registry], outputs=["models/lightgbm_best_threshold.pkl"],
+              check=_published)
+    # Снапшот из кэша годится, только если он посчитан той версией, что сейчас опубликована
+    cache.run("snapshot", snapshot_stage, code=[wallet_snapshot],
+              outputs=[os.path.join(wallet_snapshot.SNAPSHOT_DIR, "CURRENT"),
+                       os.path.join(wallet_snapshot.SNAPSHOT_DIR, "s*", "*")],
+              check=lambda name: name is None or _snapshot_version(name) == cache.result("publish"))
+
+    # Только то, что уже в памяти: ради печати результаты из кэша с диска не читаем
+    train = cache.results.get("train")
+    if train is not None:
+        print(f"Использовано признаков: {len(train['feature_names'])}")
     print("Обучение завершено!")
 
-    print(" Пример входа для API:")
-    print(X_test.iloc[0].to_dict())
\ No newline at end of file
+    split = cache.results.get("split")
+    if split is not None:
+        print(" Пример входа для API:")
+        print(split["X_test"].iloc[0].to_dict())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обучение модели по стадиям с кэшем артефактов")
+    parser.add_argument("--force", nargs="*", default=[], choices=list(STAGES) + ["all"],
+                        help="пересчитать стадии, не глядя в кэш")
+    parser.add_argument("--only", nargs="*", default=None, choices=list(STAGES),
+                        help="запустить только эти стадии (и их зависимости)")
+    parser.add_argument("--no-cache", action="store_true", help="то же, что --force all")
+    parser.add_argument("--float32", action="store_true", help="держать фичи в float32")
+    parser.add_argument("--eda", action="store_true", help="нарисовать EDA-графики (boxplot-ы)")
+    parser.add_argument("--tune", action="store_true", help="подобрать гиперпараметры (successive halving)")
+    parser.add_argument("--tune-trials", type=int, default=tuning.N_TRIALS)
+    parser.add_argument("--tune-threads", type=int, default=tuning.THREADS_PER_TRIAL,
+                        help="потоков LightGBM на trial")
+    parser.add_argument("--tune-budget", type=float, default=None, help="секунд на подбор")
+    args = parser.parse_args()
+    FLOAT32 = args.float32
+    EDA = args.eda
+    TUNE = args.tune
+    TUNE_SETTINGS = {"n_trials": args.tune_trials, "threads_per_trial": args.tune_threads,
+                     "time_budget": args.tune_budget}
+    cache = StageCache(STAGES, force=["all"] if args.no_cache else args.force, only=args.only)
+
+    run_pipeline(cache)